@@ -1,68 +1,194 @@
 # src/api/routes.py
-from fastapi import APIRouter, UploadFile, File, Query, HTTPException
-from fastapi.responses import JSONResponse
-from typing import Optional
+from fastapi import APIRouter, UploadFile, File, Query, HTTPException, Request, Depends
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import Optional, List, Dict, Any
+import json
 import os
+import uuid
 from datetime import datetime
 import logging
+from config.settings import settings
+from services.chunker import effective_chunk_tokens
+from services.container import get_doc_store, get_ingest_queue
 from services.document_store import QdrantDocumentStore
+from services.ingest_jobs import IngestJobQueue, QueueFullError
 
 
 router = APIRouter()
-doc_store = QdrantDocumentStore()
 logger = logging.getLogger(__name__)
 
+CHUNK_SIZE_DESCRIPTION = (
+    f"Chunk size in tokens, capped at the embedding model's maximum length (EMBEDDING_MAX_TOKENS="
+    f"{settings.EMBEDDING_MAX_TOKENS}); the response and the file catalog report the effective size"
+)
+
+
+def _file_too_large(file_name: str) -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"File '{file_name}' exceeds the maximum size of {settings.MAX_FILE_SIZE} bytes"
+    )
+
+def _copy_upload(source, spool_path: str, file_name: str) -> int:
+    """نسخ الملف على أجزاء ثابتة الحجم مع التوقف فور تجاوز الحد الأقصى (بدون تحميله كاملاً في الذاكرة)"""
+    size = 0
+    with open(spool_path, "xb") as target:
+        while True:
+            block = source.read(settings.UPLOAD_CHUNK_BYTES)
+            if not block:
+                return size
+            size += len(block)
+            if size > settings.MAX_FILE_SIZE:
+                raise _file_too_large(file_name)
+            target.write(block)
+
+def _discard_spooled(files: List[Dict[str, Any]]):
+    for f in files:
+        try:
+            os.remove(f["path"])
+        except FileNotFoundError:
+            pass
+
+async def _spool_upload(file: UploadFile) -> Dict[str, Any]:
+    """حفظ الملف المرفوع باسم مؤقت فريد داخل مجلد الطابور (يبقى حتى تنتهي المهمة)"""
+    file_name = file.filename or "upload"
+    # الحجم معروف غالباً من تحليل الطلب → الرفض قبل النسخ
+    if file.size is not None and file.size > settings.MAX_FILE_SIZE:
+        raise _file_too_large(file_name)
+
+    os.makedirs(settings.INGEST_SPOOL_DIR, exist_ok=True)
+    file_extension = os.path.splitext(file_name)[1].lower()
+    spool_path = os.path.join(settings.INGEST_SPOOL_DIR, f"{uuid.uuid4().hex}{file_extension}")
+
+    try:
+        # القراءة والكتابة على القرص خارج حلقة الأحداث
+        size = await run_in_threadpool(_copy_upload, file.file, spool_path, file_name)
+    except BaseException:
+        _discard_spooled([{"path": spool_path}])
+        raise
+
+    return {"path": spool_path, "name": file_name, "size": size}
+
+async def _spool_uploads(files: List[UploadFile]) -> List[Dict[str, Any]]:
+    """كل الملفات أو لا شيء: فشل ملف واحد يحذف ما سبقه"""
+    spooled = []
+    try:
+        for file in files:
+            spooled.append(await _spool_upload(file))
+    except BaseException:
+        _discard_spooled(spooled)
+        raise
+    return spooled
+
+def _submit_job(request: Request, ingest_queue: IngestJobQueue, files: List[Dict[str, Any]],
+                chunk_size: int, force: bool) -> Dict[str, Any]:
+    try:
+        job = ingest_queue.submit([{"path": f["path"], "name": f["name"]} for f in files], chunk_size, force)
+    except QueueFullError as e:
+        _discard_spooled(files)
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+    except Exception:
+        _discard_spooled(files)
+        raise
+
+    job["status_url"] = request.url_for("get_job", job_id=job["job_id"]).path
+    return job
 
 @router.post("/upload-file/")
 async def upload_file(
+    request: Request,
     file: UploadFile = File(...), 
-    chunk_size: int = Query(500, ge=100, le=2000)
+    chunk_size: int = Query(500, ge=100, le=2000, description=CHUNK_SIZE_DESCRIPTION),
+    force: bool = Query(False, description="Re-index even if the file is unchanged"),
+    ingest_queue: IngestJobQueue = Depends(get_ingest_queue)
 ):
-    """رفع ملف جديد ومعالجته"""
+    """رفع ملف جديد وإضافته إلى طابور المعالجة"""
     try:
-        # إنشاء اسم ملف مؤقت فريد
-        file_extension = f'{file.filename}'
-        
-        # Save uploaded file
-        with open(file_extension, "wb") as f:
-            content = await file.read()
-            f.write(content)
-            
-        # process document
-        success = doc_store.upload_document(file_extension,chunk_size)
-
-        logger.info(f"File '{file.filename}' uploaded and processed successfully.")
-        # clean up
-        os.remove(file.filename)
-
-        if success:
-            return JSONResponse(
-                status_code= 200,
-                content={
-                    "message": "File uploaded successfully",
-                    "file_name": file.filename,
-                    "file_size": len(content),
-                    "chunk_size": chunk_size,
-                    "upload_time": datetime.now().isoformat()
-                }
-            )
-        else:
-            raise HTTPException(status_code=400, detail="Failed to process file")
+        spooled = await _spool_upload(file)
+        job = _submit_job(request, ingest_queue, [spooled], chunk_size, force)
+
+        logger.info(f"File '{spooled['name']}' queued for processing as job {job['job_id']}.")
 
+        return JSONResponse(
+            status_code= 202,
+            content={
+                "message": "File queued for processing",
+                "job_id": job["job_id"],
+                "status_url": job["status_url"],
+                "file_name": spooled["name"],
+                "file_size": spooled["size"],
+                "chunk_size": effective_chunk_tokens(chunk_size, settings.EMBEDDING_MAX_TOKENS),
+                "upload_time": datetime.now().isoformat()
+            }
+        )
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error uploading file: {str(e)}")
 
+@router.post("/upload-files/")
+async def upload_files(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    chunk_size: int = Query(500, ge=100, le=2000, description=CHUNK_SIZE_DESCRIPTION),
+    force: bool = Query(False, description="Re-index even if the files are unchanged"),
+    ingest_queue: IngestJobQueue = Depends(get_ingest_queue)
+):
+    """رفع عدة ملفات كمهمة واحدة: استخراج متوازٍ ودفعات تضمين ورفع مشتركة بين الملفات"""
+    try:
+        spooled = await _spool_uploads(files)
+        job = _submit_job(request, ingest_queue, spooled, chunk_size, force)
+
+        logger.info(f"{len(files)} files queued for processing as job {job['job_id']}.")
+
+        return JSONResponse(
+            status_code= 202,
+            content={
+                "message": "Files queued for processing",
+                "job_id": job["job_id"],
+                "status_url": job["status_url"],
+                "file_names": [f["name"] for f in spooled],
+                "total_size": sum(f["size"] for f in spooled),
+                "chunk_size": effective_chunk_tokens(chunk_size, settings.EMBEDDING_MAX_TOKENS),
+                "upload_time": datetime.now().isoformat()
+            }
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error uploading files: {str(e)}")
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, ingest_queue: IngestJobQueue = Depends(get_ingest_queue)):
+    """حالة مهمة المعالجة وتقدمها"""
+    job = await run_in_threadpool(ingest_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 @router.get("/search/")
 async def search_semantic(
     query: str = Query(...),
     limit: int = Query(10, ge=1, le=20),
-    score_threshold: float = Query(0.25, ge=0.1, le=1.0),
+    score_threshold: float = Query(0.25, ge=0.1, le=1.0, description="Minimum cosine similarity to the query (both modes)"),
     include_chunks: bool = Query(True),
-    include_vectors: bool = Query(False)
+    include_vectors: bool = Query(False),
+    mode: Optional[str] = Query(None, pattern="^(dense|hybrid)$", description=(
+        "Defaults to RETRIEVAL_MODE. `score` is the cosine similarity in dense mode and the RRF rank score "
+        "(sum of 1/(2 + rank) per retriever, at most 1.0) in hybrid mode"
+    )),
+    hnsw_ef: Optional[int] = Query(None, ge=1, description="HNSW search breadth (default: QDRANT_SEARCH_HNSW_EF)"),
+    rescore: Optional[bool] = Query(None, description="Rescore quantized hits with original vectors (default: QDRANT_SEARCH_RESCORE)"),
+    doc_store: QdrantDocumentStore = Depends(get_doc_store)
 ):
-    """البحث الدلالي في المستندات"""
+    """البحث الدلالي أو الهجين (دلالي + BM25) في المستندات"""
     try:
-        search_results = doc_store.search_documents(query, limit, score_threshold)
+        search_results = await doc_store.search_documents_async(
+            query, limit, score_threshold, mode=mode, with_vectors=include_vectors, hnsw_ef=hnsw_ef, rescore=rescore
+        )
 
         response = {
             'query': query,
@@ -77,6 +203,8 @@ async def search_semantic(
                 "file_type": result.payload.get('file_type'),
                 "file_size": result.payload.get('file_size'),
                 "chunk_id": result.payload.get('chunk_id'),
+                "page_start": result.payload.get('page_start'),
+                "page_end": result.payload.get('page_end'),
                 "metadata": {
                     "processed_date": result.payload.get('processed_date'),
                     "total_words": result.payload.get('total_words'),
@@ -105,132 +233,100 @@ async def search_semantic(
 async def list_files(
     file_type: Optional[str] = Query(None),
     limit: int = Query(50, ge=1, le=100),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    doc_store: QdrantDocumentStore = Depends(get_doc_store)
 ):
-    """قائمة جميع الملفات مع pagination"""
+    """قائمة جميع الملفات مع pagination (من فهرس الملفات بدلاً من مسح كل الأجزاء)"""
     try:
-        all_files = {}
-        
-        search_results = doc_store.client.scroll(
-            collection_name=doc_store.collection_name,
-            limit=1000
-        )
-        
-        for point in search_results[0]:
-            file_name = point.payload.get('file_name')
-            if file_name not in all_files:
-                all_files[file_name] = {
-                    "file_name": file_name,
-                    "file_path": point.payload.get('file_path'),
-                    "file_type": point.payload.get('file_type'),
-                    "file_size": point.payload.get('file_size'),
-                    "processed_date": point.payload.get('processed_date'),
-                    "total_chunks": 0,
-                    "total_words": point.payload.get('total_words'),
-                    "total_chars": point.payload.get('total_chars'),
-                    "chunks": []
-                }
-            
-            all_files[file_name]["total_chunks"] += 1
-            all_files[file_name]["chunks"].append({
-                "chunk_id": point.payload.get('chunk_id'),
-                'total_words': point.payload.get('total_words'),
-                "text_preview": point.payload.get('original_text_preview'),
-                "vector_id": point.id
-            })
-        
-        files_list = list(all_files.values())
-        if file_type:
-            files_list = [f for f in files_list if f['file_type'] == f'.{file_type}']
-        
-        paginated_files = files_list[offset:offset + limit]
-        
+        total_files, files_list = await doc_store.list_documents_async(file_type, limit, offset)
+
         return JSONResponse(
             status_code=200,
             content={
-            "total_files": len(files_list),
-            "files": paginated_files,
+            "total_files": total_files,
+            "files": files_list,
             "pagination": {
                 "limit": limit,
-                "has_more": (limit) < len(files_list)
+                "offset": offset,
+                "has_more": offset + len(files_list) < total_files
             }}
             )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _chunk_fields(include_text: bool) -> List[str]:
+    fields = ['chunk_id', 'total_words']
+    if include_text:
+        fields += ['chunk_text', 'original_text_preview']
+    return fields
+
+def _format_chunk(chunk: Dict[str, Any], include_text: bool) -> Dict[str, Any]:
+    chunk_data = {
+        "chunk_id": chunk.get('chunk_id'),
+        'total_words': chunk.get('total_words'),
+        "vector_id": chunk['id'],
+        "score": None
+    }
+
+    if include_text:
+        chunk_data["text"] = chunk.get('chunk_text')
+        chunk_data["text_preview"] = chunk.get('original_text_preview')
+
+    return chunk_data
+
+async def _ndjson_chunks(doc_store: QdrantDocumentStore, file_name: str, include_text: bool):
+    async for chunk in doc_store.iter_document_chunks_async(file_name, _chunk_fields(include_text)):
+        yield json.dumps(_format_chunk(chunk, include_text), ensure_ascii=False) + "\n"
+
 @router.get("/files/{file_name}/")
 async def get_file_chunks(
     file_name: str,
-    include_text: bool = Query(True)
+    include_text: bool = Query(True),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: int = Query(0, ge=0, description="chunk_id to start from (next_cursor of the previous page)"),
+    stream: bool = Query(False, description="Stream every chunk of the file as NDJSON"),
+    doc_store: QdrantDocumentStore = Depends(get_doc_store)
 ):
-    """الحصول على جميع أجزاء ملف معين"""
+    """الحصول على أجزاء ملف معين صفحة بصفحة (الحقول المطلوبة فقط، بدون المتجهات)"""
     try:
-        search_results = doc_store.client.scroll(
-            collection_name=doc_store.collection_name,
-            scroll_filter={
-                "must": [
-                    {
-                        "key": "file_name",
-                        "match": {"value": file_name}
-                    }
-                ]
-            }
-        )
-        
-        if not search_results[0]:
+        total_chunks = await doc_store.count_document_chunks_async(file_name)
+        if not total_chunks:
             raise HTTPException(status_code=404, detail="File not found")
 
-        chunks = []
-        for point in search_results[0]:
-            chunk_data = {
-                "chunk_id": point.payload.get('chunk_id'),
-                'total_words': point.payload.get('total_words'),
-                "vector_id": point.id,
-                "score": None
-            }
-            
-            if include_text:
-                chunk_data["text"] = point.payload.get('chunk_text')
-                chunk_data["text_preview"] = point.payload.get('original_text_preview')
-            
-            chunks.append(chunk_data)
-        
+        if stream:
+            return StreamingResponse(_ndjson_chunks(doc_store, file_name, include_text), media_type="application/x-ndjson")
+
+        chunks, next_cursor = await doc_store.get_document_chunks_async(
+            file_name, _chunk_fields(include_text), limit, cursor
+        )
+
         return {
             "file_name": file_name,
-            "total_chunks": len(chunks),
-            "chunks": chunks
+            "total_chunks": total_chunks,
+            "chunks": [_format_chunk(chunk, include_text) for chunk in chunks],
+            "pagination": {
+                "limit": limit,
+                "cursor": cursor,
+                "next_cursor": next_cursor
+            }
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        raise Exception(f"Error Not found file: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error Not found file: {str(e)}")
 
 @router.get("/chunks/{chunk_id}/")
-async def get_chunk_detail(chunk_id: int, file_name: str):
+async def get_chunk_detail(chunk_id: int, file_name: str, doc_store: QdrantDocumentStore = Depends(get_doc_store)):
     """الحصول على تفاصيل جزء معين"""
     try:
-        search_results = doc_store.client.scroll(
-            collection_name=doc_store.collection_name,
-            scroll_filter={
-                "must": [
-                    {
-                        "key": "chunk_id",
-                        "match": {"value": chunk_id}
-                    },
-                    {
-                        "key": "file_name", 
-                        "match": {"value": file_name}
-                    }
-                ]
-            },
-            with_vectors=True,
-            limit=1
-        )
-        
-        if not search_results[0]:
+        chunk = await doc_store.get_chunk_async(file_name, chunk_id)
+        if chunk is None:
             raise HTTPException(status_code=404, detail="Chunk not found")
         
-        point = search_results[0][0]
+        payload = chunk['payload']
+        vector = chunk['vector']
         
         return JSONResponse(
             status_code=200,
@@ -238,56 +334,46 @@ async def get_chunk_detail(chunk_id: int, file_name: str):
             "chunk_id": chunk_id,
             "file_name": file_name,
             "metadata": {
-                "file_type": point.payload.get('file_type'),
-                "file_size": point.payload.get('file_size'),
-                "processed_date": point.payload.get('processed_date'),
-                "total_words": point.payload.get('total_words'),
-                "total_chars": point.payload.get('total_chars')
+                "file_type": payload.get('file_type'),
+                "file_size": payload.get('file_size'),
+                "processed_date": payload.get('processed_date'),
+                "total_words": payload.get('total_words'),
+                "total_chars": payload.get('total_chars')
             },
             "content": {
-                "full_text": point.payload.get('chunk_text'),
-                "preview": point.payload.get('original_text_preview')
+                "full_text": payload.get('chunk_text'),
+                "preview": payload.get('original_text_preview')
             },
             "vector_info": {
-                "vector_id": point.id,
-                "vector_dimension": len(point.vector) if point.vector else 0,
-                "vector": point.vector if point.vector else 0
+                "vector_id": chunk['id'],
+                "vector_dimension": len(vector) if vector else 0,
+                "vector": vector if vector else 0
             }
         })
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/files/{file_name}/")
-async def delete_file(file_name: str):
+async def delete_file(file_name: str, doc_store: QdrantDocumentStore = Depends(get_doc_store)):
     """حذف ملف وجميع أجزائه"""
     try:
-        search_results = doc_store.client.scroll(
-            collection_name=doc_store.collection_name,
-            scroll_filter={
-                "must": [
-                    {
-                        "key": "file_name",
-                        "match": {"value": file_name}
-                    }
-                ]
-            },
-            limit=1000
-        )
-        
-        point_ids = [point.id for point in search_results[0]]
-        
-        if point_ids:
-            doc_store.client.delete(
-                collection_name=doc_store.collection_name,
-                points_selector=point_ids
-            )
+        deleted_chunks = await run_in_threadpool(doc_store.delete_document, file_name)
         
         return {
             "message": f"File '{file_name}' deleted successfully",
-            "deleted_chunks": len(point_ids),
-            "deleted_points": point_ids
+            "deleted_chunks": deleted_chunks
         }
         
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/embedding-cache/stats/")
+async def embedding_cache_stats(doc_store: QdrantDocumentStore = Depends(get_doc_store)):
+    """إحصائيات ذاكرة التضمينات المؤقتة"""
+    cache = doc_store.embedding.cache
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
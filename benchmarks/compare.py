@@ -0,0 +1,84 @@
+# benchmarks/compare.py
+import argparse
+import json
+import sys
+from typing import Any, Dict, Iterator, Tuple
+
+# الأقسام التي تُقارن؛ meta (الإعدادات والبيئة) تُعرض فقط إذا اختلفت
+SECTIONS = ('chunking', 'ingest', 'search', 'ask')
+# المقاييس التي تكون قيمتها الأعلى أفضل؛ الباقي (أزمنة، ذاكرة، أخطاء) الأقل أفضل
+HIGHER_IS_BETTER = ('per_second',)
+# عدادات تصف حجم العمل وليس أداءه
+IGNORED = ('documents', 'chunks', 'chars', 'requests', 'concurrency', 'count')
+
+
+def _flatten(value: Any, prefix: str = '') -> Iterator[Tuple[str, float]]:
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _flatten(item, f"{prefix}.{key}" if prefix else key)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, float(value)
+
+
+def _is_ignored(key: str) -> bool:
+    return key.rsplit('.', 1)[-1] in IGNORED or '.errors.' in key
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> str:
+    """جدول بكل مقياس رقمي: القيمة السابقة والحالية والتغير بالنسبة المئوية (+ = أفضل)"""
+    before = {key: value for section in SECTIONS for key, value in _flatten(baseline.get(section, {}), section)}
+    after = {key: value for section in SECTIONS for key, value in _flatten(current.get(section, {}), section)}
+
+    rows = []
+    for key in sorted(before.keys() & after.keys()):
+        if _is_ignored(key):
+            continue
+        old, new = before[key], after[key]
+        if old:
+            change = (new - old) / abs(old) * 100
+            if not any(marker in key for marker in HIGHER_IS_BETTER):
+                change = -change
+            rows.append((key, old, new, f"{change:+.1f}%"))
+        else:
+            rows.append((key, old, new, "n/a"))
+
+    width = max([len(row[0]) for row in rows] + [6])
+    lines = [
+        f"baseline: {baseline.get('meta', {}).get('git_commit')} {baseline.get('meta', {}).get('label', '')}".rstrip(),
+        f"current:  {current.get('meta', {}).get('git_commit')} {current.get('meta', {}).get('label', '')}".rstrip(),
+        f"{'metric':<{width}}  {'baseline':>12}  {'current':>12}  {'better':>8}",
+    ]
+    lines += [f"{key:<{width}}  {old:>12.4g}  {new:>12.4g}  {change:>8}" for key, old, new, change in rows]
+
+    # نتائج بإعدادات أو معاملات مختلفة ليست مقارنة مباشرة
+    for field in ('arguments', 'settings'):
+        old_values = baseline.get('meta', {}).get(field, {})
+        new_values = current.get('meta', {}).get(field, {})
+        changed = sorted(name for name in old_values.keys() | new_values.keys()
+                         if name != 'label' and old_values.get(name) != new_values.get(name))
+        if changed:
+            lines.append(f"{field} changed: " + ', '.join(
+                f"{name}={old_values.get(name)!r}→{new_values.get(name)!r}" for name in changed
+            ))
+    return '\n'.join(lines)
+
+
+def compare_files(baseline_path: str, current_path: str) -> str:
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(current_path, encoding='utf-8') as f:
+        current = json.load(f)
+    return compare(baseline, current)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    args = parser.parse_args(argv)
+    print(compare_files(args.baseline, args.current))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+# benchmarks/corpus.py
+import csv
+import os
+import random
+from typing import Dict, List
+
+# .xls يحتاج xlwt للكتابة ولا يُولد؛ قراءته تمر بنفس مسار pandas مثل .csv
+FORMATS = ('txt', 'pdf', 'docx', 'pptx', 'csv', 'xlsx')
+
+_TOPICS = [
+    "invoice", "contract", "shipment", "warehouse", "payment", "customer", "supplier", "audit",
+    "budget", "forecast", "inventory", "delivery", "refund", "policy", "report", "schedule",
+]
+_WORDS = [
+    "the", "a", "of", "and", "to", "in", "for", "with", "on", "by", "from", "after", "before", "each",
+    "total", "amount", "date", "status", "region", "team", "quarter", "review", "approved", "pending",
+    "updated", "record", "system", "process", "request", "account", "balance", "item", "order", "price",
+    "quantity", "service", "support", "issue", "resolved", "month", "year", "office", "branch", "manager",
+]
+
+
+class CorpusGenerator:
+    """مستندات اصطناعية حتمية (نفس البذرة = نفس الملفات) بكل الصيغ المدعومة"""
+
+    def __init__(self, seed: int = 42, paragraphs: int = 20, rows: int = 500):
+        self.seed = seed
+        self.paragraphs = paragraphs
+        self.rows = rows
+
+    def generate(self, directory: str, documents_per_format: int, formats=FORMATS) -> List[Dict[str, str]]:
+        os.makedirs(directory, exist_ok=True)
+        files = []
+        for file_format in formats:
+            writer = getattr(self, f"_write_{file_format}")
+            for index in range(documents_per_format):
+                rng = random.Random(f"{self.seed}-{file_format}-{index}")
+                name = f"{file_format}_{index:04d}.{file_format}"
+                path = os.path.join(directory, name)
+                writer(path, rng, index)
+                files.append({'path': path, 'name': name, 'format': file_format})
+        return files
+
+    def queries(self, count: int) -> List[str]:
+        """أسئلة بنفس مفردات المستندات حتى تعيد نتائج فعلية"""
+        rng = random.Random(f"{self.seed}-queries")
+        return [
+            f"What is the {rng.choice(_WORDS[14:])} of {rng.choice(_TOPICS)} {rng.choice(_TOPICS)}-{rng.randrange(1000):03d}?"
+            for _ in range(count)
+        ]
+
+    # النص المشترك بين الصيغ
+    def _sentence(self, rng: random.Random) -> str:
+        words = [rng.choice(_WORDS) for _ in range(rng.randint(8, 20))]
+        words.insert(rng.randrange(len(words)), f"{rng.choice(_TOPICS)}-{rng.randrange(1000):03d}")
+        return ' '.join(words).capitalize() + '.'
+
+    def _paragraph(self, rng: random.Random) -> str:
+        return ' '.join(self._sentence(rng) for _ in range(rng.randint(3, 7)))
+
+    def _sections(self, rng: random.Random, index: int):
+        for section in range(max(1, self.paragraphs // 4)):
+            yield f"{section + 1}. {rng.choice(_TOPICS).title()} {index}", [
+                self._paragraph(rng) for _ in range(4)
+            ]
+
+    def _rows(self, rng: random.Random):
+        header = ['id', 'topic', 'code', 'amount', 'status', 'note']
+        rows = [
+            [str(row), rng.choice(_TOPICS), f"{rng.choice(_TOPICS)}-{rng.randrange(1000):03d}",
+             f"{rng.uniform(1, 10000):.2f}", rng.choice(_WORDS[20:30]), self._sentence(rng)]
+            for row in range(self.rows)
+        ]
+        return header, rows
+
+    def _write_txt(self, path: str, rng: random.Random, index: int):
+        with open(path, 'w', encoding='utf-8') as f:
+            for heading, paragraphs in self._sections(rng, index):
+                f.write(f"# {heading}\n\n" + '\n\n'.join(paragraphs) + '\n\n')
+
+    def _write_docx(self, path: str, rng: random.Random, index: int):
+        from docx import Document
+
+        document = Document()
+        for heading, paragraphs in self._sections(rng, index):
+            document.add_heading(heading, level=1)
+            for paragraph in paragraphs:
+                document.add_paragraph(paragraph)
+        document.save(path)
+
+    def _write_pptx(self, path: str, rng: random.Random, index: int):
+        from pptx import Presentation
+
+        presentation = Presentation()
+        for heading, paragraphs in self._sections(rng, index):
+            slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+            slide.shapes.title.text = heading
+            slide.placeholders[1].text = '\n'.join(paragraphs)
+        presentation.save(path)
+
+    def _write_csv(self, path: str, rng: random.Random, index: int):
+        header, rows = self._rows(rng)
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+
+    def _write_xlsx(self, path: str, rng: random.Random, index: int):
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        # ورقتان لاختبار قراءة كل الأوراق
+        for sheet in range(2):
+            worksheet = workbook.create_sheet(f"Sheet{sheet + 1}")
+            header, rows = self._rows(rng)
+            worksheet.append(header)
+            for row in rows[:self.rows // 2]:
+                worksheet.append(row)
+        workbook.save(path)
+
+    def _write_pdf(self, path: str, rng: random.Random, index: int):
+        # صفحة لكل قسم؛ كل سطر عنصر نص مستقل حتى يبقى PDF صغيراً وبدون مكتبات إضافية
+        pages = []
+        for heading, paragraphs in self._sections(rng, index):
+            lines = [heading]
+            for paragraph in paragraphs:
+                words = paragraph.split()
+                lines.extend(' '.join(words[i:i + 14]) for i in range(0, len(words), 14))
+                lines.append('')
+            pages.append(lines[:64])
+        write_pdf(path, pages)
+
+
+def _pdf_string(text: str) -> bytes:
+    escaped = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return escaped.encode('latin-1', 'replace')
+
+
+def write_pdf(path: str, pages: List[List[str]]):
+    """PDF نصي بسيط (خط Helvetica المدمج) يستطيع PyPDF2 استخراج نصه"""
+    objects: List[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    # رقم كائن الصفحات معروف مسبقاً: بعد كائن محتوى وكائن صفحة لكل صفحة
+    pages_id = font_id + 2 * len(pages) + 1
+    page_ids = []
+    for lines in pages:
+        stream = b"\n".join(
+            b"BT /F1 10 Tf 40 %d Td (%s) Tj ET" % (800 - 12 * i, _pdf_string(line))
+            for i, line in enumerate(lines)
+        )
+        content_id = add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 %d 0 R >> >> >>" % (pages_id, content_id, font_id)
+        ))
+    kids = b' '.join(b"%d 0 R" % page_id for page_id in page_ids)
+    add(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids)))
+    catalog_id = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b''.join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog_id, xref)
+
+    with open(path, 'wb') as f:
+        f.write(bytes(out))
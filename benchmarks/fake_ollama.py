@@ -0,0 +1,124 @@
+# benchmarks/fake_ollama.py
+import argparse
+import hashlib
+import json
+import math
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def embed_text(text: str, dimension: int) -> list:
+    """تضمين حتمي بتجزئة الكلمات: نفس النص يعطي نفس المتجه، والنصوص المتشابهة متجهات متقاربة"""
+    vector = [0.0] * dimension
+    for word in _WORD_PATTERN.findall(text.lower()):
+        digest = hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest()
+        index = int.from_bytes(digest[:4], 'little') % dimension
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(value * value for value in vector))
+    if not norm:
+        vector[0] = norm = 1.0
+    return [value / norm for value in vector]
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    """/api/embed و/api/embeddings و/api/generate فقط، بزمن استجابة محدد مسبقاً"""
+
+    protocol_version = "HTTP/1.1"
+    config: argparse.Namespace = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+
+        if self.path == '/api/embed':
+            texts = body.get('input') or []
+            texts = [texts] if isinstance(texts, str) else texts
+            time.sleep(self.config.embed_latency + self.config.embed_latency_per_text * len(texts))
+            self._send_json({'model': body.get('model'), 'embeddings': [self._embed(text) for text in texts]})
+        elif self.path == '/api/embeddings':
+            time.sleep(self.config.embed_latency + self.config.embed_latency_per_text)
+            self._send_json({'embedding': self._embed(body.get('prompt') or '')})
+        elif self.path == '/api/generate':
+            self._generate(body)
+        else:
+            self._send_json({'error': f"not found: {self.path}"}, status=404)
+
+    def _embed(self, text: str) -> list:
+        return embed_text(text, self.config.dimension)
+
+    def _generate(self, body: dict):
+        prompt = body.get('prompt') or ''
+        tokens = [f"token{i} " for i in range(self.config.tokens)]
+        stats = {
+            'done': True,
+            'prompt_eval_count': len(prompt) // 4,
+            'prompt_eval_duration': int(self.config.generate_latency * 1e9),
+            'eval_count': len(tokens),
+            'eval_duration': int(self.config.token_latency * len(tokens) * 1e9),
+        }
+        time.sleep(self.config.generate_latency)
+
+        if not body.get('stream', True):
+            time.sleep(self.config.token_latency * len(tokens))
+            self._send_json({'model': body.get('model'), 'response': ''.join(tokens), **stats})
+            return
+
+        # البث بترميز chunked: رمز في كل سطر كما يفعل Ollama
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for token in tokens:
+            time.sleep(self.config.token_latency)
+            self._write_chunk({'model': body.get('model'), 'response': token, 'done': False})
+        self._write_chunk({'model': body.get('model'), 'response': '', **stats})
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, payload: dict):
+        data = json.dumps(payload).encode('utf-8') + b"\n"
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _send_json(self, payload: dict, status: int = 200):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Deterministic stand-in for the Ollama API used by the benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--dimension", type=int, default=384, help="Embedding vector length")
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="Seconds per embedding request")
+    parser.add_argument("--embed-latency-per-text", type=float, default=0.002, help="Extra seconds per embedded text")
+    parser.add_argument("--generate-latency", type=float, default=0.2, help="Seconds before the first generated token")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="Seconds per generated token")
+    parser.add_argument("--tokens", type=int, default=32, help="Tokens per generated answer")
+    return parser
+
+
+def main(argv=None):
+    config = build_parser().parse_args(argv)
+    handler = type("ConfiguredHandler", (FakeOllamaHandler,), {"config": config})
+    server = ThreadingHTTPServer((config.host, config.port), handler)
+    server.daemon_threads = True
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+# benchmarks/run.py
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Ingest and query benchmarks against a fake Ollama server and Qdrant local mode"
+    )
+    parser.add_argument("--docs", type=int, default=10, help="Documents generated per format")
+    parser.add_argument("--formats", default="txt,pdf,docx,pptx,csv,xlsx")
+    parser.add_argument("--paragraphs", type=int, default=20, help="Paragraphs per text document")
+    parser.add_argument("--rows", type=int, default=500, help="Rows per CSV/Excel document")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--search-requests", type=int, default=200)
+    parser.add_argument("--ask-requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent in-flight HTTP requests")
+    parser.add_argument("--warmup", type=int, default=5, help="Requests per endpoint excluded from the results")
+    parser.add_argument("--ollama-url", help="Use a running Ollama (or fake) server instead of starting one")
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--embed-latency-per-text", type=float, default=0.002)
+    parser.add_argument("--generate-latency", type=float, default=0.2)
+    parser.add_argument("--token-latency", type=float, default=0.01)
+    parser.add_argument("--tokens", type=int, default=32)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="Previous results file to compare against")
+    parser.add_argument("--label", default="", help="Free-form note stored with the results")
+    return parser
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port: int, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Fake Ollama server did not start on port {port}")
+
+
+def start_fake_ollama(args) -> Tuple[subprocess.Popen, str]:
+    """الخادم الوهمي في عملية منفصلة حتى لا ينافس التطبيق على الـ GIL"""
+    port = _free_port()
+    process = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.fake_ollama", "--port", str(port),
+        "--dimension", str(args.dimension),
+        "--embed-latency", str(args.embed_latency),
+        "--embed-latency-per-text", str(args.embed_latency_per_text),
+        "--generate-latency", str(args.generate_latency),
+        "--token-latency", str(args.token_latency),
+        "--tokens", str(args.tokens),
+    ], cwd=REPO_ROOT)
+    try:
+        _wait_for_port(port)
+    except Exception:
+        process.kill()
+        raise
+    return process, f"http://127.0.0.1:{port}"
+
+
+def configure_environment(args, ollama_url: str, work_dir: str):
+    """الإعدادات تُقرأ عند استيراد config.settings → تُضبط قبل استيراد الخدمات"""
+    os.environ["OLLAMA_HOST"] = ollama_url
+    # الذاكرات المؤقتة وقاعدة المهام في مجلد مؤقت؛ معطلة افتراضياً لقياس المسار البارد
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(work_dir, "embeddings.sqlite3")
+    os.environ["PDF_PAGE_CACHE_PATH"] = os.path.join(work_dir, "pdf_pages.sqlite3")
+    os.environ["INGEST_JOBS_DB_PATH"] = os.path.join(work_dir, "ingest_jobs.sqlite3")
+    os.environ["INGEST_SPOOL_DIR"] = os.path.join(work_dir, "uploads")
+    defaults = {
+        # QDRANT_LOCATION="" في البيئة = خادم Qdrant حقيقي من QDRANT_HOST
+        "QDRANT_LOCATION": ":memory:",
+        "COLLECTION_NAME": "benchmark",
+        "EMBEDDING_DIMENSION": str(args.dimension),
+        "EMBEDDING_CACHE_ENABLED": "false",
+        "ANSWER_CACHE_ENABLED": "false",
+        "PDF_PAGE_CACHE_ENABLED": "false",
+    }
+    for name, value in defaults.items():
+        os.environ.setdefault(name, value)
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """p50/p95/p99 بطريقة nearest-rank بالميلي ثانية"""
+    if not values:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "mean_ms": None, "max_ms": None}
+    ordered = sorted(values)
+
+    def rank(p: float) -> float:
+        return round(ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)] * 1000, 2)
+
+    return {
+        "p50_ms": rank(50),
+        "p95_ms": rank(95),
+        "p99_ms": rank(99),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+def peak_rss_mb() -> Dict[str, Optional[float]]:
+    """أعلى استهلاك للذاكرة: العملية الحالية وعمليات الاستخراج الحية (VmHWM على Linux)"""
+    # ru_maxrss بالكيلوبايت على Linux وبالبايت على macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    workers = 0.0
+    for child in multiprocessing.active_children():
+        try:
+            with open(f"/proc/{child.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        workers += int(line.split()[1]) / 1024
+        except OSError:
+            continue
+    return {
+        "process_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "extraction_workers_mb": round(workers, 1),
+    }
+
+
+def stage_totals() -> Dict[str, tuple]:
+    from services import metrics
+
+    return {key[0]: value for key, value in metrics.STAGE_SECONDS.totals().items()}
+
+
+def stage_delta(before: Dict[str, tuple], after: Dict[str, tuple]) -> Dict[str, Dict[str, float]]:
+    """زمن كل مرحلة خلال جزء من القياس (من مقاييس /metrics)"""
+    delta = {}
+    for stage, (count, seconds) in after.items():
+        previous_count, previous_seconds = before.get(stage, (0, 0.0))
+        if count > previous_count:
+            delta[stage] = {"count": count - previous_count, "seconds": round(seconds - previous_seconds, 4)}
+    return delta
+
+
+def bench_chunking(files: List[Dict[str, str]], chunk_size: int) -> Dict[str, Any]:
+    """التقسيم وحده على نص مستخرج مسبقاً (بدون Ollama أو Qdrant)"""
+    from config.settings import settings
+    from services.chunker import effective_chunk_tokens
+    from services.document_processor import DocumentProcessor
+
+    processor = DocumentProcessor()
+    documents = [list(processor.iter_document(file['path'])) for file in files]
+    chars = sum(len(segment['text']) for segments in documents for segment in segments)
+    chunk_tokens = effective_chunk_tokens(chunk_size, settings.EMBEDDING_MAX_TOKENS)
+
+    started = time.perf_counter()
+    chunks = sum(
+        1 for segments in documents for _ in processor.iter_chunks(segments, chunk_tokens, settings.CHUNK_OVERLAP)
+    )
+    seconds = time.perf_counter() - started
+    return {
+        "documents": len(documents),
+        "chars": chars,
+        "chunks": chunks,
+        "seconds": round(seconds, 4),
+        "chars_per_second": round(chars / seconds) if seconds else None,
+        "chunks_per_second": round(chunks / seconds, 1) if seconds else None,
+    }
+
+
+def bench_ingest(store, files: List[Dict[str, str]], formats: List[str], chunk_size: int) -> Dict[str, Any]:
+    """رفع كل صيغة كدفعة واحدة كما يفعل `cli.py ingest`"""
+    results = {"formats": {}}
+    total_seconds = 0.0
+    total_docs = total_chunks = failed = 0
+    before = stage_totals()
+    rss_before = peak_rss_mb()["process_mb"]
+
+    for file_format in formats:
+        batch = [{'path': file['path'], 'name': file['name']} for file in files if file['format'] == file_format]
+        stats = store.upload_documents(batch, chunk_size, force=True)
+        results["formats"][file_format] = {
+            "documents": stats['files'],
+            "failed": stats['files_failed'],
+            "chunks": stats['chunks'],
+            "seconds": stats['seconds'],
+            "docs_per_second": stats['files_per_second'],
+            "chunks_per_second": stats['chunks_per_second'],
+        }
+        if stats['errors']:
+            results["formats"][file_format]["errors"] = stats['errors']
+        total_seconds += stats['seconds']
+        total_docs += stats['files']
+        total_chunks += stats['chunks']
+        failed += stats['files_failed']
+
+    results.update({
+        "documents": total_docs,
+        "failed": failed,
+        "chunks": total_chunks,
+        "seconds": round(total_seconds, 3),
+        "docs_per_second": round(total_docs / total_seconds, 2) if total_seconds else None,
+        "chunks_per_second": round(total_chunks / total_seconds, 2) if total_seconds else None,
+        "rss_before_mb": rss_before,
+        "peak_rss": peak_rss_mb(),
+        "stages": stage_delta(before, stage_totals()),
+    })
+    return results
+
+
+async def _load(client, method: str, url: str, queries: List[str], requests: int,
+                concurrency: int, warmup: int) -> Dict[str, Any]:
+    """عدد ثابت من الطلبات بتزامن محدد؛ زمن كل طلب من الإرسال حتى استلام الاستجابة كاملة"""
+    async def send(query: str) -> tuple:
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, params={"query": query, "limit": 5})
+            ok = response.status_code == 200
+        except Exception:
+            ok = False
+        return ok, time.perf_counter() - started
+
+    for query in queries[:warmup]:
+        await send(query)
+
+    latencies: List[float] = []
+    errors = 0
+    next_index = 0
+    before = stage_totals()
+
+    async def worker():
+        nonlocal next_index, errors
+        while next_index < requests:
+            query = queries[next_index % len(queries)]
+            next_index += 1
+            ok, seconds = await send(query)
+            if ok:
+                latencies.append(seconds)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(max(1, concurrency))])
+    seconds = time.perf_counter() - started
+
+    return {
+        "requests": requests,
+        "errors": errors,
+        "concurrency": concurrency,
+        "seconds": round(seconds, 3),
+        "requests_per_second": round(len(latencies) / seconds, 2) if seconds else None,
+        **percentiles(latencies),
+        "stages": stage_delta(before, stage_totals()),
+    }
+
+
+async def bench_queries(app, queries: List[str], args) -> Dict[str, Any]:
+    """الطلبات تمر بتطبيق FastAPI كاملاً (middleware، التحقق، الاعتماديات) بدون شبكة"""
+    import httpx
+    from services.container import container
+
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            search = await _load(client, "GET", "/api/v1/search/", queries, args.search_requests,
+                                 args.concurrency, args.warmup)
+            ask = await _load(client, "POST", "/ask", queries, args.ask_requests, args.concurrency, args.warmup)
+    finally:
+        await container.aclose()
+    return {"search": search, "ask": ask}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> Dict[str, Any]:
+    from benchmarks.corpus import CorpusGenerator
+
+    formats = [name.strip() for name in args.formats.split(',') if name.strip()]
+    fake_ollama = None
+    ollama_url = args.ollama_url
+    if not ollama_url:
+        fake_ollama, ollama_url = start_fake_ollama(args)
+
+    try:
+        with tempfile.TemporaryDirectory(prefix="rag-benchmark-") as work_dir:
+            configure_environment(args, ollama_url, work_dir)
+            from config.settings import settings
+            from main import app
+            from services.container import container
+
+            generator = CorpusGenerator(args.seed, args.paragraphs, args.rows)
+            corpus_started = time.perf_counter()
+            files = generator.generate(os.path.join(work_dir, "corpus"), args.docs, formats)
+            corpus_seconds = time.perf_counter() - corpus_started
+
+            results = {
+                "meta": {
+                    "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                    "label": args.label,
+                    "git_commit": _git_commit(),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "cpu_count": os.cpu_count(),
+                    "arguments": {name: value for name, value in vars(args).items() if name not in ("output", "compare")},
+                    # المسارات المؤقتة ومنفذ الخادم الوهمي تتغير في كل تشغيل ولا تؤثر على المقارنة
+                    "settings": {
+                        name: value for name, value in settings.model_dump().items()
+                        if name != "OLLAMA_HOST" and not name.endswith(("_PATH", "_DIR"))
+                    },
+                    "corpus": {
+                        "files": len(files),
+                        "bytes": sum(os.path.getsize(file['path']) for file in files),
+                        "seconds": round(corpus_seconds, 3),
+                    },
+                },
+                "chunking": bench_chunking(files, args.chunk_size),
+            }
+            results["ingest"] = bench_ingest(container.doc_store, files, formats, args.chunk_size)
+            results.update(asyncio.run(bench_queries(app, generator.queries(max(args.search_requests, 1)), args)))
+            return results
+    finally:
+        if fake_ollama is not None:
+            fake_ollama.terminate()
+            fake_ollama.wait(timeout=10)
+
+
+def _default_output() -> str:
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    return os.path.join(REPO_ROOT, "benchmarks", "results", f"{timestamp}.json")
+
+
+def _summary(results: Dict[str, Any]) -> str:
+    ingest, search, ask = results["ingest"], results["search"], results["ask"]
+    return (
+        f"chunking: {results['chunking']['chars_per_second']} chars/sec\n"
+        f"ingest:   {ingest['documents']} docs ({ingest['failed']} failed), {ingest['chunks']} chunks in "
+        f"{ingest['seconds']}s → {ingest['docs_per_second']} docs/sec, {ingest['chunks_per_second']} chunks/sec, "
+        f"peak RSS {ingest['peak_rss']['process_mb']} MB (+{ingest['peak_rss']['extraction_workers_mb']} MB workers)\n"
+        f"search:   p50 {search['p50_ms']} ms, p95 {search['p95_ms']} ms, p99 {search['p99_ms']} ms, "
+        f"{search['requests_per_second']} req/sec, {search['errors']} errors\n"
+        f"ask:      p50 {ask['p50_ms']} ms, p95 {ask['p95_ms']} ms, p99 {ask['p99_ms']} ms, "
+        f"{ask['requests_per_second']} req/sec, {ask['errors']} errors"
+    )
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    # فهارس الـ payload لا تعمل في وضع Qdrant المحلي (تحذير عند إنشاء كل مجموعة)
+    warnings.filterwarnings("ignore", message="Payload indexes have no effect in the local Qdrant")
+    results = run(args)
+
+    output = args.output or _default_output()
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False, default=str)
+
+    print(_summary(results))
+    print(f"Results written to {output}")
+
+    if args.compare:
+        from benchmarks.compare import compare_files
+        print()
+        print(compare_files(args.compare, output))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
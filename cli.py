@@ -0,0 +1,103 @@
+# src/cli.py
+import argparse
+import logging
+import os
+import sys
+from collections import Counter
+from config.settings import settings
+from services.document_processor import DocumentProcessor
+
+
+def _collect_files(directory: str):
+    """جمع الملفات المدعومة من المجلد وكل مجلداته الفرعية"""
+    files = []
+    for root, _, names in os.walk(directory):
+        for name in sorted(names):
+            if os.path.splitext(name)[1].lower() in DocumentProcessor.SUPPORTED_EXTENSIONS:
+                files.append({'path': os.path.join(root, name), 'name': name})
+    return files
+
+
+def ingest(args) -> int:
+    from services.document_store import QdrantDocumentStore
+
+    files = _collect_files(args.directory)
+    if not files:
+        print(f"No supported files found in {args.directory}")
+        return 1
+
+    # المستندات تُعرّف باسم الملف؛ الأسماء المكررة ستستبدل بعضها
+    duplicates = [name for name, count in Counter(f['name'] for f in files).items() if count > 1]
+    if duplicates:
+        logging.warning(f"{len(duplicates)} file names appear more than once; later files replace earlier ones: {duplicates[:10]}")
+
+    print(f"Ingesting {len(files)} files from {args.directory} ...")
+    doc_store = QdrantDocumentStore()
+    stats = doc_store.upload_documents(files, args.chunk_size, force=args.force)
+
+    print(
+        f"Done in {stats['seconds']}s: {stats['files_indexed']} indexed, {stats['files_skipped']} skipped, "
+        f"{stats['files_failed']} failed\n"
+        f"{stats['chunks']} chunks ({stats['chunks_embedded']} embedded)\n"
+        f"{stats['files_per_second']} files/sec, {stats['chunks_per_second']} chunks/sec"
+    )
+    for name, error in stats['errors'].items():
+        print(f"  FAILED {name}: {error}")
+    return 1 if stats['files_failed'] else 0
+
+
+def rebuild_catalog(args) -> int:
+    from services.document_store import QdrantDocumentStore
+
+    created = QdrantDocumentStore().rebuild_catalog()
+    print(f"Catalog rebuilt: {created} documents added")
+    return 0
+
+
+def migrate(args) -> int:
+    from services.document_store import QdrantDocumentStore
+
+    doc_store = QdrantDocumentStore()
+    print(
+        f"Rebuilding '{doc_store.collection_name}' with quantization={settings.QDRANT_QUANTIZATION}, "
+        f"on_disk={settings.QDRANT_VECTORS_ON_DISK}, hnsw m={settings.QDRANT_HNSW_M} "
+        f"ef_construct={settings.QDRANT_HNSW_EF_CONSTRUCT} ..."
+    )
+
+    def progress(collection_name: str, copied: int):
+        print(f"  {collection_name}: {copied} points copied", end="\r", flush=True)
+
+    copied = doc_store.migrate_collection(args.batch_size, progress)
+    print(f"\nDone: {copied} points migrated")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Document Search System command line tools")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = subcommands.add_parser("ingest", help="Index every supported file in a directory")
+    ingest_parser.add_argument("directory")
+    ingest_parser.add_argument("--chunk-size", type=int, default=settings.CHUNK_SIZE,
+                               help="Chunk size in tokens (capped at EMBEDDING_MAX_TOKENS)")
+    ingest_parser.add_argument("--force", action="store_true", help="Re-index files even if unchanged")
+    ingest_parser.set_defaults(func=ingest)
+
+    catalog_parser = subcommands.add_parser(
+        "rebuild-catalog", help="Create catalog entries for documents indexed before the catalog existed"
+    )
+    catalog_parser.set_defaults(func=rebuild_catalog)
+
+    migrate_parser = subcommands.add_parser(
+        "migrate", help="Rebuild the collection with the current QDRANT_* storage settings"
+    )
+    migrate_parser.add_argument("--batch-size", type=int, default=settings.UPSERT_BATCH_SIZE)
+    migrate_parser.set_defaults(func=migrate)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
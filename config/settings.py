@@ -6,16 +6,95 @@ class Settings(BaseSettings):
     # Qdrant Settings
     QDRANT_HOST: str = os.getenv("QDRANT_HOST", "localhost")
     QDRANT_PORT: int = int(os.getenv("QDRANT_PORT", "6333"))
+    QDRANT_GRPC_PORT: int = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+    QDRANT_PREFER_GRPC: bool = os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true"  # binary vectors instead of JSON
+    QDRANT_TIMEOUT_SECONDS: int = int(os.getenv("QDRANT_TIMEOUT_SECONDS", "30"))
+    QDRANT_LOCATION: str = os.getenv("QDRANT_LOCATION", "")  # ":memory:" or a directory = Qdrant local mode without a server
     COLLECTION_NAME: str = os.getenv("COLLECTION_NAME", "documents")
     
+    # Collection Storage Settings (applied when the collection is created; use `cli.py migrate` for existing ones)
+    QDRANT_QUANTIZATION: str = os.getenv("QDRANT_QUANTIZATION", "none")  # none | scalar | binary
+    QDRANT_QUANTIZATION_ALWAYS_RAM: bool = os.getenv("QDRANT_QUANTIZATION_ALWAYS_RAM", "true").lower() == "true"
+    QDRANT_VECTORS_ON_DISK: bool = os.getenv("QDRANT_VECTORS_ON_DISK", "false").lower() == "true"
+    QDRANT_HNSW_M: int = int(os.getenv("QDRANT_HNSW_M", "16"))
+    QDRANT_HNSW_EF_CONSTRUCT: int = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+    
+    # Collection Search Settings
+    QDRANT_SEARCH_HNSW_EF: int = int(os.getenv("QDRANT_SEARCH_HNSW_EF", "0"))  # 0 = Qdrant default
+    QDRANT_SEARCH_RESCORE: bool = os.getenv("QDRANT_SEARCH_RESCORE", "true").lower() == "true"  # re-rank quantized hits with original vectors
+    QDRANT_SEARCH_OVERSAMPLING: float = float(os.getenv("QDRANT_SEARCH_OVERSAMPLING", "2.0"))
+    
+    # Ollama Settings
+    OLLAMA_HOST: str = os.getenv("OLLAMA_HOST", "ollama")  # host name or full URL
+    OLLAMA_PORT: int = int(os.getenv("OLLAMA_PORT", "11434"))
+    OLLAMA_TIMEOUT_SECONDS: float = float(os.getenv("OLLAMA_TIMEOUT_SECONDS", "300"))
+    
+    # HTTP Client Settings (shared, pooled clients for Qdrant and Ollama)
+    HTTP_MAX_CONNECTIONS: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "32"))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "16"))
+    HTTP2_ENABLED: bool = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+    CLIENT_MAX_RETRIES: int = int(os.getenv("CLIENT_MAX_RETRIES", "3"))
+    CLIENT_RETRY_BACKOFF_SECONDS: float = float(os.getenv("CLIENT_RETRY_BACKOFF_SECONDS", "0.5"))
+    CLIENT_RETRY_MAX_BACKOFF_SECONDS: float = float(os.getenv("CLIENT_RETRY_MAX_BACKOFF_SECONDS", "8"))
+    
     # Model Settings
     MODEL_EMBEDDING_NAME: str = os.getenv("MODEL_EMBEDDING_NAME", "mahonzhan/all-MiniLM-L6-v2")
     MODEL_NAME: str = os.getenv("MODEL_NAME", "llama3.1:8b")
     
+    # Embedding Settings
+    EMBEDDING_DIMENSION: int = int(os.getenv("EMBEDDING_DIMENSION", "0"))  # 0 = ask Ollama once when creating the collection
+    EMBEDDING_MAX_TOKENS: int = int(os.getenv("EMBEDDING_MAX_TOKENS", "256"))  # model max length; caps CHUNK_SIZE (0 = no cap)
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+    EMBEDDING_MAX_IN_FLIGHT: int = int(os.getenv("EMBEDDING_MAX_IN_FLIGHT", "4"))
+    EMBEDDING_CACHE_ENABLED: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_PATH: str = os.getenv("EMBEDDING_CACHE_PATH", "cache/embeddings.sqlite3")
+    EMBEDDING_CACHE_MEMORY_SIZE: int = int(os.getenv("EMBEDDING_CACHE_MEMORY_SIZE", "10000"))
+    
+    # Answer Cache Settings
+    ANSWER_CACHE_ENABLED: bool = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_SIZE: int = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+    ANSWER_CACHE_TTL_SECONDS: int = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+    ANSWER_CACHE_SEMANTIC_THRESHOLD: float = float(os.getenv("ANSWER_CACHE_SEMANTIC_THRESHOLD", "0.95"))  # 0 = exact only
+    
+    # Retrieval Settings
+    RETRIEVAL_MODE: str = os.getenv("RETRIEVAL_MODE", "hybrid")  # hybrid | dense
+    HYBRID_PREFETCH_LIMIT: int = int(os.getenv("HYBRID_PREFETCH_LIMIT", "50"))  # candidates per retriever before fusion
+    CONTEXT_MAX_TOKENS: int = int(os.getenv("CONTEXT_MAX_TOKENS", "1500"))  # estimated prompt context budget
+    
+    # Batch Ask Settings
+    ASK_BATCH_MAX_QUERIES: int = int(os.getenv("ASK_BATCH_MAX_QUERIES", "100"))
+    ASK_BATCH_CONCURRENCY: int = int(os.getenv("ASK_BATCH_CONCURRENCY", "2"))  # concurrent generations against Ollama
+    
+    # Rerank Settings
+    RERANKER: str = os.getenv("RERANKER", "lexical")  # lexical | cross-encoder | none
+    RERANK_ENABLED: bool = os.getenv("RERANK_ENABLED", "false").lower() == "true"  # default for /ask?rerank=
+    RERANK_MODEL: str = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    RERANK_CANDIDATES: int = int(os.getenv("RERANK_CANDIDATES", "20"))  # chunks fetched from Qdrant before reranking
+    RERANK_MIN_SCORE_RATIO: float = float(os.getenv("RERANK_MIN_SCORE_RATIO", "0.5"))  # drop chunks below ratio * best score
+    
+    # Extraction Settings
+    EXTRACTION_WORKERS: int = int(os.getenv("EXTRACTION_WORKERS", str(os.cpu_count() or 1)))  # 0 = extract in-process
+    EXTRACTION_TIMEOUT_SECONDS: float = float(os.getenv("EXTRACTION_TIMEOUT_SECONDS", "300"))
+    EXTRACTION_MEMORY_LIMIT_MB: int = int(os.getenv("EXTRACTION_MEMORY_LIMIT_MB", "2048"))  # 0 = no limit
+    TABLE_READ_CHUNK_ROWS: int = int(os.getenv("TABLE_READ_CHUNK_ROWS", "10000"))  # CSV/Excel rows parsed at a time
+    PDF_PAGES_PER_TASK: int = int(os.getenv("PDF_PAGES_PER_TASK", "8"))  # PDF pages per extraction worker task
+    PDF_PAGE_CACHE_ENABLED: bool = os.getenv("PDF_PAGE_CACHE_ENABLED", "true").lower() == "true"
+    PDF_PAGE_CACHE_PATH: str = os.getenv("PDF_PAGE_CACHE_PATH", "cache/pdf_pages.sqlite3")
+    
+    # Ingest Queue Settings
+    INGEST_WORKERS: int = int(os.getenv("INGEST_WORKERS", "2"))
+    INGEST_MAX_PENDING_JOBS: int = int(os.getenv("INGEST_MAX_PENDING_JOBS", "100"))
+    INGEST_MAX_CONCURRENT_EMBEDDINGS: int = int(os.getenv("INGEST_MAX_CONCURRENT_EMBEDDINGS", "2"))
+    INGEST_JOBS_DB_PATH: str = os.getenv("INGEST_JOBS_DB_PATH", "cache/ingest_jobs.sqlite3")
+    INGEST_SHUTDOWN_TIMEOUT_SECONDS: float = float(os.getenv("INGEST_SHUTDOWN_TIMEOUT_SECONDS", "10"))  # unfinished jobs resume on restart
+    INGEST_SPOOL_DIR: str = os.getenv("INGEST_SPOOL_DIR", "cache/uploads")
+    
     # Application Settings
     CHUNK_SIZE: int = 500
     CHUNK_OVERLAP: int = 50
-    MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
+    MAX_FILE_SIZE: int = int(os.getenv("MAX_FILE_SIZE", str(10 * 1024 * 1024)))  # 10MB per uploaded file
+    UPLOAD_CHUNK_BYTES: int = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))  # uploads are copied to the spool dir in blocks of this size
+    UPSERT_BATCH_SIZE: int = int(os.getenv("UPSERT_BATCH_SIZE", "256"))
     
     class Config:
         env_file = ".env"
@@ -1,20 +1,55 @@
 # src/main.py
-from fastapi import FastAPI, Query, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Query, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from pydantic import BaseModel, Field
+import json
+import time
+from typing import List, Optional
 from api.routes import router
+from services.container import container, get_rag_service
 from services.RAG_service import RAGService
+from services import metrics
 from config.settings import settings
-from services.document_store import QdrantDocumentStore
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # الخدمات تُنشأ مرة واحدة هنا وليس عند استيراد الوحدات؛ الطابور يستأنف المهام المعلقة
+    container.ingest_queue.start()
+    yield
+    await container.aclose()
+
+
 app = FastAPI(
     title="Qdrant Document Search System",
     description="A sophisticated document search and management system using Qdrant vector database",
     version="2.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 
-doc_store = QdrantDocumentStore()
-rag_service = RAGService(doc_store)
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # قالب المسار وليس المسار الفعلي حتى لا تنفجر قيم الـ labels (/chunks/{point_id})
+        route = request.scope.get("route")
+        metrics.HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status
+        )
+
+
 # تضمين routes
 app.include_router(router, prefix="/api/v1")
 
@@ -26,17 +61,83 @@ async def root():
         "docs": "/docs"
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+async def _ndjson(first_event, events):
+    yield json.dumps(first_event, ensure_ascii=False) + "\n"
+    async for event in events:
+        yield json.dumps(event, ensure_ascii=False) + "\n"
+
 @app.post("/ask")
 async def ask_qusetion(
     query: str = Query(..., description= "Your Answer"),
-    limit: int = Query(5)):
+    limit: int = Query(5),
+    stream: bool = Query(False, description="Stream sources then answer tokens as NDJSON"),
+    rerank: Optional[bool] = Query(None, description="Over-fetch and rerank chunks before generation (default: RERANK_ENABLED)"),
+    timings: bool = Query(False, description="Include a per-stage timing breakdown in seconds (non-streaming only)"),
+    rag_service: RAGService = Depends(get_rag_service)):
     
     try:
-        result = rag_service.ask_question(query, limit)
-        return result
+        if stream:
+            # البحث يتم قبل بدء الاستجابة حتى تُعاد أخطاؤه برمز 500
+            events = rag_service.ask_question_stream(query, limit, rerank)
+            first_event = await events.__anext__()
+            return StreamingResponse(_ndjson(first_event, events), media_type="application/x-ndjson")
+
+        if not timings:
+            return await rag_service.ask_question_async(query, limit, rerank)
+
+        started = time.perf_counter()
+        with metrics.collect_timings() as stage_seconds:
+            result = await rag_service.ask_question_async(query, limit, rerank)
+        breakdown = {stage: round(seconds, 4) for stage, seconds in stage_seconds.items()}
+        breakdown["total"] = round(time.perf_counter() - started, 4)
+        return {**result, "timings": breakdown}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing question: {str(e)}")
 
+class AskBatchRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1)
+    limit: int = 5
+    rerank: Optional[bool] = None
+
+async def _ndjson_batch(results):
+    async for index, result in results:
+        yield json.dumps({"index": index, **result}, ensure_ascii=False) + "\n"
+
+@app.post("/ask/batch")
+async def ask_batch(
+    request: AskBatchRequest,
+    stream: bool = Query(False, description="Stream each answer as NDJSON as soon as it completes"),
+    rag_service: RAGService = Depends(get_rag_service)):
+    """الإجابة عن مجموعة أسئلة بتضمين وبحث مجمّعين وتوليد متزامن محدود"""
+    if len(request.queries) > settings.ASK_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=422, detail=f"At most {settings.ASK_BATCH_MAX_QUERIES} queries per batch")
+
+    results = rag_service.ask_questions_async(request.queries, request.limit, request.rerank)
+    if stream:
+        return StreamingResponse(_ndjson_batch(results), media_type="application/x-ndjson")
+
+    started = time.perf_counter()
+    answers = [None] * len(request.queries)
+    async for index, result in results:
+        answers[index] = result
+
+    return {
+        "results": answers,
+        "total": len(answers),
+        "failed": sum(1 for answer in answers if "error" in answer),
+        "seconds": round(time.perf_counter() - started, 3)
+    }
+
+@app.get("/ask/cache/stats")
+async def answer_cache_stats(rag_service: RAGService = Depends(get_rag_service)):
+    if rag_service.answer_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **rag_service.answer_cache.stats()}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
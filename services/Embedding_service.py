@@ -1,19 +1,170 @@
-from ollama import Client
+import asyncio
 from typing import Optional, Dict, Any, List
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from config.settings import settings
+from .embedding_cache import EmbeddingCache, get_embedding_cache
+from .clients import get_ollama_client, get_async_ollama_client
+from . import metrics
 class EmbeddingSrevice:
     def __init__(self):
-        self.ollama = Client(host="http://ollama:11434")
+        self.ollama = get_ollama_client()
+        self.async_ollama = get_async_ollama_client()
         self.embedding_model = settings.MODEL_EMBEDDING_NAME
+        self.cache = get_embedding_cache()
+        self._dimension: Optional[int] = settings.EMBEDDING_DIMENSION or None
 
     def get_embedding_dimension(self) -> int:
-        emb = self.ollama.embeddings(model= self.embedding_model, prompt= 'text')
-        return len(emb['embedding'])
+        """طول متجه النموذج: من الإعدادات أو من طلب واحد إلى Ollama ثم يُحفظ"""
+        if self._dimension is None:
+            emb = self.ollama.embeddings(model= self.embedding_model, prompt= 'text')
+            self._dimension = len(emb['embedding'])
+        return self._dimension
+
+    def set_embedding_dimension(self, dimension: int):
+        self._dimension = dimension
 
 
     def get_embedding(self, text: str) -> List[float]:
+        key = EmbeddingCache.make_key(self.embedding_model, text)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                metrics.EMBEDDED_TEXTS.inc(source="cache")
+                return cached
+
+        try:
+            self._count_request([text])
+            with metrics.stage('embed'):
+                response = self.ollama.embeddings(model= self.embedding_model, prompt= text)
+            embedding = response["embedding"]
+        except Exception as e:
+            raise Exception(f"Error getting embedding: {str(e)}")
+
+        if self.cache is not None:
+            self.cache.put(key, embedding)
+        return embedding
+
+    async def get_embedding_async(self, text: str) -> List[float]:
+        """نسخة غير متزامنة من get_embedding لا تحجب حلقة الأحداث"""
+        key = EmbeddingCache.make_key(self.embedding_model, text)
+        if self.cache is not None:
+            # قراءة SQLite وكتابته في خيط منفصل حتى لا تنتظرها حلقة الأحداث
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                metrics.EMBEDDED_TEXTS.inc(source="cache")
+                return cached
+
         try:
-            response = self.ollama.embeddings(model= self.embedding_model, prompt= text)
-            return response["embedding"]
+            self._count_request([text])
+            with metrics.stage('embed'):
+                response = await self.async_ollama.embeddings(model= self.embedding_model, prompt= text)
+            embedding = response["embedding"]
         except Exception as e:
             raise Exception(f"Error getting embedding: {str(e)}")
+
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.put, key, embedding)
+        return embedding
+
+    def get_embeddings(self, texts: List[str], batch_size: Optional[int] = None) -> List[List[float]]:
+        """توليد التضمينات لقائمة نصوص على دفعات مع حد لعدد الطلبات المتزامنة"""
+        if not texts:
+            return []
+
+        keys = [EmbeddingCache.make_key(self.embedding_model, text) for text in texts]
+        found = self.cache.get_many(keys) if self.cache is not None else {}
+        if found:
+            metrics.EMBEDDED_TEXTS.inc(sum(1 for key in keys if key in found), source="cache")
+
+        # تضمين النصوص غير الموجودة في الذاكرة المؤقتة فقط (مرة واحدة لكل نص مكرر)
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing:
+            embeddings = self._embed_texts(list(missing.values()), batch_size)
+            computed = dict(zip(missing.keys(), embeddings))
+            if self.cache is not None:
+                self.cache.put_many(computed)
+            found.update(computed)
+
+        return [found[key] for key in keys]
+
+    async def get_embeddings_async(self, texts: List[str], batch_size: Optional[int] = None) -> List[List[float]]:
+        """نسخة غير متزامنة من get_embeddings (مثلاً لتضمين مجموعة أسئلة دفعة واحدة)"""
+        if not texts:
+            return []
+
+        keys = [EmbeddingCache.make_key(self.embedding_model, text) for text in texts]
+        found = await asyncio.to_thread(self.cache.get_many, keys) if self.cache is not None else {}
+        if found:
+            metrics.EMBEDDED_TEXTS.inc(sum(1 for key in keys if key in found), source="cache")
+
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing:
+            missing_texts = list(missing.values())
+            batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+            slots = asyncio.Semaphore(max(1, settings.EMBEDDING_MAX_IN_FLIGHT))
+
+            async def embed(batch: List[str]) -> List[List[float]]:
+                async with slots:
+                    return await self._embed_batch_async(batch)
+
+            results = await asyncio.gather(*[
+                embed(missing_texts[i:i + batch_size]) for i in range(0, len(missing_texts), batch_size)
+            ])
+            computed = dict(zip(missing.keys(), [embedding for batch in results for embedding in batch]))
+            if self.cache is not None:
+                await asyncio.to_thread(self.cache.put_many, computed)
+            found.update(computed)
+
+        return [found[key] for key in keys]
+
+    def _embed_texts(self, texts: List[str], batch_size: Optional[int] = None) -> List[List[float]]:
+        batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        if len(batches) == 1:
+            return self._embed_batch(batches[0])
+
+        # نافذة محدودة من الدفعات قيد التنفيذ مع الحفاظ على ترتيب النتائج
+        max_in_flight = max(1, settings.EMBEDDING_MAX_IN_FLIGHT)
+        embeddings = []
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            for batch in batches:
+                if len(pending) >= max_in_flight:
+                    embeddings.extend(pending.popleft().result())
+                pending.append(executor.submit(self._embed_batch, batch))
+            while pending:
+                embeddings.extend(pending.popleft().result())
+
+        return embeddings
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        try:
+            self._count_request(texts)
+            with metrics.stage('embed'):
+                response = self.ollama.embed(model= self.embedding_model, input= texts)
+            embeddings = response["embeddings"]
+        except Exception as e:
+            raise Exception(f"Error getting embeddings: {str(e)}")
+
+        if len(embeddings) != len(texts):
+            raise Exception(f"Error getting embeddings: expected {len(texts)} vectors, got {len(embeddings)}")
+        return embeddings
+
+    async def _embed_batch_async(self, texts: List[str]) -> List[List[float]]:
+        try:
+            self._count_request(texts)
+            with metrics.stage('embed'):
+                response = await self.async_ollama.embed(model= self.embedding_model, input= texts)
+            embeddings = response["embeddings"]
+        except Exception as e:
+            raise Exception(f"Error getting embeddings: {str(e)}")
+
+        if len(embeddings) != len(texts):
+            raise Exception(f"Error getting embeddings: expected {len(texts)} vectors, got {len(embeddings)}")
+        return embeddings
+
+    @staticmethod
+    def _count_request(texts: List[str]):
+        metrics.EMBEDDED_TEXTS.inc(len(texts), source="ollama")
+        metrics.PAYLOAD_BYTES.inc(sum(len(text.encode('utf-8')) for text in texts), target="ollama_embed")
@@ -1,40 +1,112 @@
-from ollama import Client
-from typing import Any, List, Dict
+from typing import Any, List, Dict, AsyncIterator, Optional, Tuple
+import asyncio
+import time
 from services.document_store import QdrantDocumentStore
-from services.Embedding_service import EmbeddingSrevice
+from services.answer_cache import AnswerCache
+from services.context_builder import ContextBuilder
+from services.reranker import get_reranker
+from services import metrics
 from config.settings import settings
 
 class RAGService:
+    NO_ANSWER = "Sorry, I don't found any enough information for answer you question"
+
     def __init__(self, doc_store: QdrantDocumentStore):
-        self.embedding = EmbeddingSrevice()
-        self.ollama = Client(host="http://ollama:11434")
+        # نفس خدمة التضمين وعملاء Ollama الخاصة بالمخزن (ذاكرة مؤقتة واتصالات مشتركة)
+        self.embedding = doc_store.embedding
+        self.ollama = self.embedding.ollama
+        self.async_ollama = self.embedding.async_ollama
         self.document_store = doc_store
         self.llm_model = settings.MODEL_NAME
-    
-    def search_similar_chunks(self, query: str, limit: int = 5) -> List[Dict[str,Any]]:
-        query_embedding = self.embedding.get_embedding(query)
+        self.context_builder = ContextBuilder(settings.CONTEXT_MAX_TOKENS, max_overlap_words=2 * settings.CHUNK_OVERLAP)
+        self.reranker = get_reranker(settings.RERANKER, settings.RERANK_MODEL)
+
+        self.answer_cache = None
+        if settings.ANSWER_CACHE_ENABLED:
+            self.answer_cache = AnswerCache(
+                max_size=settings.ANSWER_CACHE_SIZE,
+                ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+                semantic_threshold=settings.ANSWER_CACHE_SEMANTIC_THRESHOLD
+            )
+            # أي إجابة تعتمد على ملف أُعيد رفعه أو حُذف تصبح غير صالحة
+            doc_store.add_change_listener(self.answer_cache.invalidate_file)
+
+    def _use_rerank(self, rerank: Optional[bool]) -> bool:
+        if rerank is None:
+            rerank = settings.RERANK_ENABLED
+        return rerank and self.reranker is not None
 
-        search_results = self.document_store.client.search(
-            collection_name= self.document_store.collection_name,
-            query_vector= query_embedding,
-            limit = limit
+    def _fetch_limit(self, limit: int, rerank: bool) -> int:
+        """مع إعادة الترتيب نجلب مرشحين أكثر ثم نُبقي الأفضل فقط"""
+        return max(limit, settings.RERANK_CANDIDATES) if rerank else limit
+
+    def search_similar_chunks(self, query: str, limit: int = 5, query_embedding: Optional[List[float]] = None,
+                              rerank: bool = False, hnsw_ef: Optional[int] = None,
+                              rescore: Optional[bool] = None) -> List[Dict[str,Any]]:
+        if query_embedding is None:
+            query_embedding = self.embedding.get_embedding(query)
+
+        search_results = self.document_store.search_documents(
+            query, self._fetch_limit(limit, rerank), score_threshold=None, query_embedding=query_embedding,
+            hnsw_ef=hnsw_ef, rescore=rescore
         )
 
+        chunks = self._format_chunks(search_results)
+        if rerank:
+            chunks = self._rerank(query, chunks, limit)
+        return chunks
+
+    async def search_similar_chunks_async(self, query: str, limit: int = 5, query_embedding: Optional[List[float]] = None,
+                                          rerank: bool = False, hnsw_ef: Optional[int] = None,
+                                          rescore: Optional[bool] = None) -> List[Dict[str,Any]]:
+        if query_embedding is None:
+            query_embedding = await self.embedding.get_embedding_async(query)
+
+        search_results = await self.document_store.search_documents_async(
+            query, self._fetch_limit(limit, rerank), score_threshold=None, query_embedding=query_embedding,
+            hnsw_ef=hnsw_ef, rescore=rescore
+        )
+
+        chunks = self._format_chunks(search_results)
+        if rerank:
+            # نموذج الـ cross-encoder يعمل على المعالج → خارج حلقة الأحداث
+            chunks = await asyncio.to_thread(self._rerank, query, chunks, limit)
+        return chunks
+
+    def _rerank(self, query: str, chunks: List[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+        with metrics.stage('rerank'):
+            return self.reranker.rerank(query, chunks, limit, settings.RERANK_MIN_SCORE_RATIO)
+
+    def _format_chunks(self, search_results) -> List[Dict[str, Any]]:
         return [
             {
                 'text': result.payload.get('chunk_text'),
                 'file_name': result.payload.get('file_name'),
                 'score': result.score,
-                "chunk_id": result.payload.get("chunk_id")
+                "chunk_id": result.payload.get("chunk_id"),
+                'start_char': result.payload.get('start_char'),
+                'end_char': result.payload.get('end_char'),
+                'page_start': result.payload.get('page_start'),
+                'page_end': result.payload.get('page_end')
             }
             for result in search_results
         ]
 
-    def generate_response(self, query: str, context_chunks: List[Dict[str, Any]]) -> str:
+    @staticmethod
+    def _page_label(block: Dict[str, Any]) -> str:
+        """أرقام الصفحات حتى يستطيع النموذج ذكرها في الإجابة"""
+        if block.get('page_start') is None:
+            return ''
+        if block['page_start'] == block['page_end']:
+            return f" (page {block['page_start']})"
+        return f" (pages {block['page_start']}-{block['page_end']})"
 
+    def _build_prompt(self, query: str, context_chunks: List[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+        """الـ prompt مع إحصائيات حجمه (السياق محدود بميزانية CONTEXT_MAX_TOKENS)"""
+        blocks, prompt_stats = self.context_builder.build(context_chunks)
         context_text = "\n\n".join([
-            f"the file: {chunk['file_name']}\nthe text: {chunk['text']}"
-            for chunk in context_chunks
+            f"the file: {block['file_name']}{self._page_label(block)}\nthe text: {block['text']}"
+            for block in blocks
         ])
 
         prompt = f"""
@@ -48,25 +120,237 @@ class RAGService:
 
         The answer:
         """
+        prompt_stats["prompt_chars"] = len(prompt)
+        prompt_stats["prompt_tokens_estimate"] = ContextBuilder.estimate_tokens(prompt)
+        return prompt, prompt_stats
+
+    @staticmethod
+    def _record_usage(prompt: str, prompt_stats: Dict[str, Any], response: Dict[str, Any]):
+        """عدد رموز الـ prompt الفعلي كما حسبه Ollama (غير موجود عند إعادة استخدام الـ KV cache)"""
+        prompt_stats["prompt_eval_count"] = response.get('prompt_eval_count')
+        prompt_stats["eval_count"] = response.get('eval_count')
+        metrics.record_generation(response, prompt)
+
+    def generate_response(self, query: str, context_chunks: List[Dict[str, Any]]) -> str:
+        return self._generate(query, context_chunks)[0]
+
+    async def generate_response_async(self, query: str, context_chunks: List[Dict[str, Any]]) -> str:
+        return (await self._generate_async(query, context_chunks))[0]
+
+    def _generate(self, query: str, context_chunks: List[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+        prompt, prompt_stats = self._build_prompt(query, context_chunks)
 
         try:
-            response = self.ollama.generate(model= self.llm_model, prompt=prompt)
-            return response['response']
+            with metrics.stage('generate'):
+                response = self.ollama.generate(model= self.llm_model, prompt=prompt)
         except Exception as e:
             raise Exception(f"Error generating response: {str(e)}")
 
-    def ask_question(self, query: str, limit: int = 5) ->Dict[str,Any]:
+        self._record_usage(prompt, prompt_stats, response)
+        return response['response'], prompt_stats
+
+    async def _generate_async(self, query: str, context_chunks: List[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+        prompt, prompt_stats = self._build_prompt(query, context_chunks)
+
+        try:
+            with metrics.stage('generate'):
+                response = await self.async_ollama.generate(model= self.llm_model, prompt=prompt)
+        except Exception as e:
+            raise Exception(f"Error generating response: {str(e)}")
+
+        self._record_usage(prompt, prompt_stats, response)
+        return response['response'], prompt_stats
+
+    def ask_question(self, query: str, limit: int = 5, rerank: Optional[bool] = None) ->Dict[str,Any]:
+        rerank = self._use_rerank(rerank)
+        variant = self._cache_variant(rerank)
+        cached = self._lookup_exact(query, limit, variant)
+        if cached is not None:
+            return cached
+
+        query_embedding = self.embedding.get_embedding(query)
+        similar_chunks = self.search_similar_chunks(query, limit, query_embedding, rerank)
+
+        cached = self._lookup_semantic(query, limit, query_embedding, similar_chunks)
+        if cached is not None:
+            return cached
+
+        prompt_stats = None
+        if similar_chunks:
+            started = time.perf_counter()
+            answer, prompt_stats = self._generate(query, similar_chunks)
+            self._store_answer(query, limit, query_embedding, similar_chunks, answer, time.perf_counter() - started, variant)
+        else:
+            answer = self.NO_ANSWER
+
+        return self._format_answer(query, answer, similar_chunks, prompt_stats=prompt_stats)
+
+    async def ask_question_async(self, query: str, limit: int = 5, rerank: Optional[bool] = None) ->Dict[str,Any]:
+        rerank = self._use_rerank(rerank)
+        variant = self._cache_variant(rerank)
+        cached = self._lookup_exact(query, limit, variant)
+        if cached is not None:
+            return cached
+
+        query_embedding = await self.embedding.get_embedding_async(query)
+        similar_chunks = await self.search_similar_chunks_async(query, limit, query_embedding, rerank)
+        return await self._answer_from_chunks_async(query, limit, query_embedding, similar_chunks, variant)
 
-        similar_chunks = self.search_similar_chunks(query,limit)
+    async def _answer_from_chunks_async(self, query: str, limit: int, query_embedding: List[float],
+                                        similar_chunks: List[Dict[str, Any]], variant: str) -> Dict[str, Any]:
+        cached = self._lookup_semantic(query, limit, query_embedding, similar_chunks)
+        if cached is not None:
+            return cached
 
+        prompt_stats = None
         if similar_chunks:
-            answer = self.generate_response(query, similar_chunks)
+            started = time.perf_counter()
+            answer, prompt_stats = await self._generate_async(query, similar_chunks)
+            self._store_answer(query, limit, query_embedding, similar_chunks, answer, time.perf_counter() - started, variant)
+        else:
+            answer = self.NO_ANSWER
+
+        return self._format_answer(query, answer, similar_chunks, prompt_stats=prompt_stats)
+
+    async def ask_questions_async(self, queries: List[str], limit: int = 5, rerank: Optional[bool] = None,
+                                  concurrency: Optional[int] = None) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """الإجابة عن مجموعة أسئلة: تضمين دفعة واحدة، بحث دفعة واحدة، ثم توليد بحد للتزامن.
+        تُعاد النتائج (رقم السؤال، النتيجة) فور اكتمال كل منها"""
+        rerank = self._use_rerank(rerank)
+        variant = self._cache_variant(rerank)
+
+        pending = []
+        for index, query in enumerate(queries):
+            cached = self._lookup_exact(query, limit, variant)
+            if cached is not None:
+                yield index, cached
+            else:
+                pending.append(index)
+        if not pending:
+            return
+
+        pending_queries = [queries[index] for index in pending]
+        try:
+            embeddings = await self.embedding.get_embeddings_async(pending_queries)
+            search_results = await self.document_store.search_documents_batch_async(
+                pending_queries, embeddings, self._fetch_limit(limit, rerank)
+            )
+        except Exception as e:
+            for index in pending:
+                yield index, {"question": queries[index], "error": str(e)}
+            return
+
+        slots = asyncio.Semaphore(max(1, concurrency or settings.ASK_BATCH_CONCURRENCY))
+
+        async def answer(index: int, query_embedding: List[float], results) -> Tuple[int, Dict[str, Any]]:
+            query = queries[index]
+            try:
+                similar_chunks = self._format_chunks(results)
+                if rerank:
+                    similar_chunks = await asyncio.to_thread(self._rerank, query, similar_chunks, limit)
+                async with slots:
+                    return index, await self._answer_from_chunks_async(query, limit, query_embedding, similar_chunks, variant)
+            except Exception as e:
+                # فشل سؤال واحد لا يُفشل الدفعة كلها
+                return index, {"question": query, "error": str(e)}
+
+        tasks = [
+            asyncio.ensure_future(answer(index, query_embedding, results))
+            for index, query_embedding, results in zip(pending, embeddings, search_results)
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            # العميل قطع الاتصال أثناء البث → لا داعي لإكمال التوليد
+            for task in tasks:
+                task.cancel()
+
+    async def ask_question_stream(self, query: str, limit: int = 5, rerank: Optional[bool] = None) -> AsyncIterator[Dict[str, Any]]:
+        """الإجابة كسلسلة أحداث: المصادر أولاً ثم أجزاء النص فور توليدها"""
+        rerank = self._use_rerank(rerank)
+        variant = self._cache_variant(rerank)
+        cached = self._lookup_exact(query, limit, variant)
+        if cached is None:
+            query_embedding = await self.embedding.get_embedding_async(query)
+            similar_chunks = await self.search_similar_chunks_async(query, limit, query_embedding, rerank)
+            cached = self._lookup_semantic(query, limit, query_embedding, similar_chunks)
         else:
-            answer = "Sorry, I don't found any enough information for answer you question"
+            similar_chunks = cached['sources']
+
+        yield {
+            "type": "sources",
+            "question": query,
+            "sources": similar_chunks,
+            "total_sources": len(similar_chunks),
+            "cached": cached['cached'] if cached else False
+        }
+
+        if cached is not None:
+            yield {"type": "token", "token": cached['answer']}
+            yield {"type": "done"}
+            return
+
+        if not similar_chunks:
+            yield {"type": "token", "token": self.NO_ANSWER}
+            yield {"type": "done"}
+            return
+
+        prompt, prompt_stats = self._build_prompt(query, similar_chunks)
+        tokens = []
+        started = time.perf_counter()
+        try:
+            async for part in await self.async_ollama.generate(model= self.llm_model, prompt=prompt, stream=True):
+                if part.get('response'):
+                    tokens.append(part['response'])
+                    yield {"type": "token", "token": part['response']}
+                if part.get('done'):
+                    self._record_usage(prompt, prompt_stats, part)
+        except Exception as e:
+            # الاستجابة بدأت بالفعل → الخطأ يُرسل كحدث بدلاً من رمز HTTP
+            yield {"type": "error", "detail": f"Error generating response: {str(e)}"}
+            return
+        finally:
+            # يشمل زمن انتظار العميل لاستلام الأجزاء
+            metrics.record_stage('generate', time.perf_counter() - started)
+
+        self._store_answer(query, limit, query_embedding, similar_chunks, ''.join(tokens), time.perf_counter() - started, variant)
+        yield {"type": "done", "prompt": prompt_stats}
+
+    @staticmethod
+    def _cache_variant(rerank: bool) -> str:
+        return "rerank" if rerank else ""
+
+    def _lookup_exact(self, query: str, limit: int, variant: str = '') -> Optional[Dict[str, Any]]:
+        if self.answer_cache is None:
+            return None
+        entry = self.answer_cache.get_exact(query, limit, variant)
+        if entry is None:
+            return None
+        return self._format_answer(query, entry['answer'], list(entry['sources']), cached="exact")
+
+    def _lookup_semantic(self, query: str, limit: int, query_embedding: List[float],
+                         similar_chunks: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if self.answer_cache is None or not similar_chunks:
+            return None
+        entry = self.answer_cache.get_semantic(query_embedding, limit, similar_chunks)
+        if entry is None:
+            return None
+        return self._format_answer(query, entry['answer'], similar_chunks, cached="semantic")
+
+    def _store_answer(self, query: str, limit: int, query_embedding: List[float],
+                      similar_chunks: List[Dict[str, Any]], answer: str, generation_seconds: float, variant: str = ''):
+        if self.answer_cache is not None:
+            self.answer_cache.put(query, limit, query_embedding, similar_chunks, answer, generation_seconds, variant)
 
+    def _format_answer(self, query: str, answer: str, similar_chunks: List[Dict[str, Any]], cached: Any = False,
+                       prompt_stats: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         return {
             "question": query,
             "answer": answer,
             "sources": similar_chunks,
-            "total_sources": len(similar_chunks)
-        }
\ No newline at end of file
+            "total_sources": len(similar_chunks),
+            "cached": cached,
+            # None عند الإجابة من الذاكرة المؤقتة أو بدون مصادر (لم يُرسل prompt)
+            "prompt": prompt_stats
+        }
@@ -0,0 +1,142 @@
+# src/services/answer_cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from . import metrics
+
+
+class AnswerCache:
+    """ذاكرة مؤقتة للإجابات: مطابقة نصية للسؤال مع طبقة دلالية اختيارية، TTL وإخلاء LRU"""
+
+    def __init__(self, max_size: int = 1000, ttl_seconds: float = 3600, semantic_threshold: float = 0.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        # 0 يعطل الطبقة الدلالية
+        self.semantic_threshold = semantic_threshold
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.saved_generation_seconds = 0.0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return ' '.join(query.lower().split())
+
+    def _key(self, query: str, limit: int, variant: str = '') -> str:
+        # variant يفصل الإجابات التي تختلف طريقة استرجاع مصادرها (مثل إعادة الترتيب)
+        return f"{limit}:{variant}:{self.normalize(query)}"
+
+    @staticmethod
+    def _source_ids(sources: List[Dict[str, Any]]) -> Tuple:
+        return tuple((source.get('file_name'), source.get('chunk_id')) for source in sources)
+
+    def get_exact(self, query: str, limit: int, variant: str = '') -> Optional[Dict[str, Any]]:
+        """البحث بالنص الموحد للسؤال (بدون تضمين أو بحث)"""
+        key = self._key(query, limit, variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._expired(entry):
+                if entry is not None:
+                    del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            self.saved_generation_seconds += entry['generation_seconds']
+        metrics.ANSWER_CACHE_LOOKUPS.inc(result="exact_hit")
+        metrics.ANSWER_CACHE_SAVED_SECONDS.inc(entry['generation_seconds'])
+        return entry
+
+    def get_semantic(self, query_embedding: List[float], limit: int, sources: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """سؤال قريب دلالياً أعاد نفس الأجزاء بالضبط → نفس الإجابة"""
+        if self.semantic_threshold <= 0:
+            with self._lock:
+                self.misses += 1
+            metrics.ANSWER_CACHE_LOOKUPS.inc(result="miss")
+            return None
+
+        vector = self._unit(query_embedding)
+        source_ids = self._source_ids(sources)
+        with self._lock:
+            candidates = [
+                (key, entry) for key, entry in self._entries.items()
+                if entry['limit'] == limit and entry['source_ids'] == source_ids and not self._expired(entry)
+            ]
+            if candidates:
+                similarities = np.stack([entry['embedding'] for _, entry in candidates]) @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.semantic_threshold:
+                    key, entry = candidates[best]
+                    self._entries.move_to_end(key)
+                    self.semantic_hits += 1
+                    self.saved_generation_seconds += entry['generation_seconds']
+                    metrics.ANSWER_CACHE_LOOKUPS.inc(result="semantic_hit")
+                    metrics.ANSWER_CACHE_SAVED_SECONDS.inc(entry['generation_seconds'])
+                    return entry
+
+            self.misses += 1
+        metrics.ANSWER_CACHE_LOOKUPS.inc(result="miss")
+        return None
+
+    def put(self, query: str, limit: int, query_embedding: List[float], sources: List[Dict[str, Any]],
+            answer: str, generation_seconds: float, variant: str = ''):
+        key = self._key(query, limit, variant)
+        entry = {
+            'limit': limit,
+            'embedding': self._unit(query_embedding),
+            'sources': sources,
+            'source_ids': self._source_ids(sources),
+            'file_names': {source.get('file_name') for source in sources},
+            'answer': answer,
+            'generation_seconds': generation_seconds,
+            'expires_at': time.monotonic() + self.ttl_seconds,
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_files(self, file_names: Iterable[str]):
+        """حذف كل إجابة تعتمد على أحد الملفات المعدلة أو المحذوفة"""
+        file_names = set(file_names)
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry['file_names'] & file_names]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def invalidate_file(self, file_name: str):
+        self.invalidate_files([file_name])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _expired(self, entry: Dict[str, Any]) -> bool:
+        return entry['expires_at'] <= time.monotonic()
+
+    @staticmethod
+    def _unit(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.exact_hits + self.semantic_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "saved_generation_seconds": round(self.saved_generation_seconds, 3),
+        }
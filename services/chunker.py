@@ -0,0 +1,176 @@
+# src/services/chunker.py
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# قوة الحد قبل الوحدة: كلما كانت أعلى كان القطع عندها أفضل
+WORD, SENTENCE, LINE, PARAGRAPH, HEADING = range(5)
+
+# نفس تقدير ContextBuilder (~4 أحرف لكل رمز) لأن Ollama لا يكشف tokenizer النموذج
+CHARS_PER_TOKEN = 4
+
+# الوحدة جملة أو سطر: تنتهي بعلامة نهاية جملة يتبعها فراغ، أو بنهاية السطر
+_UNIT_PATTERN = re.compile(r"\S(?:[^\n.!?؟۔]+|[.!?؟۔]+(?=[^\s.!?؟۔]))*[.!?؟۔]*")
+_WORD_PATTERN = re.compile(r"\S+")
+# عنوان Markdown أو ترقيم أقسام متعدد المستويات (2.1 / 3.4.1) في بداية السطر
+_HEADING_PATTERN = re.compile(r"#{1,6}\s|\d+(?:\.\d+)+\.?\s+\S")
+
+
+def estimate_tokens(chars: int) -> int:
+    return -(-chars // CHARS_PER_TOKEN)
+
+
+def effective_chunk_tokens(chunk_size: int, max_tokens: Optional[int]) -> int:
+    """حجم الجزء المطلوب لا يتجاوز أقصى طول يقبله نموذج التضمين (ما بعده يُقتطع بصمت عند التضمين)"""
+    return min(chunk_size, max_tokens) if max_tokens else chunk_size
+
+
+class TextChunker:
+    """تقسيم المستند في مرور واحد: حجم الجزء بعدد الرموز، القطع عند أقوى حد
+    (عنوان، فقرة، سطر/صف جدول، جملة) مع إرجاع مواقع الأحرف لكل جزء"""
+
+    VERSION = 3
+
+    def __init__(self, max_tokens: int = 256, overlap_tokens: int = 50, min_fill: float = 0.5):
+        self.max_tokens = max(1, max_tokens)
+        # التداخل لا يتجاوز نصف الجزء حتى يتقدم التقسيم دائماً
+        self.overlap_tokens = max(0, min(overlap_tokens, self.max_tokens // 2))
+        # لا يُقطع عند حد ضعيف قبل امتلاء هذه النسبة من الجزء
+        self.min_fill_tokens = int(self.max_tokens * min_fill)
+
+    def iter_chunks(self, segments: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """المقاطع تُضم بفاصل سطر (كما في process_document) والمواقع محسوبة على هذا النص"""
+        max_chars = self.max_tokens * CHARS_PER_TOKEN
+        # وحدات الجزء الحالي: (بداية، نهاية، قوة الحد قبلها)
+        units: List[tuple] = []
+        # المقاطع التي ما زال الجزء الحالي يشير إليها: (موقع البداية، النص، الصفحة) بدون نسخ النص الكامل
+        pieces: List[tuple] = []
+        offset = 0
+        chunk_id = 0
+
+        for segment in segments:
+            segment_text = segment.get('text') or ''
+            if pieces:
+                offset += 1
+            piece = (offset, segment_text, segment.get('page'))
+            if units:
+                pieces.append(piece)
+            else:
+                pieces = [piece]
+
+            for unit in self._iter_units(segment_text, offset, bool(segment.get('heading')), max_chars):
+                if unit[2] == HEADING and units and self._tokens(units) >= self.min_fill_tokens:
+                    # قسم جديد: لا نخلط نهاية القسم السابق مع بدايته
+                    yield self._make_chunk(pieces, units, chunk_id)
+                    chunk_id += 1
+                    units = []
+                    pieces = pieces[-1:]
+
+                elif units and estimate_tokens(unit[1] - units[0][0]) > self.max_tokens:
+                    cut = self._best_cut(units, unit)
+                    yield self._make_chunk(pieces, units[:cut], chunk_id)
+                    chunk_id += 1
+                    start = self._overlap_start(units, cut, unit)
+                    # يُقلّص التداخل فقط حتى تتسع الوحدة الجديدة؛ الوحدات بعد القطع لم تُرسل بعد
+                    while start < cut and estimate_tokens(unit[1] - units[start][0]) > self.max_tokens:
+                        start += 1
+                    units = units[start:]
+                    if units and estimate_tokens(unit[1] - units[0][0]) > self.max_tokens:
+                        # ما بقي بعد القطع لا يتسع مع الوحدة الجديدة → جزء مستقل بدلاً من حذفه
+                        yield self._make_chunk(pieces, units, chunk_id)
+                        chunk_id += 1
+                        units = []
+
+                    # المقاطع التي انتهت قبل بداية الجزء التالي لم تعد لازمة
+                    first_start = units[0][0] if units else unit[0]
+                    while len(pieces) > 1 and pieces[1][0] <= first_start:
+                        pieces.pop(0)
+
+                units.append(unit)
+
+            offset += len(segment_text)
+
+        if units:
+            yield self._make_chunk(pieces, units, chunk_id)
+
+    @staticmethod
+    def _iter_units(text: str, offset: int, heading: bool, max_chars: int) -> Iterator[tuple]:
+        """الجمل والأسطر بمواقعها في النص الكامل مع قوة الحد قبل كل منها"""
+        previous_end = None
+        for match in _UNIT_PATTERN.finditer(text):
+            start = match.start()
+            end = start + len(match.group().rstrip())
+
+            if previous_end is None:
+                strength = HEADING if heading or _HEADING_PATTERN.match(text, start) else PARAGRAPH
+            else:
+                newlines = text.count('\n', previous_end, start)
+                if not newlines:
+                    strength = SENTENCE
+                elif _HEADING_PATTERN.match(text, start):
+                    strength = HEADING
+                else:
+                    strength = PARAGRAPH if newlines > 1 else LINE
+            previous_end = end
+
+            if end - start <= max_chars:
+                yield (offset + start, offset + end, strength)
+                continue
+
+            # جملة أطول من الجزء كله → تقسم على حدود الكلمات، والكلمة الأطول من الجزء تقطع بالحجم
+            for word in _WORD_PATTERN.finditer(text, start, end):
+                for piece_start in range(word.start(), word.end(), max_chars):
+                    yield (offset + piece_start, offset + min(piece_start + max_chars, word.end()), strength)
+                    strength = WORD
+
+    @staticmethod
+    def _tokens(units: List[tuple]) -> int:
+        return estimate_tokens(units[-1][1] - units[0][0])
+
+    def _best_cut(self, units: List[tuple], next_unit: tuple) -> int:
+        """أقوى حد بعد الحد الأدنى للامتلاء (الأخير عند التساوي)؛ القطع قبل units[cut]"""
+        best_cut, best_strength = len(units), next_unit[2]
+        chunk_start = units[0][0]
+        for i in range(len(units) - 1, 0, -1):
+            if best_strength == HEADING or estimate_tokens(units[i - 1][1] - chunk_start) < self.min_fill_tokens:
+                break
+            if units[i][2] > best_strength:
+                best_cut, best_strength = i, units[i][2]
+        return best_cut
+
+    def _overlap_start(self, units: List[tuple], cut: int, next_unit: tuple) -> int:
+        """بداية الجزء التالي: آخر جمل الجزء المقطوع ضمن overlap_tokens"""
+        # لا تداخل عبر عنوان: القسم الجديد يبدأ نظيفاً
+        first_next = units[cut] if cut < len(units) else next_unit
+        if not self.overlap_tokens or first_next[2] == HEADING:
+            return cut
+
+        start = cut
+        overlap_end = units[cut - 1][1]
+        while start > 1 and estimate_tokens(overlap_end - units[start - 1][0]) <= self.overlap_tokens:
+            start -= 1
+        return start
+
+    @staticmethod
+    def _make_chunk(pieces: List[tuple], units: List[tuple], chunk_id: int) -> Dict[str, Any]:
+        start_char, end_char = units[0][0], units[-1][1]
+        covering = [
+            piece for piece in pieces
+            if piece[0] <= end_char and piece[0] + len(piece[1]) >= start_char
+        ]
+        text = '\n'.join(
+            piece_text[max(0, start_char - piece_start):end_char - piece_start]
+            for piece_start, piece_text, _ in covering
+        )
+        # صفحات المصدر (PDF) التي يمتد عليها الجزء
+        pages = [page for _, _, page in covering if page is not None]
+        return {
+            # نفس النص الأصلي تماماً: text == document[start_char:end_char]
+            'text': text,
+            'chunk_id': chunk_id,
+            'total_words': len(text.split()),
+            'token_count': estimate_tokens(end_char - start_char),
+            'start_char': start_char,
+            'end_char': end_char,
+            'page_start': pages[0] if pages else None,
+            'page_end': pages[-1] if pages else None,
+        }
@@ -0,0 +1,243 @@
+# src/services/clients.py
+import json
+import logging
+import random
+import threading
+import time
+import asyncio
+from typing import Optional, Set, Tuple, Type
+import httpx
+from ollama import Client, AsyncClient
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# أخطاء مؤقتة من الخادم تستحق إعادة المحاولة (إعادة تشغيل، حمل زائد)
+_RETRY_STATUS_CODES = {429, 502, 503, 504}
+_RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError, httpx.ReadError)
+
+# التوليد مكلف: يُعاد فقط إذا لم يصل الطلب إلى الخادم أو رفضه قبل أن يبدأ،
+# وليس بعد انقطاع قد يعني أن النموذج ولّد الإجابة بالفعل
+_GENERATE_PATHS = ('/api/generate', '/api/chat')
+_GENERATE_RETRY_STATUS_CODES = {429, 503}
+_GENERATE_RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+
+def _retry_policy(request: httpx.Request) -> Tuple[Tuple[Type[Exception], ...], Set[int]]:
+    if request.url.path in _GENERATE_PATHS:
+        return _GENERATE_RETRY_ERRORS, _GENERATE_RETRY_STATUS_CODES
+    return _RETRY_ERRORS, _RETRY_STATUS_CODES
+
+
+def _backoff(attempt: int) -> float:
+    """تأخير أسي مع عشوائية كاملة حتى لا تعيد كل العمليات المحاولة في نفس اللحظة"""
+    return random.uniform(0, min(settings.CLIENT_RETRY_MAX_BACKOFF_SECONDS,
+                                 settings.CLIENT_RETRY_BACKOFF_SECONDS * 2 ** attempt))
+
+
+class RetryTransport(httpx.HTTPTransport):
+    """اتصالات HTTP دائمة مع إعادة المحاولة عند فشل الاتصال أو الأخطاء المؤقتة"""
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        retry_errors, retry_status_codes = _retry_policy(request)
+        for attempt in range(settings.CLIENT_MAX_RETRIES + 1):
+            last_attempt = attempt == settings.CLIENT_MAX_RETRIES
+            try:
+                response = super().handle_request(request)
+            except retry_errors:
+                if last_attempt:
+                    raise
+            else:
+                if response.status_code not in retry_status_codes or last_attempt:
+                    return response
+                response.close()
+
+            delay = _backoff(attempt)
+            logger.warning(f"{request.method} {request.url} failed, retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+
+class AsyncRetryTransport(httpx.AsyncHTTPTransport):
+    """نسخة غير متزامنة من RetryTransport"""
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        retry_errors, retry_status_codes = _retry_policy(request)
+        for attempt in range(settings.CLIENT_MAX_RETRIES + 1):
+            last_attempt = attempt == settings.CLIENT_MAX_RETRIES
+            try:
+                response = await super().handle_async_request(request)
+            except retry_errors:
+                if last_attempt:
+                    raise
+            else:
+                if response.status_code not in retry_status_codes or last_attempt:
+                    return response
+                await response.aclose()
+
+            delay = _backoff(attempt)
+            logger.warning(f"{request.method} {request.url} failed, retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=30
+    )
+
+
+def _transport_args() -> dict:
+    # HTTP/2 يُستخدم فقط مع TLS؛ على http:// يبقى HTTP/1.1 مع إعادة استخدام الاتصالات
+    return {"http2": settings.HTTP2_ENABLED, "limits": _limits()}
+
+
+def ollama_host() -> str:
+    host = settings.OLLAMA_HOST
+    if "://" in host:
+        return host
+    return f"http://{host}:{settings.OLLAMA_PORT}"
+
+
+def _grpc_options() -> dict:
+    """سياسة إعادة المحاولة المدمجة في gRPC (التأخير فيها عشوائي أيضاً)"""
+    return {
+        "grpc.enable_retries": 1,
+        "grpc.service_config": json.dumps({
+            "methodConfig": [{
+                "name": [{}],
+                "retryPolicy": {
+                    # gRPC لا يقبل أكثر من 5 محاولات
+                    "maxAttempts": min(5, settings.CLIENT_MAX_RETRIES + 1),
+                    "initialBackoff": f"{settings.CLIENT_RETRY_BACKOFF_SECONDS}s",
+                    "maxBackoff": f"{settings.CLIENT_RETRY_MAX_BACKOFF_SECONDS}s",
+                    "backoffMultiplier": 2,
+                    "retryableStatusCodes": ["UNAVAILABLE"],
+                },
+            }]
+        }),
+    }
+
+
+def _qdrant_args() -> dict:
+    return {
+        "host": settings.QDRANT_HOST,
+        "port": settings.QDRANT_PORT,
+        "grpc_port": settings.QDRANT_GRPC_PORT,
+        "prefer_grpc": settings.QDRANT_PREFER_GRPC,
+        "timeout": settings.QDRANT_TIMEOUT_SECONDS,
+        "grpc_options": _grpc_options(),
+    }
+
+
+def _local_qdrant() -> QdrantClient:
+    """وضع Qdrant المحلي داخل العملية (في الذاكرة أو مجلد على القرص) بدون خادم"""
+    if settings.QDRANT_LOCATION == ":memory:":
+        return QdrantClient(location=":memory:")
+    return QdrantClient(path=settings.QDRANT_LOCATION)
+
+
+class _LocalAsyncQdrant:
+    """واجهة غير متزامنة فوق عميل الوضع المحلي: عميلان محليان منفصلان لا يريان نفس البيانات
+    (ومجلد القرص يُقفل لعميل واحد)، لذلك تُنفذ الاستدعاءات على العميل المتزامن في خيط منفصل"""
+
+    def __init__(self, client: QdrantClient):
+        self._client = client
+
+    def __getattr__(self, name: str):
+        method = getattr(self._client, name)
+
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(method, *args, **kwargs)
+        return call
+
+    async def close(self):
+        # العميل المتزامن يملك التخزين ويُغلق مرة واحدة
+        pass
+
+
+class _Clients:
+    """عملاء Ollama وQdrant مشتركون بين كل الخدمات في العملية (تجمع اتصالات واحد لكل خادم)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ollama: Optional[Client] = None
+        self.async_ollama: Optional[AsyncClient] = None
+        self.qdrant: Optional[QdrantClient] = None
+        self.async_qdrant: Optional[AsyncQdrantClient] = None
+
+    def get_ollama(self) -> Client:
+        with self._lock:
+            if self.ollama is None:
+                self.ollama = Client(
+                    host=ollama_host(),
+                    timeout=settings.OLLAMA_TIMEOUT_SECONDS,
+                    transport=RetryTransport(**_transport_args())
+                )
+            return self.ollama
+
+    def get_async_ollama(self) -> AsyncClient:
+        with self._lock:
+            if self.async_ollama is None:
+                self.async_ollama = AsyncClient(
+                    host=ollama_host(),
+                    timeout=settings.OLLAMA_TIMEOUT_SECONDS,
+                    transport=AsyncRetryTransport(**_transport_args())
+                )
+            return self.async_ollama
+
+    def get_qdrant(self) -> QdrantClient:
+        with self._lock:
+            return self._get_qdrant()
+
+    def _get_qdrant(self) -> QdrantClient:
+        if self.qdrant is None:
+            if settings.QDRANT_LOCATION:
+                self.qdrant = _local_qdrant()
+            else:
+                self.qdrant = QdrantClient(**_qdrant_args(), transport=RetryTransport(**_transport_args()))
+        return self.qdrant
+
+    def get_async_qdrant(self) -> AsyncQdrantClient:
+        with self._lock:
+            if self.async_qdrant is None:
+                if settings.QDRANT_LOCATION:
+                    self.async_qdrant = _LocalAsyncQdrant(self._get_qdrant())
+                else:
+                    self.async_qdrant = AsyncQdrantClient(**_qdrant_args(), transport=AsyncRetryTransport(**_transport_args()))
+            return self.async_qdrant
+
+    async def aclose(self):
+        with self._lock:
+            ollama, async_ollama, qdrant, async_qdrant = self.ollama, self.async_ollama, self.qdrant, self.async_qdrant
+            self.ollama = self.async_ollama = self.qdrant = self.async_qdrant = None
+
+        # ollama 0.3 لا يوفر close() عامة؛ نغلق عملاء httpx الداخليين
+        if ollama is not None:
+            ollama._client.close()
+        if async_ollama is not None:
+            await async_ollama._client.aclose()
+        if qdrant is not None:
+            qdrant.close()
+        if async_qdrant is not None:
+            await async_qdrant.close()
+
+
+clients = _Clients()
+
+
+def get_ollama_client() -> Client:
+    return clients.get_ollama()
+
+
+def get_async_ollama_client() -> AsyncClient:
+    return clients.get_async_ollama()
+
+
+def get_qdrant_client() -> QdrantClient:
+    return clients.get_qdrant()
+
+
+def get_async_qdrant_client() -> AsyncQdrantClient:
+    return clients.get_async_qdrant()
@@ -0,0 +1,78 @@
+# src/services/container.py
+import asyncio
+import logging
+import threading
+from config.settings import settings
+from .clients import clients
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceContainer:
+    """الخدمات المشتركة في العملية: تُنشأ مرة واحدة عند أول طلب لها وتُغلق عند إيقاف التطبيق"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._doc_store = None
+        self._rag_service = None
+        self._ingest_queue = None
+
+    @property
+    def doc_store(self):
+        with self._lock:
+            if self._doc_store is None:
+                from .document_store import QdrantDocumentStore
+                self._doc_store = QdrantDocumentStore()
+            return self._doc_store
+
+    @property
+    def rag_service(self):
+        with self._lock:
+            if self._rag_service is None:
+                from .RAG_service import RAGService
+                self._rag_service = RAGService(self.doc_store)
+            return self._rag_service
+
+    @property
+    def ingest_queue(self):
+        with self._lock:
+            if self._ingest_queue is None:
+                from .ingest_jobs import IngestJobQueue
+                self._ingest_queue = IngestJobQueue(
+                    self.doc_store,
+                    settings.INGEST_JOBS_DB_PATH,
+                    workers=settings.INGEST_WORKERS,
+                    max_pending=settings.INGEST_MAX_PENDING_JOBS
+                )
+            return self._ingest_queue
+
+    async def aclose(self):
+        """إيقاف العمّال ثم مجموعة عمليات الاستخراج ثم العملاء المشتركين"""
+        with self._lock:
+            doc_store, ingest_queue = self._doc_store, self._ingest_queue
+            self._doc_store = self._rag_service = self._ingest_queue = None
+
+        # الإيقاف ينتظر الخيوط والعمليات → خارج حلقة الأحداث
+        stopped = True
+        if ingest_queue is not None:
+            stopped = await asyncio.to_thread(ingest_queue.stop, settings.INGEST_SHUTDOWN_TIMEOUT_SECONDS)
+            await asyncio.to_thread(ingest_queue.close)
+        if doc_store is not None:
+            # مهمة لم تنتهِ في المهلة → لا ننتظر استخراجها أيضاً
+            await asyncio.to_thread(doc_store.close, stopped)
+        await clients.aclose()
+
+
+container = ServiceContainer()
+
+
+def get_doc_store():
+    return container.doc_store
+
+
+def get_rag_service():
+    return container.rag_service
+
+
+def get_ingest_queue():
+    return container.ingest_queue
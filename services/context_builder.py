@@ -0,0 +1,111 @@
+# src/services/context_builder.py
+import hashlib
+from typing import Any, Dict, List, Tuple
+
+
+class ContextBuilder:
+    """بناء سياق الـ prompt ضمن ميزانية رموز: دمج الأجزاء المتجاورة وحذف التداخل والمكرر وترتيبها حسب الدرجة"""
+
+    # تقدير تقريبي بدون tokenizer النموذج (~4 أحرف لكل رمز)
+    CHARS_PER_TOKEN = 4
+
+    def __init__(self, max_tokens: int = 1500, max_overlap_words: int = 100):
+        self.max_tokens = max_tokens
+        self.max_overlap_words = max_overlap_words
+
+    @classmethod
+    def estimate_tokens(cls, text: str) -> int:
+        return -(-len(text) // cls.CHARS_PER_TOKEN)
+
+    def build(self, chunks: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """إرجاع كتل السياق المختارة مع إحصائيات الحجم"""
+        selected: List[Dict[str, Any]] = []
+        seen_texts = set()
+        used_tokens = 0
+        duplicates = 0
+        dropped = 0
+
+        # الأعلى درجة أولاً: ما لا يتسع في الميزانية يُستبعد ويُجرب الأصغر بعده
+        for chunk in sorted(chunks, key=lambda c: c.get('score') or 0, reverse=True):
+            text = (chunk.get('text') or '').strip()
+            text_hash = hashlib.md5(text.encode('utf-8')).hexdigest()
+            if not text or text_hash in seen_texts:
+                duplicates += 1
+                continue
+
+            tokens = self.estimate_tokens(text)
+            if used_tokens + tokens > self.max_tokens:
+                if selected:
+                    dropped += 1
+                    continue
+                # الجزء الأفضل وحده أكبر من الميزانية → يُقتطع بدلاً من سياق فارغ
+                text = text[:self.max_tokens * self.CHARS_PER_TOKEN]
+                tokens = self.estimate_tokens(text)
+
+            seen_texts.add(text_hash)
+            selected.append({**chunk, 'text': text})
+            used_tokens += tokens
+
+        blocks = self._merge_adjacent(selected)
+        context_tokens = sum(self.estimate_tokens(block['text']) for block in blocks)
+
+        return blocks, {
+            "chunks_retrieved": len(chunks),
+            "chunks_used": len(selected),
+            "chunks_dropped": dropped,
+            "duplicates_removed": duplicates,
+            "context_blocks": len(blocks),
+            "context_tokens_estimate": context_tokens,
+            "max_context_tokens": self.max_tokens,
+        }
+
+    def _merge_adjacent(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """دمج الأجزاء المتتالية من نفس الملف في كتلة واحدة بعد حذف الكلمات المتداخلة"""
+        by_position = sorted(chunks, key=lambda c: (c.get('file_name') or '', c.get('chunk_id') if c.get('chunk_id') is not None else -1))
+
+        blocks: List[Dict[str, Any]] = []
+        for chunk in by_position:
+            previous = blocks[-1] if blocks else None
+            if (previous is not None and chunk.get('chunk_id') is not None
+                    and previous['file_name'] == chunk.get('file_name')
+                    and previous['chunk_ids'][-1] + 1 == chunk['chunk_id']):
+                if previous['end_char'] is not None and chunk.get('start_char') is not None:
+                    # مواقع الأحرف معروفة → التداخل هو الفرق بينها بالضبط
+                    overlap_chars = max(0, previous['end_char'] - chunk['start_char'])
+                    remainder = chunk['text'][overlap_chars:].strip()
+                    if remainder:
+                        previous['text'] = f"{previous['text']} {remainder}"
+                else:
+                    previous_words = previous['text'].split()
+                    words = chunk['text'].split()
+                    overlap = self._overlap_length(previous_words, words)
+                    if overlap < len(words):
+                        previous['text'] = f"{previous['text']} {' '.join(words[overlap:])}"
+                previous['end_char'] = chunk.get('end_char')
+                if chunk.get('page_end') is not None:
+                    previous['page_end'] = chunk['page_end']
+                    if previous['page_start'] is None:
+                        previous['page_start'] = chunk.get('page_start')
+                previous['chunk_ids'].append(chunk['chunk_id'])
+                previous['score'] = max(previous['score'], chunk.get('score') or 0)
+                continue
+
+            blocks.append({
+                'file_name': chunk.get('file_name'),
+                'chunk_ids': [chunk.get('chunk_id')],
+                'text': chunk['text'],
+                'score': chunk.get('score') or 0,
+                'end_char': chunk.get('end_char'),
+                'page_start': chunk.get('page_start'),
+                'page_end': chunk.get('page_end'),
+            })
+
+        blocks.sort(key=lambda block: block['score'], reverse=True)
+        return blocks
+
+    def _overlap_length(self, previous_words: List[str], words: List[str]) -> int:
+        """أطول نهاية للجزء السابق تبدأ بها الكلمات التالية"""
+        for size in range(min(len(previous_words), len(words), self.max_overlap_words), 0, -1):
+            if previous_words[-size:] == words[:size]:
+                return size
+        return 0
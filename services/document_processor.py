@@ -1,127 +1,182 @@
 # src/services/document_processor.py
-from ollama import Client
-from docx import Document
-import PyPDF2
-import pandas as pd
-from pptx import Presentation
+# مكتبات قراءة الصيغ (pandas، PyPDF2، python-docx، python-pptx) تُستورد عند أول ملف من نوعها
+# حتى لا يدفع كل عامل أو عملية تكلفة تحميلها كلها عند الإقلاع
 import os
-from typing import Dict, Any, List
-import re
+from datetime import datetime
+from itertools import islice
+from typing import Dict, Any, List, Iterable, Iterator, Optional
+from config.settings import settings
+from .chunker import TextChunker
 
 class DocumentProcessor:
+    # الحد الأقصى لحجم المقطع الواحد عند قراءة الملفات النصية
+    MAX_SEGMENT_CHARS = 64 * 1024
+    # حجم مقطع صفوف الجدول بالأحرف: يتسع في جزء واحد بالحجم الافتراضي (256 رمزاً)
+    TABLE_GROUP_CHARS = 1000
+    SUPPORTED_EXTENSIONS = ('.docx', '.pdf', '.txt', '.pptx', '.csv', '.xlsx', '.xls')
+
     def __init__(self):
         pass
 
     
-    def extract_text_from_docx(self, file_path: str) -> str:
-        """استخراج النص من ملفات DOCX"""
+    def extract_text_from_docx(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """استخراج النص من ملفات DOCX فقرةً فقرة"""
         try:
+            from docx import Document
             doc = Document(file_path)
-            text = []
             for paragraph in doc.paragraphs:
                 if paragraph.text.strip():
-                    text.append(paragraph.text)
-            return '\n'.join(text)
+                    # العناوين حدود أقسام يفضل القطع عندها
+                    style_name = paragraph.style.name if paragraph.style is not None else ''
+                    yield {'text': paragraph.text, 'heading': style_name.startswith(('Heading', 'Title'))}
         except Exception as e:
             raise Exception(f"Error reading DOCX file: {str(e)}")
     
-    def extract_text_from_pdf(self, file_path: str) -> str:
-        """استخراج النص من ملفات PDF"""
+    def extract_text_from_pdf(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """استخراج النص من ملفات PDF صفحةً صفحة مع رقم الصفحة"""
+        for page_number, page_text in enumerate(self.iter_pdf_pages(file_path), start=1):
+            if page_text:
+                yield {'text': page_text, 'page': page_number}
+
+    def open_pdf(self, file_path: str):
+        """قراءة ملف PDF وفهرس صفحاته (يُعاد استخدامه لعدة نطاقات من الصفحات)"""
+        try:
+            import PyPDF2
+            return PyPDF2.PdfReader(file_path)
+        except Exception as e:
+            raise Exception(f"Error reading PDF file: {str(e)}")
+
+    def iter_pdf_pages(self, file_path: str, start: int = 0, end: Optional[int] = None, pdf_reader=None) -> Iterator[str]:
+        """نص صفحات PDF من start إلى end (بدون end)، نص فارغ للصفحات بلا نص"""
+        if pdf_reader is None:
+            pdf_reader = self.open_pdf(file_path)
         try:
-            text = []
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page in pdf_reader.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text.append(page_text)
-            return '\n'.join(text)
+            for page in pdf_reader.pages[start:end]:
+                yield page.extract_text() or ''
         except Exception as e:
             raise Exception(f"Error reading PDF file: {str(e)}")
     
-    def extract_text_from_txt(self, file_path: str) -> str:
-        """استخراج النص من ملفات TXT"""
+    def extract_text_from_txt(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """استخراج النص من ملفات TXT على شكل فقرات"""
         try:
             with open(file_path, 'r', encoding='utf-8') as file:
-                return file.read()
+                paragraph = []
+                paragraph_size = 0
+                for line in file:
+                    paragraph.append(line)
+                    paragraph_size += len(line)
+                    # فقرة جديدة عند سطر فارغ أو عند تجاوز الحجم الأقصى للمقطع
+                    if not line.strip() or paragraph_size >= self.MAX_SEGMENT_CHARS:
+                        yield {'text': ''.join(paragraph).rstrip('\n')}
+                        paragraph = []
+                        paragraph_size = 0
+                if paragraph:
+                    yield {'text': ''.join(paragraph).rstrip('\n')}
         except Exception as e:
             raise Exception(f"Error reading TXT file: {str(e)}")
     
-    def extract_text_from_pptx(self, file_path: str) -> str:
-        """استخراج النص من ملفات PPTX"""
+    def extract_text_from_pptx(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """استخراج النص من ملفات PPTX شريحةً شريحة"""
         try:
+            from pptx import Presentation
             prs = Presentation(file_path)
-            text = []
             for slide in prs.slides:
+                text = []
                 for shape in slide.shapes:
                     if hasattr(shape, "text") and shape.text.strip():
                         text.append(shape.text)
-            return '\n'.join(text)
+                if text:
+                    yield {'text': '\n'.join(text)}
         except Exception as e:
             raise Exception(f"Error reading PPTX file: {str(e)}")
     
-    def extract_text_from_csv(self, file_path: str) -> str:
-        """استخراج النص من ملفات CSV"""
+    def extract_text_from_csv(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """استخراج كل صفوف ملف CSV على دفعات بدون تحميل الملف كاملاً في الذاكرة"""
         try:
-            df = pd.read_csv(file_path)
-            text = ["Columns: " + ", ".join(df.columns.tolist())]
-            
-            for idx, row in df.head(10).iterrows():
-                text.append(f"Row {idx}: " + ", ".join([str(x) for x in row.values]))
-            
-            return '\n'.join(text)
+            import pandas as pd
+            reader = pd.read_csv(
+                file_path, chunksize=settings.TABLE_READ_CHUNK_ROWS,
+                dtype=str, keep_default_na=False, on_bad_lines='warn'
+            )
+            with reader:
+                for frame in reader:
+                    yield from self._iter_row_groups(frame)
         except Exception as e:
             raise Exception(f"Error reading CSV file: {str(e)}")
     
-    def extract_text_from_excel(self, file_path: str) -> str:
-        """استخراج النص من ملفات Excel"""
+    def extract_text_from_excel(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """استخراج كل صفوف كل أوراق ملف Excel"""
         try:
-            df = pd.read_excel(file_path)
-            text = ["Columns: " + ", ".join(df.columns.tolist())]
-            
-            for idx, row in df.head(10).iterrows():
-                text.append(f"Row {idx}: " + ", ".join([str(x) for x in row.values]))
-            
-            return '\n'.join(text)
+            if file_path.lower().endswith('.xls'):
+                # openpyxl لا يقرأ صيغة xls القديمة
+                import pandas as pd
+                sheets = pd.read_excel(file_path, sheet_name=None, dtype=str, keep_default_na=False)
+                for sheet_name, frame in sheets.items():
+                    yield from self._iter_row_groups(frame, sheet_name)
+                return
+
+            from openpyxl import load_workbook
+            import pandas as pd
+            # read_only يقرأ الصفوف من الملف عند الطلب بدلاً من بناء الورقة كاملة في الذاكرة
+            workbook = load_workbook(file_path, read_only=True, data_only=True)
+            try:
+                for sheet in workbook.worksheets:
+                    rows = sheet.iter_rows(values_only=True)
+                    header = next((row for row in rows if any(cell is not None for cell in row)), None)
+                    if header is None:
+                        continue
+                    columns = [str(cell) if cell is not None else f"Column {i + 1}" for i, cell in enumerate(header)]
+
+                    start = 0
+                    while True:
+                        batch = list(islice(rows, settings.TABLE_READ_CHUNK_ROWS))
+                        if not batch:
+                            break
+                        frame = pd.DataFrame(
+                            [row[:len(columns)] for row in batch],
+                            columns=columns,
+                            index=pd.RangeIndex(start, start + len(batch)),
+                            dtype=object
+                        )
+                        start += len(batch)
+                        yield from self._iter_row_groups(frame.fillna(''), sheet.title)
+            finally:
+                workbook.close()
         except Exception as e:
             raise Exception(f"Error reading Excel file: {str(e)}")
-    
-    def chunk_text(self, text: str, chunk_size: int = 500, overlap: int = 50) -> List[Dict[str, Any]]:
-        """تقسيم النص إلى أجزاء متداخلة"""
-        sentences = re.split(r'[.!?]+', text)
-        current_chunk = []
-        current_length = 0
-        chunks = []
 
-        for sentence in sentences:
-            sentence = sentence.strip()
-            if not sentence:
-                continue
+    def _iter_row_groups(self, frame, sheet_name: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """تحويل الصفوف إلى نص دفعة واحدة (بدون iterrows) وتجميعها مع عناوين الأعمدة في مقاطع بحجم جزء تقريباً"""
+        import numpy as np
 
-            sentence_length = len(sentence.split())
+        values = frame.astype(str)
+        values = values[(values != '').any(axis=1)]
+        if values.empty:
+            return
 
-            if sentence_length + current_length <= chunk_size:
-                current_chunk.append(sentence)
-                current_length += sentence_length
-            else:
-                if current_chunk:
-                    chunks.append(' '.join(current_chunk))
+        header = "Columns: " + ", ".join(str(column) for column in values.columns)
+        if sheet_name is not None:
+            header = f"Sheet: {sheet_name}\n{header}"
 
-                if overlap > 0 and chunks:
-                    last_word_chunk = chunks[-1].split()[-overlap:]
-                    current_chunk = last_word_chunk + [sentence]
-                    current_length = len(current_chunk)
-                else:
-                    current_chunk = [sentence]
-                    current_length = sentence_length
+        cells = [values[column] for column in values.columns]
+        rows = "Row " + values.index.to_series().astype(str) + ": " + cells[0].str.cat(cells[1:], sep=', ')
 
-        if current_chunk:
-            chunks.append(' '.join(current_chunk))
+        # كل مقطع يبدأ بعناوين الأعمدة حتى يبقى كل جزء مفهوماً وحده
+        budget = max(1, self.TABLE_GROUP_CHARS - len(header))
+        group_keys = ((rows.str.len() + 1).cumsum().to_numpy() - 1) // budget
+        boundaries = np.flatnonzero(np.diff(group_keys)) + 1
+        for group in np.split(rows.to_numpy(), boundaries):
+            yield {'text': header + '\n' + '\n'.join(group), 'heading': True}
+    
+    def chunk_text(self, text: str, chunk_size: int = 500, overlap: int = 50) -> List[Dict[str, Any]]:
+        """تقسيم النص إلى أجزاء متداخلة"""
+        return list(self.iter_chunks([{'text': text}], chunk_size, overlap))
 
-        return [{'text': chunk, 'chunk_id': i, 'total_words': len(chunk.split())} 
-                for i, chunk in enumerate(chunks)]
+    def iter_chunks(self, segments: Iterable[Dict[str, Any]], chunk_size: int = 500, overlap: int = 50) -> Iterator[Dict[str, Any]]:
+        """تقسيم مقاطع النص المتتالية إلى أجزاء متداخلة بشكل تدريجي (الحجم والتداخل بعدد الرموز)"""
+        return TextChunker(chunk_size, overlap).iter_chunks(segments)
     
-    def extract_metadata(self, file_path: str, text: str) -> Dict[str, Any]:
+    def extract_metadata(self, file_path: str, text: str = '') -> Dict[str, Any]:
         """استخراج البيانات الوصفية من المستند"""
         file_name = os.path.basename(file_path)
         file_size = os.path.getsize(file_path)
@@ -134,7 +189,7 @@ class DocumentProcessor:
             'file_name': file_name,
             'file_size': file_size,
             'file_type': file_extension,
-            'processed_date': pd.Timestamp.now().isoformat(),
+            'processed_date': datetime.now().isoformat(),
             'total_chars': len(text),
             'total_words': len(text.split()),
             'first_lines': first_lines,
@@ -142,6 +197,10 @@ class DocumentProcessor:
     
     def process_document(self, file_path: str) -> str:
         """معالجة المستند بناءً على امتداد الملف"""
+        return '\n'.join(segment['text'] for segment in self.iter_document(file_path))
+
+    def iter_document(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """استخراج مقاطع المستند (صفحات/فقرات/شرائح) بشكل تدريجي"""
         ext = os.path.splitext(file_path)[1].lower()
         
         processors = {
@@ -1,115 +1,986 @@
 # src/services/document_store.py
 import logging
-from qdrant_client import QdrantClient
 from qdrant_client.models import VectorParams, Distance, PointStruct
 from .document_processor import DocumentProcessor
 from config.settings import settings
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Callable, Iterable, Iterator, Tuple, AsyncIterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import Counter, deque
+import time
 from .Embedding_service import EmbeddingSrevice
+from .extraction_pool import ExtractionPool
+from .page_cache import get_page_cache
+from .sparse_encoder import SparseEncoder
+from .chunker import TextChunker, effective_chunk_tokens
+from . import metrics
+from .clients import get_qdrant_client, get_async_qdrant_client
 import os
 import hashlib
+import json
+import threading
 from qdrant_client.http.exceptions import UnexpectedResponse
 from qdrant_client.http import models as rest
 
 logger = logging.getLogger(__name__)
 
 class QdrantDocumentStore:
+    # المتجه الكثيف بدون اسم (كما في المجموعات القديمة) والمتجه المتناثر باسم
+    DENSE_VECTOR_NAME = ""
+    SPARSE_VECTOR_NAME = "bm25"
+    RETRIEVAL_MODES = ("dense", "hybrid")
+
     def __init__(self):
         self.embedding = EmbeddingSrevice()
-        self.client = QdrantClient(
-            host=settings.QDRANT_HOST, 
-            port=settings.QDRANT_PORT
+        self.sparse_encoder = SparseEncoder(
+            avg_doc_length=effective_chunk_tokens(settings.CHUNK_SIZE, settings.EMBEDDING_MAX_TOKENS)
         )
+        self.sparse_enabled = False
+        self.client = get_qdrant_client()
+        self.async_client = get_async_qdrant_client()
         self.collection_name = settings.COLLECTION_NAME
+        self.manifest_collection_name = f"{self.collection_name}_manifest"
         self.doc_processor = DocumentProcessor()
+        self.extraction_pool = None
+        if settings.EXTRACTION_WORKERS > 0:
+            self.extraction_pool = ExtractionPool(
+                settings.EXTRACTION_WORKERS,
+                settings.EXTRACTION_TIMEOUT_SECONDS,
+                settings.EXTRACTION_MEMORY_LIMIT_MB
+            )
+        self.page_cache = get_page_cache()
+        self._change_listeners: List[Callable[[str], None]] = []
+        # حد لعدد دفعات التضمين المتزامنة عبر كل عمليات الرفع الجارية
+        self.embedding_slots = threading.BoundedSemaphore(max(1, settings.INGEST_MAX_CONCURRENT_EMBEDDINGS))
         self._ensure_collection()
+        self._ensure_manifest_collection()
     
     def _ensure_collection(self):
         try:
-            self.client.get_collection(self.collection_name)
+            info = self.client.get_collection(self.collection_name)
             print(f"Collection '{self.collection_name}' already exists.")
         except (UnexpectedResponse, ValueError):
             # لم تُوجد → ننشئها
+            self._create_collection(self.collection_name, self.embedding.get_embedding_dimension())  # حسب نموذج الـ embedding
+            info = self.client.get_collection(self.collection_name)
+
+        # طول المتجه معروف من المجموعة → لا حاجة لطلب تضمين تجريبي لاحقاً
+        self.embedding.set_embedding_dimension(self._vector_size(info))
+        self.sparse_enabled = self.SPARSE_VECTOR_NAME in (info.config.params.sparse_vectors or {})
+        if not self.sparse_enabled:
+            logger.warning(
+                f"Collection '{self.collection_name}' has no '{self.SPARSE_VECTOR_NAME}' sparse vector; "
+                f"hybrid retrieval falls back to dense search."
+            )
+
+        self._ensure_payload_indexes(self.collection_name, {
+            'file_name': rest.PayloadSchemaType.KEYWORD,
+            'file_type': rest.PayloadSchemaType.KEYWORD,
+            'chunk_id': rest.PayloadSchemaType.INTEGER,
+        })
+
+    def _create_collection(self, collection_name: str, vector_size: int):
+        """إنشاء مجموعة الأجزاء بإعدادات التخزين الحالية (الضغط، التخزين على القرص، HNSW)"""
+        self.client.create_collection(
+            collection_name=collection_name,
+            vectors_config=rest.VectorParams(
+                size=vector_size,
+                distance=rest.Distance.COSINE,
+                on_disk=settings.QDRANT_VECTORS_ON_DISK,
+            ),
+            sparse_vectors_config={
+                # Qdrant يحسب الـ IDF من المجموعة نفسها وقت البحث
+                self.SPARSE_VECTOR_NAME: rest.SparseVectorParams(
+                    modifier=rest.Modifier.IDF,
+                    index=rest.SparseIndexParams(on_disk=settings.QDRANT_VECTORS_ON_DISK),
+                )
+            },
+            hnsw_config=rest.HnswConfigDiff(m=settings.QDRANT_HNSW_M, ef_construct=settings.QDRANT_HNSW_EF_CONSTRUCT),
+            quantization_config=self._quantization_config(),
+        )
+        logger.info(f"Collection '{collection_name}' created.")
+
+    def _vector_size(self, info) -> int:
+        vectors = info.config.params.vectors
+        return vectors.size if isinstance(vectors, rest.VectorParams) else vectors[self.DENSE_VECTOR_NAME].size
+
+    @staticmethod
+    def _quantization_config():
+        quantization = settings.QDRANT_QUANTIZATION.lower()
+        if quantization == "none":
+            return None
+        if quantization == "scalar":
+            # int8: ذاكرة أقل بأربع مرات من float32
+            return rest.ScalarQuantization(scalar=rest.ScalarQuantizationConfig(
+                type=rest.ScalarType.INT8,
+                quantile=0.99,
+                always_ram=settings.QDRANT_QUANTIZATION_ALWAYS_RAM,
+            ))
+        if quantization == "binary":
+            return rest.BinaryQuantization(binary=rest.BinaryQuantizationConfig(
+                always_ram=settings.QDRANT_QUANTIZATION_ALWAYS_RAM,
+            ))
+        raise ValueError(f"Unknown quantization: {settings.QDRANT_QUANTIZATION}")
+
+    def _ensure_manifest_collection(self):
+        """مجموعة بيان المستندات: سجل واحد بدون متجهات لكل ملف"""
+        try:
+            self.client.get_collection(self.manifest_collection_name)
+        except (UnexpectedResponse, ValueError):
             self.client.create_collection(
-                collection_name=self.collection_name,
-                vectors_config=rest.VectorParams(
-                    size=self.embedding.get_embedding_dimension(),  # حسب نموذج الـ embedding
-                    distance=rest.Distance.COSINE,
-                ),
+                collection_name=self.manifest_collection_name,
+                vectors_config={},
             )
-            logger.info(f"Collection '{self.collection_name}' created.")
+            logger.info(f"Collection '{self.manifest_collection_name}' created.")
+
+        self._ensure_payload_indexes(self.manifest_collection_name, {
+            'file_name': rest.PayloadSchemaType.KEYWORD,
+            'file_type': rest.PayloadSchemaType.KEYWORD,
+        })
+
+    def _ensure_payload_indexes(self, collection_name: str, schema: Dict[str, rest.PayloadSchemaType]):
+        """إنشاء فهارس الحقول المستخدمة في الفلترة (تُبنى في الخلفية دون انتظار)"""
+        existing = self.client.get_collection(collection_name).payload_schema or {}
+        for field_name, field_schema in schema.items():
+            if field_name not in existing:
+                self.client.create_payload_index(
+                    collection_name=collection_name,
+                    field_name=field_name,
+                    field_schema=field_schema,
+                    wait=False
+                )
+    
+    def add_change_listener(self, listener: Callable[[str], None]):
+        """تسجيل دالة تُستدعى باسم الملف عند إعادة رفعه أو حذفه"""
+        self._change_listeners.append(listener)
+
+    def _notify_changed(self, file_name: str):
+        for listener in self._change_listeners:
+            try:
+                listener(file_name)
+            except Exception as e:
+                logger.warning(f"Change listener failed for '{file_name}': {str(e)}")
     
-    def _generate_point_id(self, file_path: str, chunk_id: int) -> int:
-        """إنشاء معرف فريد للنقطة"""
-        unique_string = f"{file_path}_{chunk_id}"
+    def _generate_point_id(self, file_name: str, chunk_key: str) -> int:
+        """إنشاء معرف فريد للنقطة من اسم الملف ومفتاح الجزء"""
+        unique_string = f"{file_name}_{chunk_key}"
         return int(hashlib.md5(unique_string.encode()).hexdigest()[:15], 16)
+
+    def _manifest_point_id(self, file_name: str) -> int:
+        return int(hashlib.md5(f"manifest_{file_name}".encode()).hexdigest()[:15], 16)
+
+    @staticmethod
+    def _hash_file(file_path: str) -> str:
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for block in iter(lambda: file.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _hash_text(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def get_manifest(self, file_name: str) -> Optional[Dict[str, Any]]:
+        """قراءة بيان المستند (بصمة الملف وبصمات الأجزاء ومعرفات النقاط)"""
+        records = self.client.retrieve(
+            collection_name=self.manifest_collection_name,
+            ids=[self._manifest_point_id(file_name)],
+            with_payload=True,
+            with_vectors=False
+        )
+        return records[0].payload if records else None
+
+    def _is_unchanged(self, manifest: Optional[Dict[str, Any]], content_hash: str, chunk_size: int) -> bool:
+        return bool(manifest) and (
+            manifest.get('content_hash') == content_hash
+            # الحجم الفعلي بعد سقف النموذج: 500 و1000 ينتجان نفس الأجزاء عند سقف 256
+            and manifest.get('chunk_size') == effective_chunk_tokens(chunk_size, settings.EMBEDDING_MAX_TOKENS)
+            and manifest.get('chunk_overlap') == settings.CHUNK_OVERLAP
+            and manifest.get('chunker_version') == TextChunker.VERSION
+            and manifest.get('embedding_model') == self.embedding.embedding_model
+        )
     
-    def upload_document(self, file_path: str, chunk_size: int = 500) -> bool:
-        """رفع ومعالجة مستند واحد"""
+    def upload_document(self, file_path: str, chunk_size: int = 500, file_name: Optional[str] = None, force: bool = False,
+                        progress: Optional[Callable[[int, int], None]] = None) -> bool:
+        """رفع ومعالجة مستند واحد مع تخطي الملفات والأجزاء غير المتغيرة"""
+        self.upload_documents(
+            [{'path': file_path, 'name': file_name}], chunk_size, force, progress, raise_on_error=True
+        )
+        return True
+
+    def upload_documents(self, files: List[Dict[str, Any]], chunk_size: int = 500, force: bool = False,
+                         progress: Optional[Callable[[int, int], None]] = None,
+                         raise_on_error: bool = False) -> Dict[str, Any]:
+        """رفع مجموعة ملفات: استخراج متوازٍ، دفعات تضمين عابرة لحدود الملفات ورفع مجمّع إلى Qdrant
+
+        files: قائمة من {'path': مسار الملف, 'name': اسم المستند (اختياري)}
+        """
+        started = time.perf_counter()
+        stats = {
+            'files': len(files),
+            'files_indexed': 0,
+            'files_skipped': 0,
+            'files_failed': 0,
+            'chunks': 0,
+            'chunks_embedded': 0,
+            'errors': {},
+        }
+
+        # عدد أجزاء كل ملف اكتمل تقسيمه؛ قد يفشل لاحقاً عند تضمين أو رفع دفعة مشتركة
+        indexed: Dict[str, int] = {}
+        with _PointWriter(self, settings.UPSERT_BATCH_SIZE, progress) as writer:
+            for file, plan, error in self._iter_prepared(files, chunk_size, force):
+                file_name = file.get('name') or os.path.basename(file['path'])
+                try:
+                    if error is not None:
+                        raise error
+                    if plan['skip']:
+                        logger.info(f"Skipping unchanged document: {file_name}")
+                        stats['files_skipped'] += 1
+                        continue
+                    indexed[file_name] = self._ingest_file(writer, plan, chunk_size)
+                except Exception as e:
+                    if raise_on_error:
+                        raise
+                    writer.discard(file_name, e)
+
+        for file_name, error in writer.failed.items():
+            logger.error(f"Failed to ingest '{file_name}': {str(error)}")
+            indexed.pop(file_name, None)
+            stats['errors'][file_name] = str(error)
+        if raise_on_error and writer.failed:
+            raise next(iter(writer.failed.values()))
+
+        stats['files_indexed'] = len(indexed)
+        stats['files_failed'] = len(writer.failed)
+        stats['chunks'] = sum(indexed.values())
+        stats['chunks_embedded'] = writer.chunks_embedded
+
+        seconds = time.perf_counter() - started
+        stats['seconds'] = round(seconds, 3)
+        stats['files_per_second'] = round(len(files) / seconds, 2) if seconds else 0.0
+        stats['chunks_per_second'] = round(stats['chunks'] / seconds, 2) if seconds else 0.0
+        return stats
+
+    def _iter_prepared(self, files: List[Dict[str, Any]], chunk_size: int, force: bool):
+        """تجهيز الملفات بالترتيب: ملف واحد يُستخرج بشكل تدريجي، وعدة ملفات تُستخرج بالتوازي مسبقاً"""
+        if len(files) == 1:
+            try:
+                yield files[0], self._prepare_file(files[0], chunk_size, force, prefetch=False), None
+            except Exception as e:
+                yield files[0], None, e
+            return
+
+        window = max(1, settings.EXTRACTION_WORKERS)
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=window) as executor:
+            for file in files:
+                if len(pending) >= window:
+                    yield self._prepared_result(*pending.popleft())
+                pending.append((file, executor.submit(self._prepare_file, file, chunk_size, force, True)))
+            while pending:
+                yield self._prepared_result(*pending.popleft())
+
+    @staticmethod
+    def _prepared_result(file: Dict[str, Any], future: Future):
+        try:
+            return file, future.result(), None
+        except Exception as e:
+            return file, None, e
+
+    def _prepare_file(self, file: Dict[str, Any], chunk_size: int, force: bool, prefetch: bool) -> Dict[str, Any]:
+        """فحص البيان واستخراج المقاطع إذا تغير الملف"""
+        file_path = file['path']
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File not found: {file_path}")
-        
+
+        file_name = file.get('name') or os.path.basename(file_path)
+        content_hash = self._hash_file(file_path)
+        manifest = self.get_manifest(file_name)
+        plan = {
+            'path': file_path,
+            'name': file_name,
+            'content_hash': content_hash,
+            'manifest': manifest,
+            'force': force,
+            'skip': not force and self._is_unchanged(manifest, content_hash, chunk_size),
+        }
+
+        if not plan['skip']:
+            segments = self._extract_segments(file_path, content_hash)
+            if prefetch:
+                with metrics.stage('extract'):
+                    plan['segments'] = list(segments)
+            else:
+                # الاستخراج يحدث أثناء التقسيم → يُقاس زمن إنتاج المقاطع فقط
+                plan['segments'] = metrics.TimedIterator(segments, 'extract')
+        return plan
+
+    def _ingest_file(self, writer: "_PointWriter", plan: Dict[str, Any], chunk_size: int) -> int:
+        """تقسيم ملف واحد وإضافة أجزائه المتغيرة إلى دفعات الكاتب المشترك"""
+        file_path, file_name, manifest = plan['path'], plan['name'], plan['manifest']
         logger.info(f"Processing document: {file_path}")
+
+        # الأجزاء السابقة صالحة لإعادة الاستخدام فقط إذا لم يتغير نموذج التضمين
+        # الفهرس حسب بصمة النص وليس الموقع: فقرة مضافة في البداية لا تعيد تضمين ما بعدها
+        reusable: Dict[str, deque] = {}
+        if manifest and not plan['force'] and manifest.get('embedding_model') == self.embedding.embedding_model:
+            old_positions = manifest.get('chunk_positions', [])
+            for old_idx, (old_hash, old_id) in enumerate(zip(manifest.get('chunk_hashes', []), manifest.get('point_ids', []))):
+                old_position = old_positions[old_idx] if old_idx < len(old_positions) else None
+                reusable.setdefault(old_hash, deque()).append((old_id, old_idx, old_position))
+
+        # نقاط الملف ستتغير: البيان يفقد بصمته حتى ينجح الإنهاء، فلا يُتخطى الملف عند إعادة رفعه بعد فشل
+        if manifest is not None:
+            self.client.set_payload(
+                collection_name=self.manifest_collection_name,
+                payload={'content_hash': None},
+                points=[self._manifest_point_id(file_name)]
+            )
         
-        # استخراج النص من المستند
-        text = self.doc_processor.process_document(file_path)
-        if not text.strip():
-            raise ValueError(f"No text extracted from: {file_path}")
-                
-        # تقسيم النص إلى أجزاء
-        chunks = self.doc_processor.chunk_text(text, chunk_size, settings.CHUNK_OVERLAP)
-        chunk_texts = [chunk['text'] for chunk in chunks]
-        full_text = ' '.join(chunk_texts)
-
-        # استخراج البيانات الوصفية
-        metadata = self.doc_processor.extract_metadata(file_path, full_text)
-        
-        # توليد التضمينات النصية
-        embeddings = [self.embedding.get_embedding(chunk) for chunk in chunk_texts]        
+        # التقسيم تدريجي: لا يتم تحميل المستند كاملاً في الذاكرة
+        metadata = self.doc_processor.extract_metadata(file_path)
+        metadata['file_name'] = file_name
+        # الحجم بعدد الرموز ولا يتجاوز أقصى طول لنموذج التضمين
+        chunk_tokens = effective_chunk_tokens(chunk_size, settings.EMBEDDING_MAX_TOKENS)
+        segments = plan['segments']
+        chunks = metrics.TimedIterator(self.doc_processor.iter_chunks(segments, chunk_tokens, settings.CHUNK_OVERLAP))
+
+        point_ids = []
+        chunk_hashes = []
+        chunk_positions = []
+        moved_points = []
+        occurrences: Counter = Counter()
+        reused_chunks = 0
+        total_chars = 0
+        total_words = 0
+        head_text = ''
+        for chunk in chunks:
+            idx = chunk['chunk_id']
+            chunk_hash = self._hash_text(chunk['text'])
+            occurrence = occurrences[chunk_hash]
+            occurrences[chunk_hash] += 1
+            chunk_hashes.append(chunk_hash)
+
+            # إحصائيات النص الكامل تُحسب تدريجياً
+            total_chars = chunk['end_char']
+            total_words += chunk['total_words']
+            if head_text.count('\n') < 5:
+                head_text = f"{head_text} {chunk['text']}" if head_text else chunk['text']
+
+            position = [chunk['start_char'], chunk['end_char'], chunk.get('page_start'), chunk.get('page_end')]
+            chunk_positions.append(position)
+
+            # الجزء موجود مسبقاً بنفس النص في أي موقع → يحتفظ بمعرفه ولا حاجة لإعادة التضمين
+            candidates = reusable.get(chunk_hash)
+            if candidates:
+                point_id, old_idx, old_position = candidates.popleft()
+                point_ids.append(point_id)
+                reused_chunks += 1
+                # تعديل في المستند أزاح النص → يُحدّث الترتيب والمواقع فقط
+                if old_idx != idx or old_position != position:
+                    moved_points.append((point_id, idx, position))
+                continue
+
+            # المعرف من بصمة النص وترتيب تكراره: لا يصطدم بمعرف جزء قديم أُعيد استخدامه في موقع آخر
+            point_id = self._generate_point_id(file_name, f"{chunk_hash}_{occurrence}")
+            point_ids.append(point_id)
 
-        # إعداد النقاط لـ Qdrant
-        points = []
-        for idx, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
             point_metadata = metadata.copy()
             point_metadata.update({
                 'chunk_id': idx,
                 'chunk_text': chunk['text'],
                 'total_words': chunk['total_words'],
+                'token_count': chunk['token_count'],
+                'start_char': chunk['start_char'],
+                'end_char': chunk['end_char'],
+                'page_start': chunk.get('page_start'),
+                'page_end': chunk.get('page_end'),
                 'is_chunk': True,
                 'original_text_preview': chunk['text'][:200] + "..." if len(chunk['text']) > 200 else chunk['text']
             })
-            
-            point = PointStruct(
-                id=self._generate_point_id(file_path, idx),
-                vector=embedding,
-                payload=point_metadata
+
+            writer.add(point_id, point_metadata)
+
+        # زمن التقسيم وحده: إنتاج الأجزاء يتضمن استخراج المقاطع عند عدم تحميلها مسبقاً
+        extract_seconds = segments.seconds if isinstance(segments, metrics.TimedIterator) else 0.0
+        metrics.record_stage('chunk', max(0.0, chunks.seconds - extract_seconds))
+
+        if not point_ids:
+            raise ValueError(f"No text extracted from: {file_path}")
+
+        def finalize():
+            self._update_positions(moved_points)
+
+            # البيانات الوصفية على مستوى المستند لا تُعرف إلا بعد انتهاء التقسيم
+            self.client.set_payload(
+                collection_name=self.collection_name,
+                payload={
+                    'file_size': metadata['file_size'],
+                    'processed_date': metadata['processed_date'],
+                    'total_chars': total_chars,
+                    'first_lines': head_text.split('\n')[:5]
+                },
+                points=point_ids
             )
-            points.append(point)
-        
-        # رفع إلى Qdrant
-        self.client.upsert(
+
+            self._delete_stale_points(file_name, point_ids)
+
+            self.client.upsert(
+                collection_name=self.manifest_collection_name,
+                points=[PointStruct(
+                    id=self._manifest_point_id(file_name),
+                    vector={},
+                    payload={
+                        'file_name': file_name,
+                        'file_type': metadata['file_type'],
+                        'file_size': metadata['file_size'],
+                        'processed_date': metadata['processed_date'],
+                        'content_hash': plan['content_hash'],
+                        'embedding_model': self.embedding.embedding_model,
+                        'chunk_size': chunk_tokens,
+                        'chunk_overlap': settings.CHUNK_OVERLAP,
+                        'chunker_version': TextChunker.VERSION,
+                        'total_chunks': len(point_ids),
+                        'total_chars': total_chars,
+                        'total_words': total_words,
+                        'chunk_hashes': chunk_hashes,
+                        'chunk_positions': chunk_positions,
+                        'point_ids': point_ids
+                    }
+                )]
+            )
+            self._notify_changed(file_name)
+
+            logger.info(
+                f"Successfully uploaded {len(point_ids)} chunks from {file_path} "
+                f"({len(point_ids) - reused_chunks} embedded, {reused_chunks} unchanged)"
+            )
+
+        # يُنفذ بعد رفع كل أجزاء الملف، وقد تكون ما زالت في دفعة مشتركة مع الملف التالي
+        writer.add_finalizer(file_name, finalize)
+        return len(point_ids)
+
+    def _update_positions(self, moved_points: List[Tuple[int, int, list]]):
+        """ترتيب ومواقع الأجزاء المعاد استخدامها (الأحرف والصفحات) تختلف لكل نقطة → عمليات set_payload مجمّعة"""
+        for i in range(0, len(moved_points), settings.UPSERT_BATCH_SIZE):
+            self.client.batch_update_points(
+                collection_name=self.collection_name,
+                update_operations=[
+                    rest.SetPayloadOperation(set_payload=rest.SetPayload(
+                        payload={'chunk_id': chunk_id, 'start_char': start_char, 'end_char': end_char,
+                                 'page_start': page_start, 'page_end': page_end},
+                        points=[point_id]
+                    ))
+                    for point_id, chunk_id, (start_char, end_char, page_start, page_end)
+                    in moved_points[i:i + settings.UPSERT_BATCH_SIZE]
+                ]
+            )
+
+    def _extract_segments(self, file_path: str, content_hash: str) -> Iterable[Dict[str, Any]]:
+        if os.path.splitext(file_path)[1].lower() == '.pdf':
+            return self._extract_pdf_segments(file_path, content_hash)
+        # التحليل مقيد بالمعالج → عملية منفصلة؛ يعود النص المستخرج فقط وليس الملف
+        if self.extraction_pool is not None:
+            return self.extraction_pool.extract(file_path)
+        return self.doc_processor.iter_document(file_path)
+
+    def _extract_pdf_segments(self, file_path: str, content_hash: str) -> Iterator[Dict[str, Any]]:
+        """صفحات PDF بالترتيب مع أرقامها: من ذاكرة الصفحات إن وُجد الملف، وإلا موزعة على عمّال الاستخراج"""
+        pages = self.page_cache.get(content_hash) if self.page_cache is not None else None
+        if pages is not None:
+            logger.info(f"Using cached page text for: {file_path}")
+            source = iter(pages)
+        elif self.extraction_pool is not None:
+            source = self.extraction_pool.iter_pdf_pages(file_path, settings.PDF_PAGES_PER_TASK)
+        else:
+            source = self.doc_processor.iter_pdf_pages(file_path)
+
+        extracted = []
+        for page_number, page_text in enumerate(source, start=1):
+            extracted.append(page_text)
+            if page_text:
+                yield {'text': page_text, 'page': page_number}
+
+        if pages is None and self.page_cache is not None:
+            self.page_cache.put(content_hash, extracted)
+
+    def _delete_stale_points(self, file_name: str, point_ids: List[int]):
+        """حذف كل نقاط الملف خارج النسخة الحالية في استدعاء واحد
+
+        بالفلتر وليس بمعرفات البيان: يشمل النسخ السابقة بلا بيان ونقاط رفع سابق فشل قبل إنهائه"""
+        self.client.delete(
             collection_name=self.collection_name,
-            points=points
+            points_selector=rest.FilterSelector(filter=rest.Filter(
+                must=[rest.FieldCondition(key='file_name', match=rest.MatchValue(value=file_name))],
+                must_not=[rest.HasIdCondition(has_id=point_ids)]
+            ))
         )
-        
-        logger.info(f"Successfully uploaded {len(points)} chunks from {file_path}")
-        return True
-    
-    def search_documents(self, query: str, limit: int = 10, score_threshold: float = 0.5):
-        """البحث عن محتوى مشابه في المستندات"""
-        query_embedding = self.embedding.get_embedding(query)
-        
-        search_results = self.client.search(
+
+    def _file_filter(self, file_name: str) -> rest.Filter:
+        return rest.Filter(must=[
+            rest.FieldCondition(key='file_name', match=rest.MatchValue(value=file_name))
+        ])
+
+    def delete_document(self, file_name: str) -> int:
+        """حذف جميع أجزاء ملف مع بيانه (حذف بالفلتر دون جلب المعرفات)"""
+        file_filter = self._file_filter(file_name)
+        deleted = self.client.count(
             collection_name=self.collection_name,
-            query_vector=query_embedding,
-            with_vectors=True,
+            count_filter=file_filter,
+            exact=True
+        ).count
+
+        if deleted:
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=rest.FilterSelector(filter=file_filter)
+            )
+
+        self.client.delete(
+            collection_name=self.manifest_collection_name,
+            points_selector=rest.PointIdsList(points=[self._manifest_point_id(file_name)])
+        )
+        self._notify_changed(file_name)
+        return deleted
+
+    async def count_document_chunks_async(self, file_name: str) -> int:
+        result = await self.async_client.count(
+            collection_name=self.collection_name,
+            count_filter=self._file_filter(file_name),
+            exact=True
+        )
+        return result.count
+
+    async def get_document_chunks_async(self, file_name: str, fields: List[str], limit: int = 100,
+                                        cursor: int = 0) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """صفحة من أجزاء ملف مرتبة برقم الجزء مع الحقول المطلوبة فقط؛ المؤشر التالي هو رقم الجزء الذي يليها"""
+        points, _ = await self.async_client.scroll(
+            collection_name=self.collection_name,
+            scroll_filter=self._file_filter(file_name),
+            # جزء إضافي لمعرفة ما إذا كانت هناك صفحة تالية
+            limit=limit + 1,
+            order_by=rest.OrderBy(key='chunk_id', start_from=cursor),
+            with_payload=list(dict.fromkeys(['chunk_id', *fields])),
+            with_vectors=False
+        )
+
+        next_cursor = points[limit].payload['chunk_id'] if len(points) > limit else None
+        return [{'id': point.id, **point.payload} for point in points[:limit]], next_cursor
+
+    async def get_chunk_async(self, file_name: str, chunk_id: int) -> Optional[Dict[str, Any]]:
+        """جزء واحد من ملف مع متجهه الكثيف، أو None إذا لم يوجد"""
+        chunk_filter = self._file_filter(file_name)
+        chunk_filter.must.append(rest.FieldCondition(key='chunk_id', match=rest.MatchValue(value=chunk_id)))
+        points, _ = await self.async_client.scroll(
+            collection_name=self.collection_name,
+            scroll_filter=chunk_filter,
+            limit=1,
             with_payload=True,
-            limit=limit,
-            score_threshold=score_threshold
+            with_vectors=[self.DENSE_VECTOR_NAME]
+        )
+        if not points:
+            return None
+
+        vector = points[0].vector
+        if isinstance(vector, dict):
+            vector = vector.get(self.DENSE_VECTOR_NAME)
+        return {'id': points[0].id, 'payload': points[0].payload, 'vector': vector}
+
+    async def iter_document_chunks_async(self, file_name: str, fields: List[str],
+                                         page_size: int = 256) -> AsyncIterator[Dict[str, Any]]:
+        """جميع أجزاء الملف صفحة بعد صفحة دون تحميلها كلها في الذاكرة"""
+        cursor = 0
+        while cursor is not None:
+            chunks, cursor = await self.get_document_chunks_async(file_name, fields, page_size, cursor)
+            for chunk in chunks:
+                yield chunk
+
+    def _point_vector(self, embedding: List[float], text: str):
+        if not self.sparse_enabled:
+            return embedding
+        return {
+            self.DENSE_VECTOR_NAME: embedding,
+            self.SPARSE_VECTOR_NAME: self.sparse_encoder.encode_document(text),
+        }
+
+    def _resolve_mode(self, mode: Optional[str]) -> str:
+        mode = (mode or settings.RETRIEVAL_MODE).lower()
+        if mode not in self.RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {mode}")
+        if mode == "hybrid" and not self.sparse_enabled:
+            return "dense"
+        return mode
+
+    @staticmethod
+    def _search_params(hnsw_ef: Optional[int] = None, rescore: Optional[bool] = None) -> rest.SearchParams:
+        """دقة البحث الدلالي: ef لـ HNSW وإعادة حساب درجات المتجهات المضغوطة بالمتجهات الأصلية"""
+        hnsw_ef = settings.QDRANT_SEARCH_HNSW_EF if hnsw_ef is None else hnsw_ef
+        rescore = settings.QDRANT_SEARCH_RESCORE if rescore is None else rescore
+        return rest.SearchParams(
+            hnsw_ef=hnsw_ef or None,
+            quantization=rest.QuantizationSearchParams(
+                rescore=rescore,
+                oversampling=settings.QDRANT_SEARCH_OVERSAMPLING if rescore else None,
+            ),
+        )
+
+    def _query_kwargs(self, query: str, query_embedding: List[float], limit: int,
+                      score_threshold: Optional[float], mode: Optional[str], with_vectors: bool,
+                      hnsw_ef: Optional[int] = None, rescore: Optional[bool] = None) -> Dict[str, Any]:
+        """معاملات query_points المشتركة بين البحث المتزامن وغير المتزامن وخدمة RAG"""
+        kwargs = {
+            'collection_name': self.collection_name,
+            'limit': limit,
+            'with_payload': True,
+            'with_vectors': [self.DENSE_VECTOR_NAME] if with_vectors else False,
+        }
+        search_params = self._search_params(hnsw_ef, rescore)
+
+        if self._resolve_mode(mode) == "dense":
+            kwargs.update(query=query_embedding, score_threshold=score_threshold, search_params=search_params)
+            return kwargs
+
+        # دمج ترتيب البحث الدلالي والبحث النصي (BM25) بـ Reciprocal Rank Fusion؛
+        # الدرجة الناتجة درجة ترتيب وليست تشابهاً، لذلك لا يُطبق عليها حد التشابه
+        prefetch_limit = max(limit, settings.HYBRID_PREFETCH_LIMIT)
+        dense = rest.Prefetch(query=query_embedding, limit=prefetch_limit, score_threshold=score_threshold,
+                              params=search_params)
+        sparse = rest.Prefetch(
+            query=self.sparse_encoder.encode_query(query),
+            using=self.SPARSE_VECTOR_NAME,
+            limit=prefetch_limit
         )
+        if score_threshold is not None:
+            # حد التشابه يعني نفس الشيء في الوضعين: BM25 يرتب فقط المرشحين الذين تجاوزوا الحد الدلالي
+            sparse.prefetch = dense
+        kwargs.update(prefetch=[dense, sparse], query=rest.FusionQuery(fusion=rest.Fusion.RRF))
+        return kwargs
+
+    def search_documents(self, query: str, limit: int = 10, score_threshold: Optional[float] = 0.5,
+                         mode: Optional[str] = None, query_embedding: Optional[List[float]] = None,
+                         with_vectors: bool = False, hnsw_ef: Optional[int] = None, rescore: Optional[bool] = None):
+        """البحث عن محتوى مشابه في المستندات (دلالي أو هجين حسب mode)"""
+        if query_embedding is None:
+            query_embedding = self.embedding.get_embedding(query)
+        
+        with metrics.stage('qdrant_search'):
+            search_results = self.client.query_points(
+                **self._query_kwargs(query, query_embedding, limit, score_threshold, mode, with_vectors, hnsw_ef, rescore)
+            )
         
-        return search_results
+        return search_results.points
+
+    async def search_documents_async(self, query: str, limit: int = 10, score_threshold: Optional[float] = 0.5,
+                                     mode: Optional[str] = None, query_embedding: Optional[List[float]] = None,
+                                     with_vectors: bool = False, hnsw_ef: Optional[int] = None,
+                                     rescore: Optional[bool] = None):
+        """نسخة غير متزامنة من search_documents"""
+        if query_embedding is None:
+            query_embedding = await self.embedding.get_embedding_async(query)
+
+        with metrics.stage('qdrant_search'):
+            search_results = await self.async_client.query_points(
+                **self._query_kwargs(query, query_embedding, limit, score_threshold, mode, with_vectors, hnsw_ef, rescore)
+            )
+
+        return search_results.points
+
+    async def search_documents_batch_async(self, queries: List[str], query_embeddings: List[List[float]],
+                                           limit: int = 10, score_threshold: Optional[float] = None,
+                                           mode: Optional[str] = None) -> List[List[Any]]:
+        """بحث عدة أسئلة في طلب واحد إلى Qdrant؛ النتائج بنفس ترتيب الأسئلة"""
+        requests = []
+        for query, query_embedding in zip(queries, query_embeddings):
+            kwargs = self._query_kwargs(query, query_embedding, limit, score_threshold, mode, with_vectors=False)
+            del kwargs['collection_name']
+            kwargs['with_vector'] = kwargs.pop('with_vectors')
+            if 'search_params' in kwargs:
+                kwargs['params'] = kwargs.pop('search_params')
+            requests.append(rest.QueryRequest(**kwargs))
+
+        with metrics.stage('qdrant_search'):
+            responses = await self.async_client.query_batch_points(
+                collection_name=self.collection_name,
+                requests=requests
+            )
+        return [response.points for response in responses]
     
+    # حقول البيان الكبيرة لا تُرسل عند عرض قائمة الملفات
+    CATALOG_EXCLUDED_FIELDS = ['chunk_hashes', 'chunk_positions', 'point_ids']
+
+    async def list_documents_async(self, file_type: Optional[str] = None, limit: int = 50,
+                                   offset: int = 0) -> Tuple[int, List[Dict[str, Any]]]:
+        """صفحة من فهرس الملفات (سجل واحد لكل ملف) مع العدد الكلي"""
+        catalog_filter = None
+        if file_type:
+            catalog_filter = rest.Filter(must=[
+                rest.FieldCondition(key='file_type', match=rest.MatchValue(value=f'.{file_type.lstrip(".")}'))
+            ])
+
+        total = await self.async_client.count(
+            collection_name=self.manifest_collection_name,
+            count_filter=catalog_filter,
+            exact=True
+        )
+        page = await self.async_client.query_points(
+            collection_name=self.manifest_collection_name,
+            query_filter=catalog_filter,
+            limit=limit,
+            offset=offset,
+            with_payload=rest.PayloadSelectorExclude(exclude=self.CATALOG_EXCLUDED_FIELDS),
+            with_vectors=False
+        )
+        return total.count, [point.payload for point in page.points]
+
+    def rebuild_catalog(self, page_size: int = 1000) -> int:
+        """إنشاء سجلات الفهرس للملفات المرفوعة قبل وجوده، انطلاقاً من الأجزاء المخزنة"""
+        documents: Dict[str, Dict[str, Any]] = {}
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=page_size,
+                offset=offset,
+                with_payload=['file_name', 'file_type', 'file_size', 'processed_date',
+                              'chunk_id', 'chunk_text', 'total_words', 'total_chars'],
+                with_vectors=False
+            )
+            for point in points:
+                payload = point.payload
+                document = documents.setdefault(payload.get('file_name'), {
+                    'file_name': payload.get('file_name'),
+                    'file_type': payload.get('file_type'),
+                    'file_size': payload.get('file_size'),
+                    'processed_date': payload.get('processed_date'),
+                    'total_chars': payload.get('total_chars'),
+                    'total_words': 0,
+                    'chunks': {}
+                })
+                document['total_words'] += payload.get('total_words') or 0
+                document['chunks'][payload.get('chunk_id')] = (point.id, self._hash_text(payload.get('chunk_text') or ''))
+            if offset is None:
+                break
+
+        created = 0
+        for file_name, document in documents.items():
+            if self.get_manifest(file_name) is not None:
+                continue
+            chunks_by_id = document.pop('chunks')
+            chunks = [chunks_by_id[chunk_id] for chunk_id in sorted(chunks_by_id)]
+            document.update({
+                # بدون بصمة الملف: الرفع التالي سيعيد المعالجة مع إعادة استخدام الأجزاء المطابقة
+                'content_hash': None,
+                'embedding_model': self.embedding.embedding_model,
+                'chunk_size': None,
+                'chunk_overlap': settings.CHUNK_OVERLAP,
+                'chunker_version': None,
+                'total_chunks': len(chunks),
+                'chunk_hashes': [chunk_hash for _, chunk_hash in chunks],
+                'point_ids': [point_id for point_id, _ in chunks],
+            })
+            self.client.upsert(
+                collection_name=self.manifest_collection_name,
+                points=[PointStruct(id=self._manifest_point_id(file_name), vector={}, payload=document)]
+            )
+            created += 1
+
+        logger.info(f"Catalog rebuilt: {created} documents added.")
+        return created
+
+    def migrate_collection(self, batch_size: int = 256, progress: Optional[Callable[[str, int], None]] = None) -> int:
+        """إعادة بناء مجموعة الأجزاء بإعدادات التخزين الحالية: نسخ مؤقت، إعادة إنشاء، ثم نسخ عكسي"""
+        temp_name = f"{self.collection_name}_migration"
+        if self.client.collection_exists(temp_name):
+            raise Exception(
+                f"Collection '{temp_name}' already exists (interrupted migration?). "
+                f"Check its contents, then delete it before migrating again."
+            )
+
+        self._create_collection(temp_name, self._vector_size(self.client.get_collection(self.collection_name)))
+        copied = self._copy_points(self.collection_name, temp_name, batch_size, progress)
+
+        self.client.delete_collection(self.collection_name)
+        self._ensure_collection()
+        # النسخ العكسي يضيف متجهات BM25 للنقاط التي لم تكن تملكها
+        self._copy_points(temp_name, self.collection_name, batch_size, progress)
+        self.client.delete_collection(temp_name)
+
+        logger.info(f"Collection '{self.collection_name}' migrated: {copied} points.")
+        return copied
+
+    def _copy_points(self, source: str, target: str, batch_size: int,
+                     progress: Optional[Callable[[str, int], None]] = None) -> int:
+        add_sparse = target == self.collection_name and self.sparse_enabled
+        copied = 0
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=source,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True
+            )
+            if points:
+                batch = []
+                for point in points:
+                    vector = point.vector
+                    if isinstance(vector, dict):
+                        dense, sparse = vector[self.DENSE_VECTOR_NAME], vector.get(self.SPARSE_VECTOR_NAME)
+                    else:
+                        dense, sparse = vector, None
+                    if sparse is None and add_sparse:
+                        sparse = self.sparse_encoder.encode_document(point.payload.get('chunk_text') or '')
+
+                    batch.append(PointStruct(
+                        id=point.id,
+                        vector={self.DENSE_VECTOR_NAME: dense, self.SPARSE_VECTOR_NAME: sparse} if sparse is not None else dense,
+                        payload=point.payload
+                    ))
+                self.client.upsert(collection_name=target, points=batch)
+                copied += len(batch)
+                if progress is not None:
+                    progress(target, copied)
+            if offset is None:
+                return copied
+
+    def close(self, wait: bool = True):
+        """إيقاف مجموعة عمليات الاستخراج (العملاء المشتركون تُغلق في services.clients)"""
+        if self.extraction_pool is not None:
+            self.extraction_pool.close(wait)
+
     def get_collection_info(self):
         """الحصول على معلومات المجموعة"""
-        return self.client.get_collection(self.collection_name)
\ No newline at end of file
+        return self.client.get_collection(self.collection_name)
+
+
+class _PointWriter:
+    """تجميع الأجزاء في دفعات ثابتة الحجم: تضمين الدفعة ثم رفعها في الخلفية أثناء تضمين الدفعة التالية
+
+    الدفعة قد تجمع أجزاء عدة ملفات: فشلها يُفشل كل ملفاتها فقط، ويبقى الخطأ في failed حسب اسم الملف"""
+
+    def __init__(self, store: QdrantDocumentStore, batch_size: int,
+                 progress: Optional[Callable[[int, int], None]] = None):
+        self.store = store
+        self.batch_size = max(1, batch_size)
+        self.progress = progress
+        self.chunks_embedded = 0
+        self.chunks_upserted = 0
+        self.failed: Dict[str, Exception] = {}
+        self._pending: List[tuple] = []
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._upsert_future: Optional[Future] = None
+        self._upsert_owners: Counter = Counter()
+        # نقاط كل ملف التي لم تُرفع بعد، ودالة الإنهاء التي تنتظر اكتمال رفعها
+        self._outstanding: Counter = Counter()
+        self._finalizers: Dict[str, Callable[[], None]] = {}
+
+    def __enter__(self) -> "_PointWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.flush()
+            self._wait_for_upsert()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def add(self, point_id: int, payload: Dict[str, Any]):
+        file_name = payload['file_name']
+        if file_name in self.failed:
+            return
+        self._pending.append((point_id, payload))
+        self._outstanding[file_name] += 1
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        owners = Counter(payload['file_name'] for _, payload in batch)
+        try:
+            with self.store.embedding_slots:
+                embeddings = self.store.embedding.get_embeddings([payload['chunk_text'] for _, payload in batch])
+        except Exception as e:
+            self._fail(owners, e)
+            return
+        self.chunks_embedded += len(batch)
+        self._report_progress()
+
+        points = [
+            PointStruct(id=point_id, vector=self.store._point_vector(embedding, payload['chunk_text']), payload=payload)
+            for (point_id, payload), embedding in zip(batch, embeddings)
+        ]
+
+        metrics.PAYLOAD_BYTES.inc(
+            sum(len(json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')) for _, payload in batch),
+            target="qdrant_upsert"
+        )
+
+        # رفع واحد فقط قيد التنفيذ في أي وقت
+        self._wait_for_upsert()
+        self._upsert_future = self._executor.submit(self._upsert, points)
+        self._upsert_owners = owners
+
+    def _upsert(self, points: List[PointStruct]):
+        with metrics.stage('qdrant_upsert'):
+            self.store.client.upsert(
+                collection_name=self.store.collection_name,
+                points=points
+            )
+
+    def _wait_for_upsert(self):
+        if self._upsert_future is None:
+            return
+
+        future, self._upsert_future = self._upsert_future, None
+        owners, self._upsert_owners = self._upsert_owners, Counter()
+        try:
+            future.result()
+        except Exception as e:
+            self._fail(owners, e)
+            return
+
+        self.chunks_upserted += sum(owners.values())
+        self._report_progress()
+        for file_name, count in owners.items():
+            if file_name not in self.failed:
+                self._outstanding[file_name] -= count
+                self._run_finalizer(file_name)
+
+    def add_finalizer(self, file_name: str, callback: Callable[[], None]):
+        """دالة تُنفذ بعد رفع كل نقاط الملف المضافة حتى الآن"""
+        if file_name in self.failed:
+            return
+        self._finalizers[file_name] = callback
+        self._run_finalizer(file_name)
+
+    def discard(self, file_name: str, error: Exception):
+        """ملف فشل أثناء تجهيزه أو تقسيمه: نقاطه التي لم تُرفع بعد تُحذف من الدفعة"""
+        self._fail([file_name], error)
+
+    def _run_finalizer(self, file_name: str):
+        if self._outstanding[file_name] > 0 or file_name not in self._finalizers:
+            return
+        callback = self._finalizers.pop(file_name)
+        del self._outstanding[file_name]
+        # خطأ ملف واحد لا يوقف إنهاء بقية الملفات
+        try:
+            callback()
+        except Exception as e:
+            self.failed.setdefault(file_name, e)
+
+    def _fail(self, file_names: Iterable[str], error: Exception):
+        for file_name in file_names:
+            self.failed.setdefault(file_name, error)
+            self._finalizers.pop(file_name, None)
+            self._outstanding.pop(file_name, None)
+        self._pending = [item for item in self._pending if item[1]['file_name'] not in self.failed]
+
+    def _report_progress(self):
+        if self.progress is not None:
+            self.progress(self.chunks_embedded, self.chunks_upserted)
@@ -0,0 +1,148 @@
+# src/services/embedding_cache.py
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Iterable, Any
+from config.settings import settings
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# حد عدد المعاملات في استعلام SQLite واحد
+_SQLITE_BATCH = 500
+
+
+class EmbeddingCache:
+    """ذاكرة تخزين مؤقت للتضمينات: طبقة LRU داخل العملية أمام قاعدة SQLite دائمة"""
+
+    def __init__(self, path: Optional[str] = None, memory_size: int = 10000):
+        self.path = path
+        self.memory_size = memory_size
+        # float32 مضغوط (4 بايت للعنصر بدل ~32 في list[float])؛ يتحول إلى list عند الإرجاع
+        self._memory: "OrderedDict[str, array]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        """مفتاح المحتوى: بصمة اسم النموذج مع نص الجزء"""
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[List[float]]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        """البحث عن مجموعة مفاتيح: الذاكرة أولاً ثم القرص"""
+        found: Dict[str, List[float]] = {}
+        missing: List[str] = []
+        disk_hits = 0
+
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector.tolist()
+                    self.memory_hits += 1
+                else:
+                    missing.append(key)
+
+            if missing and self._conn is not None:
+                for start in range(0, len(missing), _SQLITE_BATCH):
+                    part = missing[start:start + _SQLITE_BATCH]
+                    rows = self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})",
+                        part
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = array('f', blob)
+                        found[key] = vector.tolist()
+                        self._remember(key, vector)
+                        disk_hits += 1
+
+            misses = len(missing) - disk_hits
+            self.disk_hits += disk_hits
+            self.misses += misses
+
+        metrics.EMBEDDING_CACHE_LOOKUPS.inc(len(found) - disk_hits, result="memory_hit")
+        metrics.EMBEDDING_CACHE_LOOKUPS.inc(disk_hits, result="disk_hit")
+        metrics.EMBEDDING_CACHE_LOOKUPS.inc(misses, result="miss")
+        return found
+
+    def put(self, key: str, vector: List[float]):
+        self.put_many({key: vector})
+
+    def put_many(self, vectors: Dict[str, List[float]]):
+        if not vectors:
+            return
+
+        packed = {key: array('f', vector) for key, vector in vectors.items()}
+        with self._lock:
+            for key, vector in packed.items():
+                self._remember(key, vector)
+
+            if self._conn is not None:
+                try:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                        [(key, vector.tobytes()) for key, vector in packed.items()]
+                    )
+                    self._conn.commit()
+                except sqlite3.Error as e:
+                    # فشل الكتابة إلى القرص لا يجب أن يوقف عملية التضمين
+                    logger.warning(f"Failed to persist embeddings to cache: {str(e)}")
+
+    def _remember(self, key: str, vector: array):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "path": self.path,
+        }
+
+
+_default_cache: Optional[EmbeddingCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """ذاكرة التضمينات المشتركة بين جميع الخدمات في العملية"""
+    global _default_cache
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return None
+
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = EmbeddingCache(
+                settings.EMBEDDING_CACHE_PATH or None,
+                settings.EMBEDDING_CACHE_MEMORY_SIZE
+            )
+        return _default_cache
@@ -0,0 +1,253 @@
+# src/services/extraction_pool.py
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, wait as wait_futures
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.connection import Connection, wait
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # غير متاح على Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# حجم الدفعة التي يرسلها العامل للعملية الأم؛ الأنبوب يوقف العامل حتى تُستهلك الدفعة السابقة
+SEGMENT_BATCH_CHARS = 256 * 1024
+# أول رسالة من كل مهمة: بدأ التنفيذ فعلاً (المهلة لا تشمل الانتظار خلف ملفات أخرى)
+_STARTED = 'started'
+
+
+def _init_worker(memory_limit_mb: int):
+    """تحديد سقف الذاكرة لعملية الاستخراج حتى لا يُسقط ملف معطوب خادم الـ API"""
+    if resource is not None and memory_limit_mb > 0:
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    # مكتبات الصيغ نفسها تُحمّل عند أول ملف من نوعها داخل العملية
+    import services.document_processor  # noqa: F401
+
+
+def _run_task(conn: Connection, task: Callable[..., Iterator[List[Any]]], args: Tuple[Any, ...]):
+    """يُنفذ داخل العامل: إشارة البدء ثم كل دفعة تنتجها المهمة عبر الأنبوب"""
+    try:
+        conn.send(_STARTED)
+        for batch in task(*args):
+            conn.send(batch)
+    finally:
+        conn.close()
+
+
+def _extract_segments(file_path: str) -> Iterator[List[Dict[str, Any]]]:
+    from services.document_processor import DocumentProcessor
+    batch, size = [], 0
+    for segment in DocumentProcessor().iter_document(file_path):
+        batch.append(segment)
+        size += len(segment.get('text') or '')
+        if size >= SEGMENT_BATCH_CHARS:
+            yield batch
+            batch, size = [], 0
+    if batch:
+        yield batch
+
+
+# آخر ملف PDF فتحته العملية: تحليل الملف وشجرة صفحاته يُدفع مرة واحدة لكل عامل وليس لكل نطاق
+_open_pdf: Dict[str, Any] = {}
+
+
+def _get_pdf_reader(file_path: str):
+    from services.document_processor import DocumentProcessor
+    stat = os.stat(file_path)
+    key = (file_path, stat.st_mtime_ns, stat.st_size)
+    if _open_pdf.get('key') != key:
+        _open_pdf.clear()
+        _open_pdf.update(key=key, reader=DocumentProcessor().open_pdf(file_path))
+    return _open_pdf['reader']
+
+
+def _count_pdf_pages(file_path: str) -> Iterator[List[int]]:
+    yield [len(_get_pdf_reader(file_path).pages)]
+
+
+def _extract_pdf_pages(file_path: str, start: int, end: int) -> Iterator[List[str]]:
+    from services.document_processor import DocumentProcessor
+    yield list(DocumentProcessor().iter_pdf_pages(file_path, start, end, _get_pdf_reader(file_path)))
+
+
+class _Deadline:
+    """مهلة واحدة لكل ملف: تُحسب من انتظار العملية الأم للعامل فقط بعد بدء أول مهمة له.
+    الوقت الذي تقضيه الدفعة عند المستهلك (تضمين، رفع) لا يُحسب؛ العامل خلاله متوقف عند الأنبوب"""
+
+    def __init__(self, timeout: Optional[float]):
+        self.timeout = timeout
+        self.started = False
+        self.waited = 0.0
+
+    def start(self):
+        self.started = True
+
+    def charge(self, seconds: float):
+        if self.started:
+            self.waited += seconds
+
+    def remaining(self) -> Optional[float]:
+        if not self.started or not self.timeout:
+            return None
+        return max(0.0, self.timeout - self.waited)
+
+
+class _Task:
+    """مهمة في العامل مع أنبوب دفعاتها وأنبوب يُغلق عند انتهاء الـ future (نجاح، فشل، أو انهيار العامل)"""
+
+    def __init__(self, executor: ProcessPoolExecutor, task: Callable, *args):
+        context = multiprocessing.get_context("spawn")
+        self.reader, writer = context.Pipe(duplex=False)
+        self.done_reader, done_writer = context.Pipe(duplex=False)
+        self.future: Future = executor.submit(_run_task, writer, task, args)
+
+        def on_done(_):
+            # نسخة الأم من طرف الكتابة: بعد إغلاقها ونهاية العامل يصل EOF للقارئ
+            writer.close()
+            done_writer.close()
+
+        self.future.add_done_callback(on_done)
+
+    def close(self):
+        # إغلاق القارئ يوقف العامل عند إرساله التالي (BrokenPipeError) إذا توقف المستهلك مبكراً
+        self.future.cancel()
+        self.reader.close()
+        self.done_reader.close()
+
+
+class ExtractionPool:
+    """استخراج النص في مجموعة عمليات منفصلة مع مهلة وحد للذاكرة لكل ملف"""
+
+    def __init__(self, max_workers: int, timeout: Optional[float] = None, memory_limit_mb: int = 0):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn بدلاً من fork: العملية الأم تحتوي على خيوط (uvicorn، عملاء HTTP)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.memory_limit_mb,)
+                )
+            return self._executor
+
+    def extract(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """استخراج مقاطع المستند في عملية منفصلة وإرجاعها دفعةً دفعة"""
+        executor = self._get_executor()
+        task = _Task(executor, _extract_segments, file_path)
+        try:
+            for batch in self._iter_batches(executor, task, _Deadline(self.timeout), file_path):
+                yield from batch
+        finally:
+            task.close()
+
+    def iter_pdf_pages(self, file_path: str, pages_per_task: int) -> Iterator[str]:
+        """توزيع صفحات PDF على كل العمّال وإرجاع نصها بترتيب الصفحات فور جاهزيته"""
+        executor = self._get_executor()
+        deadline = _Deadline(self.timeout)
+        count_task = _Task(executor, _count_pdf_pages, file_path)
+        try:
+            page_count = next(
+                batch for batch in self._iter_batches(executor, count_task, deadline, file_path)
+            )[0]
+        finally:
+            count_task.close()
+
+        # نافذة محدودة من النطاقات الجارية: الصفحات المستخرجة مسبقاً لا تتراكم في الذاكرة
+        ranges = iter(range(0, page_count, pages_per_task))
+        window = 2 * self.max_workers
+        tasks = deque()
+        try:
+            while True:
+                for start in ranges:
+                    tasks.append(_Task(executor, _extract_pdf_pages, file_path, start, min(start + pages_per_task, page_count)))
+                    if len(tasks) >= window:
+                        break
+                if not tasks:
+                    break
+                task = tasks.popleft()
+                try:
+                    for batch in self._iter_batches(executor, task, deadline, file_path):
+                        yield from batch
+                finally:
+                    task.close()
+        finally:
+            # توقف المستهلك أو فشل نطاق → لا داعي لبقية النطاقات
+            for task in tasks:
+                task.close()
+
+    def _iter_batches(self, executor: ProcessPoolExecutor, task: _Task, deadline: _Deadline, file_path: str) -> Iterator[List[Any]]:
+        """دفعات المهمة فور وصولها، مع مهلة الملف كاملاً وليس كل مهمة"""
+        try:
+            while True:
+                waiting_since = time.monotonic()
+                ready = wait([task.reader, task.done_reader], timeout=deadline.remaining())
+                if not ready:
+                    self._reset(executor)
+                    raise TimeoutError(f"Extraction timed out after {self.timeout}s: {file_path}")
+                if task.reader not in ready:
+                    # انتهت المهمة ولم يبقَ في الأنبوب شيء
+                    break
+                try:
+                    message = task.reader.recv()
+                except EOFError:
+                    break
+                finally:
+                    deadline.charge(time.monotonic() - waiting_since)
+                if message == _STARTED:
+                    deadline.start()
+                else:
+                    yield message
+            # أُغلق الأنبوب قبل أن تُسجَّل نتيجة المهمة
+            if not wait_futures([task.future], timeout=deadline.remaining()).done:
+                self._reset(executor)
+                raise TimeoutError(f"Extraction timed out after {self.timeout}s: {file_path}")
+            # أخطاء العامل (صيغة غير مدعومة، ملف معطوب، ...) تظهر هنا
+            task.future.result()
+        except BrokenProcessPool:
+            self._reset(executor)
+            raise Exception(f"Extraction worker crashed while processing: {file_path}")
+        except MemoryError:
+            raise MemoryError(f"Extraction exceeded the {self.memory_limit_mb}MB memory limit: {file_path}")
+
+    def _reset(self, executor: ProcessPoolExecutor):
+        """إنهاء العمليات العالقة وإنشاء مجموعة جديدة عند الطلب التالي"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+
+        # لا توجد واجهة عامة لإيقاف عملية واحدة؛ الاستخراجات الجارية الأخرى ستفشل أيضاً
+        self._terminate(executor)
+        logger.warning("Extraction pool was reset after a stuck or crashed worker.")
+
+    @staticmethod
+    def _terminate(executor: ProcessPoolExecutor):
+        for process in list((getattr(executor, "_processes", None) or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def close(self, wait: bool = True):
+        """wait=False ينهي العمليات فوراً بدل انتظار الاستخراجات الجارية"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is None:
+            return
+        if wait:
+            executor.shutdown(wait=True, cancel_futures=True)
+        else:
+            self._terminate(executor)
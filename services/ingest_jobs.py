@@ -0,0 +1,197 @@
+# src/services/ingest_jobs.py
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from .document_store import QdrantDocumentStore
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """عدد المهام المنتظرة وصل إلى الحد الأقصى"""
+
+
+class IngestJobQueue:
+    """طابور مهام معالجة المستندات: محفوظ في SQLite وتعالجه مجموعة عمّال في الخلفية"""
+
+    def __init__(self, doc_store: QdrantDocumentStore, db_path: str, workers: int = 2, max_pending: int = 100):
+        self.doc_store = doc_store
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                files TEXT NOT NULL,
+                chunk_size INTEGER NOT NULL,
+                force INTEGER NOT NULL DEFAULT 0,
+                chunks_embedded INTEGER NOT NULL DEFAULT 0,
+                chunks_upserted INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                result TEXT,
+                created_at TEXT NOT NULL,
+                started_at TEXT,
+                finished_at TEXT
+            )"""
+        )
+        self._conn.commit()
+
+    def start(self):
+        """تشغيل العمّال واستئناف المهام التي لم تكتمل قبل إعادة التشغيل"""
+        if self._threads:
+            return
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+            self._conn.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+            self._conn.commit()
+        for row in rows:
+            self._queue.put(row['id'])
+        if rows:
+            logger.info(f"Resuming {len(rows)} pending ingest jobs.")
+
+        self._stopping.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"ingest-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None) -> bool:
+        """إيقاف العمّال دون انتظار المهام الجارية أكثر من timeout: ما لم يكتمل يُستأنف عند التشغيل التالي.
+        يعيد False إذا بقيت مهام قيد التنفيذ"""
+        self._stopping.set()
+        for _ in self._threads:
+            self._queue.put(None)
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        if self._threads:
+            logger.warning(f"{len(self._threads)} ingest jobs still running at shutdown; they will resume on restart.")
+        return not self._threads
+
+    def close(self):
+        # عامل ما زال يعالج مهمة يحتاج الاتصال لتحديث حالتها
+        if self._threads:
+            return
+        with self._lock:
+            self._conn.close()
+
+    def submit(self, files: List[Dict[str, str]], chunk_size: int, force: bool = False) -> Dict[str, Any]:
+        """إضافة مهمة جديدة: files قائمة من {'path': مسار الملف المؤقت, 'name': اسم المستند}"""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            pending = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchone()[0]
+            if pending >= self.max_pending:
+                raise QueueFullError(f"Too many pending ingest jobs ({pending})")
+
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, files, chunk_size, force, created_at) VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, json.dumps(files), chunk_size, int(force), datetime.now().isoformat())
+            )
+            self._conn.commit()
+
+        self._queue.put(job_id)
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+
+        return {
+            "job_id": row['id'],
+            "status": row['status'],
+            "files": [file['name'] for file in json.loads(row['files'])],
+            "chunk_size": row['chunk_size'],
+            "chunks_embedded": row['chunks_embedded'],
+            "chunks_upserted": row['chunks_upserted'],
+            "error": row['error'],
+            "result": json.loads(row['result']) if row['result'] else None,
+            "created_at": row['created_at'],
+            "started_at": row['started_at'],
+            "finished_at": row['finished_at'],
+        }
+
+    def _update(self, job_id: str, **fields):
+        columns = ', '.join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def _worker(self):
+        while True:
+            job_id = self._queue.get()
+            # المهام المنتظرة تبقى 'queued' في قاعدة البيانات وتُستأنف عند التشغيل التالي
+            if job_id is None or self._stopping.is_set():
+                return
+            try:
+                self._run(job_id)
+            except Exception as e:
+                logger.exception(f"Ingest job {job_id} crashed: {str(e)}")
+
+    def _run(self, job_id: str):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or row['status'] != 'queued':
+            return
+
+        files = json.loads(row['files'])
+        self._update(job_id, status='running', started_at=datetime.now().isoformat())
+
+        def progress(chunks_embedded: int, chunks_upserted: int):
+            self._update(job_id, chunks_embedded=chunks_embedded, chunks_upserted=chunks_upserted)
+
+        try:
+            # كل ملفات المهمة تُعالج معاً حتى تُجمع دفعات التضمين والرفع عبر حدود الملفات
+            stats = self.doc_store.upload_documents(
+                files, row['chunk_size'], force=bool(row['force']), progress=progress
+            )
+            # بعض الملفات فقط فشلت → 'partial' حتى لا تبدو المهمة ناجحة وأخطاؤها في error
+            if stats['files_failed'] == len(files):
+                status = 'failed'
+            elif stats['files_failed']:
+                status = 'partial'
+            else:
+                status = 'succeeded'
+            self._update(
+                job_id,
+                status=status,
+                error='; '.join(f"{name}: {error}" for name, error in stats['errors'].items()) or None,
+                result=json.dumps(stats),
+                finished_at=datetime.now().isoformat()
+            )
+            logger.info(
+                f"Ingest job {job_id} finished: {stats['files_indexed']} indexed, {stats['files_skipped']} skipped, "
+                f"{stats['files_failed']} failed ({stats['files_per_second']} files/s, {stats['chunks_per_second']} chunks/s)."
+            )
+        except Exception as e:
+            self._update(job_id, status='failed', error=str(e), finished_at=datetime.now().isoformat())
+            logger.error(f"Ingest job {job_id} failed: {str(e)}")
+        finally:
+            for file in files:
+                if os.path.exists(file['path']):
+                    os.remove(file['path'])
@@ -0,0 +1,257 @@
+# src/services/metrics.py
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# حدود الـ histogram بالثواني: من استدعاءات Qdrant السريعة إلى توليد طويل
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        return '\n'.join([
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+            *self.samples()
+        ])
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # لكل مجموعة labels: (عدد القيم في كل حد، المجموع، العدد)
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def totals(self) -> Dict[Tuple[str, ...], Tuple[int, float]]:
+        """العدد والمجموع لكل مجموعة labels (لمقارنة ما قبل وما بعد تشغيل ما)"""
+        with self._lock:
+            return {key: (state[2], state[1]) for key, state in self._values.items()}
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(state[0]), state[1], state[2])) for key, state in self._values.items())
+
+        lines = []
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """المقاييس المسجلة في العملية بصيغة Prometheus النصية"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    "rag_stage_duration_seconds",
+    "Time spent in each pipeline stage (extract, chunk, embed, qdrant_upsert, qdrant_search, rerank, generate).",
+    ("stage",)
+))
+HTTP_REQUEST_SECONDS = registry.register(Histogram(
+    "rag_http_request_duration_seconds",
+    "HTTP request latency by route.",
+    ("method", "route", "status")
+))
+EMBEDDED_TEXTS = registry.register(Counter(
+    "rag_embedded_texts_total",
+    "Texts embedded, by where the vector came from.",
+    ("source",)
+))
+LLM_TOKENS = registry.register(Counter(
+    "rag_llm_tokens_total",
+    "Tokens processed by the generation model as reported by Ollama.",
+    ("kind",)
+))
+LLM_TOKENS_PER_SECOND = registry.register(Histogram(
+    "rag_llm_tokens_per_second",
+    "Generation speed reported by Ollama (eval_count / eval_duration).",
+    ("kind",),
+    buckets=(1, 2, 5, 10, 20, 30, 50, 75, 100, 200, 500, 1000, 5000)
+))
+EMBEDDING_CACHE_LOOKUPS = registry.register(Counter(
+    "rag_embedding_cache_lookups_total",
+    "Embedding cache lookups by result (memory_hit, disk_hit, miss).",
+    ("result",)
+))
+ANSWER_CACHE_LOOKUPS = registry.register(Counter(
+    "rag_answer_cache_lookups_total",
+    "Answer cache lookups by result (exact_hit, semantic_hit, miss).",
+    ("result",)
+))
+ANSWER_CACHE_SAVED_SECONDS = registry.register(Counter(
+    "rag_answer_cache_saved_generation_seconds_total",
+    "Generation time saved by answering from the answer cache (time the cached answer originally took)."
+))
+PAYLOAD_BYTES = registry.register(Counter(
+    "rag_payload_bytes_total",
+    "Bytes sent to external services (embedding input text, Qdrant point payloads, prompts).",
+    ("target",)
+))
+
+# توزيع أزمنة الطلب الحالي عند طلبها (/ask?timings=true)
+_request_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "rag_request_timings", default=None
+)
+
+
+def record_stage(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str):
+    """قياس زمن مرحلة في الـ histogram وفي توزيع الطلب الحالي إن وُجد"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+@contextmanager
+def collect_timings():
+    """جمع أزمنة المراحل التي تمر بها معالجة الطلب الحالي (تنتقل إلى asyncio.to_thread والمهام الفرعية)"""
+    timings: Dict[str, float] = {}
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+class TimedIterator:
+    """مكرر يقيس الزمن المستغرق في إنتاج عناصره فقط (وليس في معالجتها عند المستهلك)"""
+
+    def __init__(self, iterable: Iterable[Any], stage: Optional[str] = None):
+        self._iterator = iter(iterable)
+        self.stage = stage
+        self.seconds = 0.0
+
+    def __iter__(self) -> Iterator[Any]:
+        return self
+
+    def __next__(self) -> Any:
+        started = time.perf_counter()
+        try:
+            item = next(self._iterator)
+        except StopIteration:
+            self.seconds += time.perf_counter() - started
+            if self.stage is not None:
+                record_stage(self.stage, self.seconds)
+                self.stage = None
+            raise
+        self.seconds += time.perf_counter() - started
+        return item
+
+
+def record_generation(response: Dict[str, Any], prompt: str):
+    """عدد الرموز وسرعة التوليد من إحصائيات Ollama في الاستجابة الأخيرة"""
+    PAYLOAD_BYTES.inc(len(prompt.encode('utf-8')), target="ollama_generate")
+    for kind, count_key, duration_key in (("prompt", "prompt_eval_count", "prompt_eval_duration"),
+                                          ("completion", "eval_count", "eval_duration")):
+        count = response.get(count_key)
+        if not count:
+            continue
+        LLM_TOKENS.inc(count, kind=kind)
+        duration = response.get(duration_key)
+        if duration:
+            # المدة بالنانو ثانية
+            LLM_TOKENS_PER_SECOND.observe(count / (duration / 1e9), kind=kind)
@@ -0,0 +1,78 @@
+# src/services/page_cache.py
+import logging
+import os
+import sqlite3
+import threading
+from typing import List, Optional
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PageTextCache:
+    """نص صفحات ملفات PDF المستخرج محفوظ حسب بصمة الملف: إعادة معالجة نفس الملف لا تعيد الاستخراج"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files (content_hash TEXT PRIMARY KEY, page_count INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "content_hash TEXT NOT NULL, page INTEGER NOT NULL, text TEXT NOT NULL, "
+            "PRIMARY KEY (content_hash, page))"
+        )
+        self._conn.commit()
+
+    def get(self, content_hash: str) -> Optional[List[str]]:
+        """نص كل الصفحات بالترتيب، أو None إذا لم يُستخرج الملف كاملاً من قبل"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT page_count FROM files WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+            if row is None:
+                return None
+            pages = [text for (text,) in self._conn.execute(
+                "SELECT text FROM pages WHERE content_hash = ? ORDER BY page", (content_hash,)
+            )]
+        return pages if len(pages) == row[0] else None
+
+    def put(self, content_hash: str, pages: List[str]):
+        with self._lock:
+            try:
+                self._conn.execute("DELETE FROM pages WHERE content_hash = ?", (content_hash,))
+                self._conn.executemany(
+                    "INSERT INTO pages (content_hash, page, text) VALUES (?, ?, ?)",
+                    [(content_hash, page, text) for page, text in enumerate(pages, start=1)]
+                )
+                # سجل الملف يُكتب أخيراً حتى لا يُقرأ استخراج ناقص
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO files (content_hash, page_count) VALUES (?, ?)",
+                    (content_hash, len(pages))
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                self._conn.rollback()
+                logger.warning(f"Failed to persist PDF page text to cache: {str(e)}")
+
+
+_default_cache: Optional[PageTextCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_page_cache() -> Optional[PageTextCache]:
+    global _default_cache
+    if not settings.PDF_PAGE_CACHE_ENABLED or not settings.PDF_PAGE_CACHE_PATH:
+        return None
+
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = PageTextCache(settings.PDF_PAGE_CACHE_PATH)
+        return _default_cache
@@ -0,0 +1,110 @@
+# src/services/reranker.py
+import importlib.util
+import logging
+import math
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+from .sparse_encoder import SparseEncoder
+
+logger = logging.getLogger(__name__)
+
+
+class Reranker(ABC):
+    """إعادة ترتيب المرشحين ثم قطع القائمة عند هبوط الدرجات بشدة"""
+
+    name = "base"
+
+    @abstractmethod
+    def score(self, query: str, texts: List[str], retrieval_scores: List[float]) -> List[float]:
+        """درجات بين 0 و 1 لكل نص بنفس الترتيب"""
+
+    def rerank(self, query: str, chunks: List[Dict[str, Any]], top_k: int,
+               min_score_ratio: float = 0.0) -> List[Dict[str, Any]]:
+        if not chunks:
+            return []
+
+        scores = self.score(
+            query,
+            [chunk.get('text') or '' for chunk in chunks],
+            [chunk.get('score') or 0.0 for chunk in chunks]
+        )
+        ranked = sorted(
+            ({**chunk, 'rerank_score': round(float(score), 4)} for chunk, score in zip(chunks, scores)),
+            key=lambda chunk: chunk['rerank_score'],
+            reverse=True
+        )[:top_k]
+
+        # أفضل جزء يبقى دائماً؛ البقية فقط إن كانت قريبة من درجته
+        cutoff = ranked[0]['rerank_score'] * min_score_ratio
+        return [chunk for i, chunk in enumerate(ranked) if i == 0 or chunk['rerank_score'] >= cutoff]
+
+
+class LexicalReranker(Reranker):
+    """تغطية كلمات السؤال بوزن IDF محسوب من المرشحين أنفسهم، ممزوجة بدرجة الاسترجاع"""
+
+    name = "lexical"
+
+    def __init__(self, retrieval_weight: float = 0.3):
+        self.retrieval_weight = retrieval_weight
+
+    def score(self, query: str, texts: List[str], retrieval_scores: List[float]) -> List[float]:
+        query_terms = set(SparseEncoder.tokenize(query))
+        documents = [set(SparseEncoder.tokenize(text)) for text in texts]
+
+        n = len(documents)
+        idf = {}
+        for term in query_terms:
+            df = sum(1 for document in documents if term in document)
+            idf[term] = math.log(1 + (n - df + 0.5) / (df + 0.5))
+        total_idf = sum(idf.values())
+
+        low, high = min(retrieval_scores), max(retrieval_scores)
+        spread = high - low
+
+        scores = []
+        for document, retrieval_score in zip(documents, retrieval_scores):
+            coverage = sum(idf[term] for term in query_terms & document) / total_idf if total_idf else 0.0
+            retrieval = (retrieval_score - low) / spread if spread else 1.0
+            scores.append((1 - self.retrieval_weight) * coverage + self.retrieval_weight * retrieval)
+        return scores
+
+
+class CrossEncoderReranker(Reranker):
+    """نموذج cross-encoder محلي (sentence-transformers) يُحمّل عند أول استخدام"""
+
+    name = "cross-encoder"
+
+    def __init__(self, model_name: str, batch_size: int = 16):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        with self._lock:
+            if self._model is None:
+                # استيراد sentence-transformers (ومعه torch) مكلف → عند أول إعادة ترتيب وليس عند بدء التشغيل
+                from sentence_transformers import CrossEncoder  # اعتمادية اختيارية
+                self._model = CrossEncoder(self.model_name, device="cpu")
+            return self._model
+
+    def score(self, query: str, texts: List[str], retrieval_scores: List[float]) -> List[float]:
+        logits = self._get_model().predict([(query, text) for text in texts], batch_size=self.batch_size)
+        # sigmoid حتى تكون نسبة القطع ذات معنى مع الدرجات السالبة
+        return [1 / (1 + math.exp(-float(logit))) for logit in logits]
+
+
+def get_reranker(name: str, model_name: Optional[str] = None) -> Optional[Reranker]:
+    name = (name or "none").lower()
+    if name == "none":
+        return None
+    if name == "cross-encoder":
+        # فحص وجود الحزمة دون استيرادها
+        if importlib.util.find_spec("sentence_transformers") is None:
+            logger.warning("sentence-transformers is not installed; falling back to the lexical reranker.")
+            return LexicalReranker()
+        return CrossEncoderReranker(model_name)
+    if name == "lexical":
+        return LexicalReranker()
+    raise ValueError(f"Unknown reranker: {name}")
@@ -0,0 +1,46 @@
+# src/services/sparse_encoder.py
+import re
+import zlib
+from collections import Counter
+from typing import Dict, List
+from qdrant_client.http import models as rest
+from .chunker import estimate_tokens
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+class SparseEncoder:
+    """متجهات BM25 متناثرة تُحسب محلياً: فهرس الكلمة بصمة ثابتة، ووزن تكرارها مشبع (الـ IDF يطبقه Qdrant)"""
+
+    # avg_doc_length بالرموز التقديرية (نفس وحدة حجم الجزء)، وطول المستند يُقاس بنفس الوحدة
+    def __init__(self, k1: float = 1.2, b: float = 0.75, avg_doc_length: float = 500):
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_length = max(1.0, avg_doc_length)
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        return _TOKEN_PATTERN.findall(text.lower())
+
+    @staticmethod
+    def token_index(token: str) -> int:
+        # crc32 ثابت بين العمليات وإعادات التشغيل بعكس hash()
+        return zlib.crc32(token.encode("utf-8"))
+
+    def _to_vector(self, weights: Dict[int, float]) -> rest.SparseVector:
+        indices = sorted(weights)
+        return rest.SparseVector(indices=indices, values=[weights[i] for i in indices])
+
+    def encode_document(self, text: str) -> rest.SparseVector:
+        tokens = self.tokenize(text)
+        length_norm = 1 - self.b + self.b * estimate_tokens(len(text)) / self.avg_doc_length
+
+        weights: Dict[int, float] = {}
+        for token, tf in Counter(tokens).items():
+            index = self.token_index(token)
+            weights[index] = weights.get(index, 0.0) + tf * (self.k1 + 1) / (tf + self.k1 * length_norm)
+        return self._to_vector(weights)
+
+    def encode_query(self, text: str) -> rest.SparseVector:
+        """كل كلمة في السؤال بوزن 1: الترتيب يأتي من وزن المستند مضروباً في IDF"""
+        return self._to_vector({self.token_index(token): 1.0 for token in self.tokenize(text)})
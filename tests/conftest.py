@@ -0,0 +1,62 @@
+import pytest
+
+from benchmarks.fake_ollama import embed_text
+from config.settings import settings
+from services.clients import clients
+
+DIMENSION = 16
+
+
+class FakeEmbedding:
+    """تضمين حتمي بدون Ollama (نفس تجزئة الكلمات في خادم القياس الوهمي)"""
+
+    embedding_model = "fake-embedding"
+
+    def get_embedding_dimension(self):
+        return DIMENSION
+
+    def set_embedding_dimension(self, dimension):
+        pass
+
+    def get_embedding(self, text):
+        return embed_text(text, DIMENSION)
+
+    def get_embeddings(self, texts, batch_size=None):
+        return [embed_text(text, DIMENSION) for text in texts]
+
+    async def get_embedding_async(self, text):
+        return self.get_embedding(text)
+
+    async def get_embeddings_async(self, texts, batch_size=None):
+        return self.get_embeddings(texts)
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    """مخزن مستندات فوق Qdrant المحلي في الذاكرة بدون خوادم"""
+    for name, value in {
+        'QDRANT_LOCATION': ':memory:',
+        'EMBEDDING_DIMENSION': DIMENSION,
+        'EMBEDDING_CACHE_ENABLED': False,
+        'PDF_PAGE_CACHE_ENABLED': False,
+        'EXTRACTION_WORKERS': 0,
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+    for name in ('ollama', 'async_ollama', 'qdrant', 'async_qdrant'):
+        monkeypatch.setattr(clients, name, None)
+    monkeypatch.setattr('services.document_store.EmbeddingSrevice', FakeEmbedding)
+
+    from services.document_store import QdrantDocumentStore
+    store = QdrantDocumentStore()
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def upload(store, tmp_path):
+    def upload(file_name, text, chunk_size=100):
+        path = tmp_path / file_name
+        path.write_text(text, encoding='utf-8')
+        store.upload_document(str(path), chunk_size)
+        return store.get_manifest(file_name)
+    return upload
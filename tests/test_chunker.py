@@ -0,0 +1,79 @@
+import random
+
+import pytest
+
+from services.chunker import TextChunker
+
+
+def _chunk(segments, chunker):
+    document = '\n'.join(segment['text'] for segment in segments)
+    return document, list(chunker.iter_chunks(segments))
+
+
+def _assert_valid(document, chunks, chunker):
+    covered = bytearray(len(document))
+    for expected_id, chunk in enumerate(chunks):
+        assert chunk['chunk_id'] == expected_id
+        assert chunk['text'] == document[chunk['start_char']:chunk['end_char']]
+        assert chunk['token_count'] <= chunker.max_tokens
+        covered[chunk['start_char']:chunk['end_char']] = b'\x01' * (chunk['end_char'] - chunk['start_char'])
+
+    missing = [i for i, flag in enumerate(covered) if not flag and not document[i].isspace()]
+    assert not missing, f"text not in any chunk: {document[missing[0]:missing[0] + 40]!r}"
+
+
+def _random_document(rng):
+    parts = []
+    for _ in range(rng.randint(1, 30)):
+        words = [rng.choice(['a', 'bb', 'ccc', 'دddd', 'w' * rng.randint(1, 12)]) for _ in range(rng.randint(1, 200))]
+        parts.append(' '.join(words) + rng.choice(['.', '!', '؟', '', ':']))
+        parts.append(rng.choice([' ', '\n', '\n\n', '\n\n# Heading\n', '\n2.1 Section\n']))
+    if rng.random() < 0.2:
+        parts.append('x' * rng.randint(1100, 3000))
+    return ''.join(parts)
+
+
+def test_text_after_cut_is_not_dropped():
+    document = (
+        ("word " * 110).strip() + ".\n\nSecond paragraph holds UNIQUEFACT.\n\n"
+        + ("long " * 80).strip() + ". " + ("more " * 126).strip() + "."
+    )
+    chunker = TextChunker(256, 50)
+    _, chunks = _chunk([{'text': document}], chunker)
+
+    _assert_valid(document, chunks, chunker)
+    assert any('UNIQUEFACT' in chunk['text'] for chunk in chunks)
+
+
+def test_word_longer_than_chunk_is_split():
+    chunker = TextChunker(64, 10)
+    document, chunks = _chunk([{'text': 'start ' + 'x' * 1000 + ' end.'}], chunker)
+
+    _assert_valid(document, chunks, chunker)
+    assert len(chunks) > 1
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_random_documents_are_fully_covered(seed):
+    rng = random.Random(seed)
+    chunker = TextChunker(rng.choice([32, 128, 256]), rng.choice([0, 20, 50]))
+    segments = [
+        {'text': _random_document(rng), 'page': page, 'heading': rng.random() < 0.1}
+        for page in range(1, rng.randint(2, 5))
+    ]
+    document, chunks = _chunk(segments, chunker)
+
+    _assert_valid(document, chunks, chunker)
+
+
+def test_pages_follow_segments():
+    chunker = TextChunker(32, 0)
+    segments = [{'text': f"Page {page} sentence number one. Page {page} has a second sentence.", 'page': page}
+                for page in range(1, 4)]
+    document, chunks = _chunk(segments, chunker)
+
+    _assert_valid(document, chunks, chunker)
+    assert chunks[0]['page_start'] == 1
+    assert chunks[-1]['page_end'] == 3
+    for chunk in chunks:
+        assert chunk['page_start'] <= chunk['page_end']
@@ -0,0 +1,70 @@
+import pytest
+
+PARAGRAPHS = [f"Section {i} " + ' '.join(f"term{i}x{j}" for j in range(70)) for i in range(6)]
+
+
+def _text(paragraphs):
+    return '\n\n'.join(paragraphs)
+
+
+@pytest.fixture
+def embedded(store, monkeypatch):
+    """النصوص المرسلة إلى نموذج التضمين"""
+    texts = []
+    get_embeddings = store.embedding.get_embeddings
+
+    def counting(batch, batch_size=None):
+        texts.extend(batch)
+        return get_embeddings(batch)
+
+    monkeypatch.setattr(store.embedding, 'get_embeddings', counting)
+    return texts
+
+
+def _points(store, file_name):
+    points, _ = store.client.scroll(
+        collection_name=store.collection_name,
+        scroll_filter=store._file_filter(file_name),
+        limit=1000,
+        with_payload=True
+    )
+    return sorted(points, key=lambda point: point.payload['chunk_id'])
+
+
+def test_inserted_paragraph_reuses_shifted_chunks(store, upload, embedded):
+    before = upload("doc.txt", _text(PARAGRAPHS))
+    assert before['total_chunks'] > 2
+    embedded.clear()
+
+    after = upload("doc.txt", _text(["A new introduction."] + PARAGRAPHS))
+
+    # فقط أجزاء الفقرة الأولى تتغير؛ ما بعدها يعود بنفس النص في مواقع مزاحة
+    assert len(embedded) < after['total_chunks'] // 2
+    reused = set(before['point_ids']) & set(after['point_ids'])
+    assert len(reused) == after['total_chunks'] - len(embedded)
+
+    points = _points(store, "doc.txt")
+    assert [point.id for point in points] == after['point_ids']
+    assert [point.payload['chunk_id'] for point in points] == list(range(after['total_chunks']))
+    for point, (start_char, end_char, _, _) in zip(points, after['chunk_positions']):
+        assert (point.payload['start_char'], point.payload['end_char']) == (start_char, end_char)
+
+
+def test_failed_reingest_is_not_skipped_afterwards(store, upload, embedded):
+    original = _text(PARAGRAPHS)
+    upload("doc.txt", original)
+
+    get_embeddings = store.embedding.get_embeddings
+
+    def failing(batch, batch_size=None):
+        raise RuntimeError("embedding service unavailable")
+
+    store.embedding.get_embeddings = failing
+    with pytest.raises(RuntimeError):
+        upload("doc.txt", _text(["An edited introduction."] + PARAGRAPHS))
+    assert store.get_manifest("doc.txt")['content_hash'] is None
+
+    store.embedding.get_embeddings = get_embeddings
+    manifest = upload("doc.txt", original)
+    assert manifest['content_hash'] is not None
+    assert [point.id for point in _points(store, "doc.txt")] == manifest['point_ids']
@@ -0,0 +1,27 @@
+from array import array
+
+import pytest
+
+from services.embedding_cache import EmbeddingCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return EmbeddingCache(str(tmp_path / "embeddings.sqlite3"), memory_size=2)
+
+
+def test_memory_layer_stores_float32(cache):
+    cache.put_many({'a': [0.1, 0.2, 0.3]})
+    assert isinstance(cache._memory['a'], array) and cache._memory['a'].typecode == 'f'
+
+    vector = cache.get('a')
+    assert isinstance(vector, list)
+    assert vector == pytest.approx([0.1, 0.2, 0.3], rel=1e-6)
+
+
+def test_evicted_vectors_come_back_from_disk(cache):
+    cache.put_many({'a': [1.0, 2.0], 'b': [3.0, 4.0], 'c': [5.0, 6.0]})
+    assert 'a' not in cache._memory
+
+    assert cache.get_many(['a', 'c', 'missing']) == {'a': [1.0, 2.0], 'c': [5.0, 6.0]}
+    assert cache.stats()['disk_hits'] == 1 and cache.stats()['memory_hits'] == 1 and cache.stats()['misses'] == 1
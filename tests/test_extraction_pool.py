@@ -0,0 +1,59 @@
+import time
+
+import pytest
+
+from services.extraction_pool import ExtractionPool, _Deadline, _Task
+
+
+def _slow_batches(file_path):
+    # كل دفعة تأخذ في العامل أكثر من معالجتها عند المستهلك
+    for i in range(5):
+        time.sleep(0.8)
+        yield [{'text': f"batch {i}"}]
+
+
+def _stuck(file_path):
+    yield [{'text': 'first'}]
+    time.sleep(60)
+    yield [{'text': 'never'}]
+
+
+@pytest.fixture
+def pool():
+    pool = ExtractionPool(1, timeout=3)
+    yield pool
+    pool.close()
+
+
+def _collect(pool, task, file_path, consumer_seconds=0.0):
+    executor = pool._get_executor()
+    batches = []
+    for batch in pool._iter_batches(executor, _Task(executor, task, file_path), _Deadline(pool.timeout), file_path):
+        batches.append(batch)
+        # تضمين ورفع الدفعة عند المستهلك
+        time.sleep(consumer_seconds)
+    return batches
+
+
+def test_extract_streams_every_segment_in_order(pool, tmp_path):
+    path = tmp_path / "big.txt"
+    paragraphs = [f"Paragraph {i}" + " word" * 200 for i in range(1000)]
+    path.write_text('\n\n'.join(paragraphs), encoding='utf-8')
+
+    assert [segment['text'] for segment in pool.extract(str(path))] == paragraphs
+
+
+def test_slow_consumer_does_not_use_up_the_timeout(pool):
+    started = time.monotonic()
+    batches = _collect(pool, _slow_batches, 'slow.txt', consumer_seconds=0.5)
+
+    # ~4.5s منذ البدء، لكن انتظار العملية الأم للعامل ~2s فقط
+    assert time.monotonic() - started > pool.timeout
+    assert batches == [[{'text': f"batch {i}"}] for i in range(5)]
+
+
+def test_stuck_worker_still_times_out(pool):
+    with pytest.raises(TimeoutError):
+        _collect(pool, _stuck, 'stuck.txt')
+    # العامل العالق أُنهي؛ الطلب التالي ينشئ مجموعة جديدة
+    assert pool._executor is None
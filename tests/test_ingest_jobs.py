@@ -0,0 +1,89 @@
+import threading
+import time
+
+import pytest
+
+from services.ingest_jobs import IngestJobQueue
+
+
+class BlockingStore:
+    """مخزن وهمي: كل رفع ينتظر حتى يُسمح له بالانتهاء"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def upload_documents(self, files, chunk_size, force=False, progress=None):
+        self.started.set()
+        self.release.wait(10)
+        return {'files': len(files), 'files_indexed': len(files), 'files_skipped': 0, 'files_failed': 0,
+                'chunks': 0, 'errors': {}, 'files_per_second': 0.0, 'chunks_per_second': 0.0}
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    store = BlockingStore()
+    queue = IngestJobQueue(store, str(tmp_path / "jobs.sqlite3"), workers=1)
+    yield queue, store
+    store.release.set()
+
+
+def _spooled(tmp_path, name):
+    path = tmp_path / name
+    path.write_text("text", encoding='utf-8')
+    return [{'path': str(path), 'name': name}]
+
+
+def test_stop_does_not_wait_for_running_jobs(jobs, tmp_path):
+    queue, store = jobs
+    queue.start()
+    running = queue.submit(_spooled(tmp_path, "a.txt"), 100)
+    waiting = queue.submit(_spooled(tmp_path, "b.txt"), 100)
+    assert store.started.wait(5)
+
+    started = time.monotonic()
+    assert queue.stop(timeout=0.2) is False
+    assert time.monotonic() - started < 2
+    # الاتصال يبقى مفتوحاً للعامل الذي لم ينتهِ؛ المهمتان تُستأنفان عند التشغيل التالي
+    queue.close()
+    assert queue.get(running['job_id'])['status'] == 'running'
+
+    store.release.set()
+    for thread in queue._threads:
+        thread.join(5)
+    assert queue.get(running['job_id'])['status'] == 'succeeded'
+    assert queue.get(waiting['job_id'])['status'] == 'queued'
+
+
+def test_stop_returns_true_when_idle(jobs):
+    queue, _ = jobs
+    queue.start()
+    assert queue.stop(timeout=1) is True
+    queue.close()
+
+
+class FailingStore:
+    """مخزن وهمي: الملفات التي تبدأ أسماؤها بـ bad تفشل"""
+
+    def upload_documents(self, files, chunk_size, force=False, progress=None):
+        errors = {file['name']: "parse error" for file in files if file['name'].startswith('bad')}
+        return {'files': len(files), 'files_indexed': len(files) - len(errors), 'files_skipped': 0,
+                'files_failed': len(errors), 'chunks': 0, 'errors': errors,
+                'files_per_second': 0.0, 'chunks_per_second': 0.0}
+
+
+@pytest.mark.parametrize("names, status", [
+    (["a.txt", "b.txt"], 'succeeded'),
+    (["a.txt", "bad.txt"], 'partial'),
+    (["bad1.txt", "bad2.txt"], 'failed'),
+])
+def test_job_status_reflects_failed_files(tmp_path, names, status):
+    queue = IngestJobQueue(FailingStore(), str(tmp_path / "jobs.sqlite3"), workers=1)
+    files = [file for name in names for file in _spooled(tmp_path, name)]
+    job = queue.submit(files, 100)
+
+    queue._run(job['job_id'])
+    job = queue.get(job['job_id'])
+    assert job['status'] == status
+    assert (job['error'] is None) == (status == 'succeeded')
+    queue.close()
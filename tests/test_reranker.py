@@ -0,0 +1,32 @@
+import sys
+
+import pytest
+
+from services import reranker as reranker_module
+from services.reranker import CrossEncoderReranker, LexicalReranker, Reranker, get_reranker
+
+
+def test_base_reranker_is_abstract():
+    with pytest.raises(TypeError):
+        Reranker()
+
+
+def test_cross_encoder_does_not_import_model_at_construction(monkeypatch):
+    monkeypatch.delitem(sys.modules, 'sentence_transformers', raising=False)
+    reranker = CrossEncoderReranker("cross-encoder/ms-marco-MiniLM-L-6-v2")
+    assert 'sentence_transformers' not in sys.modules
+    assert reranker._model is None
+
+
+def test_missing_package_falls_back_to_lexical(monkeypatch):
+    monkeypatch.setattr(reranker_module.importlib.util, 'find_spec', lambda name: None)
+    assert isinstance(get_reranker("cross-encoder", "any-model"), LexicalReranker)
+
+
+def test_lexical_rerank_orders_by_term_overlap():
+    chunks = [
+        {'text': "weather report for the weekend", 'score': 0.6},
+        {'text': "invoice INV-1013 is overdue", 'score': 0.5},
+    ]
+    ranked = LexicalReranker().rerank("overdue invoice INV-1013", chunks, top_k=2)
+    assert ranked[0]['text'] == "invoice INV-1013 is overdue"
@@ -0,0 +1,35 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.routes import router
+from services.container import get_doc_store
+
+
+@pytest.fixture
+def api(store):
+    app = FastAPI()
+    app.include_router(router, prefix="/api/v1")
+    app.dependency_overrides[get_doc_store] = lambda: store
+    with TestClient(app) as client:
+        yield client
+
+
+def test_chunk_detail(api, upload):
+    upload("a.txt", "First paragraph about invoices.\n\nSecond paragraph about contracts.")
+    upload("b.txt", "Another file entirely.")
+
+    response = api.get("/api/v1/chunks/0/", params={"file_name": "a.txt"})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["file_name"] == "a.txt"
+    assert "invoices" in body["content"]["full_text"]
+    assert body["vector_info"]["vector_dimension"] == 16
+
+
+def test_chunk_detail_not_found(api, upload):
+    upload("a.txt", "Only one chunk here.")
+
+    assert api.get("/api/v1/chunks/5/", params={"file_name": "a.txt"}).status_code == 404
+    assert api.get("/api/v1/chunks/0/", params={"file_name": "missing.txt"}).status_code == 404
@@ -0,0 +1,51 @@
+import math
+
+import pytest
+
+from services.sparse_encoder import SparseEncoder
+
+FILLER = ' '.join(f"filler{i}" for i in range(60))
+
+
+def _cosine(a, b):
+    return sum(x * y for x, y in zip(a, b)) / math.sqrt(sum(x * x for x in a) * sum(y * y for y in b))
+
+
+@pytest.fixture
+def documents(upload):
+    upload("keyword.txt", f"{FILLER} INV-1013 {FILLER}")
+    upload("semantic.txt", "invoice totals and invoice payments for the quarter")
+    upload("exact.txt", "INV-1013 overdue")
+
+
+def _file_names(points):
+    return {point.payload['file_name'] for point in points}
+
+
+def test_hybrid_without_threshold_finds_keyword_only_match(store, documents):
+    points = store.search_documents("INV-1013", limit=5, score_threshold=None, mode="hybrid")
+    assert "keyword.txt" in _file_names(points)
+
+
+def test_hybrid_threshold_is_a_cosine_similarity(store, documents):
+    query = "INV-1013"
+    query_embedding = store.embedding.get_embedding(query)
+    threshold = 0.5
+
+    dense = store.search_documents(query, limit=5, score_threshold=threshold, mode="dense", with_vectors=True)
+    hybrid = store.search_documents(query, limit=5, score_threshold=threshold, mode="hybrid", with_vectors=True)
+
+    assert _file_names(hybrid) == _file_names(dense) == {"exact.txt"}
+    for point in hybrid:
+        vector = point.vector[store.DENSE_VECTOR_NAME] if isinstance(point.vector, dict) else point.vector
+        assert _cosine(vector, query_embedding) >= threshold
+
+
+def test_sparse_length_normalisation_uses_token_estimates():
+    encoder = SparseEncoder(avg_doc_length=100)
+    # 400 حرف ≈ 100 رمز = الطول المتوسط → وزن الكلمة المفردة (k1 + 1) / (1 + k1) = 1
+    text = 'unique ' + 'word ' * 78 + 'end'
+    assert len(text) == 400
+    vector = encoder.encode_document(text)
+    weights = dict(zip(vector.indices, vector.values))
+    assert weights[encoder.token_index('unique')] == pytest.approx(1.0)